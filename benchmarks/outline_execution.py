@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Measures how long lettuce takes to run scenario outlines with wide
+examples tables, cloning steps the way it does now and the way it did
+with deepcopy.
+
+Usage: python benchmarks/outline_execution.py [rows] [columns]
+"""
+import sys
+import time
+from copy import deepcopy
+
+from lettuce import registry
+from lettuce.core import Step
+from lettuce.core import Feature
+from lettuce.decorators import step
+
+def deepcopy_clone(self, data):
+    sentence = self.sentence
+    for k, v in data.items():
+        sentence = sentence.replace(u'<%s>' % unicode(k), unicode(v))
+
+    new = deepcopy(self)
+    new.sentence = sentence
+    return new
+
+def make_feature(rows, columns):
+    keys = [u'column%d' % index for index in range(columns)]
+    placeholders = u' '.join([u'<%s>' % key for key in keys])
+
+    lines = [
+        u'Feature: Wide outlines',
+        u'    Scenario Outline: Use every column',
+        u'        Given I have %s' % placeholders,
+        u'          | name | value |',
+        u'          | one  | 1     |',
+        u'        When I use %s' % placeholders,
+        u'        Then I used %s' % placeholders,
+        u'',
+        u'    Examples:',
+        u'        | %s |' % u' | '.join(keys),
+    ]
+    for row in range(rows):
+        lines.append(u'        | %s |' % u' | '.join(
+            [u'%d-%d' % (row, column) for column in range(columns)]))
+
+    return Feature.from_string(u'\n'.join(lines), with_file='wide.feature')
+
+def measure(feature, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        feature.run()
+        took = time.time() - started
+        if best is None or took < best:
+            best = took
+
+    return best
+
+def main(args=sys.argv[1:]):
+    rows = len(args) > 0 and int(args[0]) or 500
+    columns = len(args) > 1 and int(args[1]) or 20
+
+    registry.clear()
+
+    @step(r'(?:I have|I use|I used) .*')
+    def do_nothing(step):
+        pass
+
+    feature = make_feature(rows, columns)
+    steps = rows * len(feature.scenarios[0].steps)
+
+    current = Step.solve_and_clone
+    try:
+        Step.solve_and_clone = deepcopy_clone
+        before = measure(feature)
+    finally:
+        Step.solve_and_clone = current
+
+    after = measure(feature)
+
+    print "%d rows x %d columns, %d steps" % (rows, columns, steps)
+    print "%20s %12s %16s" % ("clone", "seconds", "microsecs/step")
+    print "%20s %12.4f %16.2f" % ("deepcopy (before)", before, before * 1000000 / steps)
+    print "%20s %12.4f %16.2f" % ("shallow (after)", after, after * 1000000 / steps)
+
+if __name__ == '__main__':
+    main()
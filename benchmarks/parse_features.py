@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Measures how long lettuce takes to tokenize and to fully parse
+synthetic feature files of growing size. Time per line should stay
+flat as files grow.
+
+Usage: python benchmarks/parse_features.py [max number of scenarios]
+"""
+import sys
+import time
+
+from lettuce import parser
+from lettuce.core import Feature
+from lettuce.core import Language
+
+SCENARIO = u'''
+    Scenario: Buying product number %(index)d
+        Given I have %(index)d products in my cart
+        And I have the following discounts:
+            | code      | percent |
+            | SUMMER%(index)d | 10      |
+            | WINTER%(index)d | 20      |
+        When I checkout
+        Then I pay for %(index)d products
+
+    Scenario Outline: Paying with card number %(index)d
+        Given I pay with <card>
+        Then I get <points> points
+
+    Examples:
+        | card   | points     |
+        | visa   | %(index)d  |
+        | amex   | %(index)d0 |
+'''
+
+def make_feature(scenarios):
+    parts = [u'Feature: Synthetic feature\n    In order to measure lettuce\n']
+    for index in range(scenarios):
+        parts.append(SCENARIO % {'index': index})
+
+    return u''.join(parts)
+
+def tokenize(string):
+    parser.tokenize(string, Language())
+
+def parse(string):
+    Feature.from_string(string, with_file='synthetic.feature')
+
+def measure(function, string, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        function(string)
+        took = time.time() - started
+        if best is None or took < best:
+            best = took
+
+    return best
+
+def main(args=sys.argv[1:]):
+    maximum = args and int(args[0]) or 1600
+    print "%10s %10s %16s %16s" % (
+        "scenarios", "lines", "tokenize us/line", "parse us/line")
+
+    scenarios = 100
+    while scenarios <= maximum:
+        string = make_feature(scenarios)
+        lines = len(string.splitlines())
+        per_line = lambda took: took * 1000000 / lines
+        print "%10d %10d %16.2f %16.2f" % (
+            scenarios, lines,
+            per_line(measure(tokenize, string)),
+            per_line(measure(parse, string)))
+        scenarios *= 2
+
+if __name__ == '__main__':
+    main()
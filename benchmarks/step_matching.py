@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Measures how long lettuce takes to find the step definition of each
+sentence, scanning every definition in order and narrowing them down
+with the registry's word index.
+
+Usage: python benchmarks/step_matching.py [definitions] [sentences]
+"""
+import sys
+import time
+import random
+
+from lettuce.registry import StepDict
+
+NOUNS = ['user', 'account', 'basket', 'invoice', 'order', 'product',
+         'page', 'message', 'report', 'contact']
+
+def make_registry(definitions):
+    steps = StepDict()
+    for index in range(definitions):
+        noun = NOUNS[index % len(NOUNS)]
+        if index % 4:
+            regex = r'^I (?:create|delete) the %s%d named "([^"]*)"$' % (noun, index)
+        else:
+            # unanchored definitions, that can not be indexed
+            regex = r'the %s%d is (\w+)' % (noun, index)
+
+        steps[regex] = lambda step, *args: None
+
+    return steps
+
+def make_sentences(definitions, sentences):
+    random.seed(0)
+    made = []
+    for _ in range(sentences):
+        index = random.randrange(definitions)
+        noun = NOUNS[index % len(NOUNS)]
+        if index % 4:
+            made.append(u'I create the %s%d named "John"' % (noun, index))
+        else:
+            made.append(u'Then the %s%d is ready' % (noun, index))
+
+    return made
+
+def measure(sentences, find):
+    started = time.time()
+    found = [find(sentence) for sentence in sentences]
+    return time.time() - started, found
+
+def first_match(matchers, sentence):
+    for regex, func in matchers:
+        if regex.search(sentence):
+            return func
+
+def main(args=sys.argv[1:]):
+    definitions = len(args) > 0 and int(args[0]) or 1000
+    count = len(args) > 1 and int(args[1]) or 100000
+
+    steps = make_registry(definitions)
+    sentences = make_sentences(definitions, count)
+
+    linear, expected = measure(sentences,
+        lambda sentence: first_match(steps.compiled(True), sentence))
+    indexed, found = measure(sentences,
+        lambda sentence: first_match(steps.matching(sentence, True), sentence))
+
+    assert found == expected, 'the index changed which definitions match'
+
+    print "%d definitions, %d sentences" % (definitions, count)
+    print "%20s %12s %16s" % ("lookup", "seconds", "microsecs/step")
+    print "%20s %12.4f %16.2f" % ("linear (before)", linear, linear * 1000000 / count)
+    print "%20s %12.4f %16.2f" % ("indexed (after)", indexed, indexed * 1000000 / count)
+
+if __name__ == '__main__':
+    main()
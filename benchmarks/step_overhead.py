@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Measures lettuce's own overhead per step, running features whose
+steps do nothing: through Step.run_all, compiling a plan on every run
+(what Feature.run does) and running the same compiled plan again.
+
+Usage: python benchmarks/step_overhead.py [scenarios] [steps] [runs]
+"""
+import sys
+import time
+
+from lettuce import registry
+from lettuce.core import Step
+from lettuce.core import Feature
+from lettuce.decorators import step
+
+def make_feature(scenarios, steps):
+    lines = [u'Feature: No-op steps']
+    for scenario in range(scenarios):
+        lines.append(u'    Scenario: Do nothing %d' % scenario)
+        for index in range(steps):
+            lines.append(u'        Given I do nothing with "%d" and "%d"' % (scenario, index))
+
+    return Feature.from_string(u'\n'.join(lines), with_file='noop.feature')
+
+def measure(function, runs):
+    best = None
+    for _ in range(runs):
+        started = time.time()
+        function()
+        took = time.time() - started
+        if best is None or took < best:
+            best = took
+
+    return best
+
+def main(args=sys.argv[1:]):
+    scenarios = len(args) > 0 and int(args[0]) or 100
+    steps = len(args) > 1 and int(args[1]) or 100
+    runs = len(args) > 2 and int(args[2]) or 5
+
+    registry.clear()
+
+    @step(r'I do nothing with "(?P<first>\d+)" and "(?P<second>\d+)"')
+    def do_nothing(step, first, second):
+        pass
+
+    feature = make_feature(scenarios, steps)
+    total = scenarios * steps
+
+    def run_all():
+        for scenario in feature.scenarios:
+            Step.run_all(scenario.steps)
+
+    plan = feature.compile()
+
+    # warm up the match memo, so every variant measures only execution
+    feature.run()
+
+    legacy = measure(run_all, runs)
+    compiling = measure(feature.run, runs)
+    reused = measure(plan.run, runs)
+
+    print "%d scenarios x %d steps, best of %d runs" % (scenarios, steps, runs)
+    print "%24s %12s %16s" % ("execution", "seconds", "microsecs/step")
+    print "%24s %12.4f %16.2f" % ("Step.run_all", legacy, legacy * 1000000 / total)
+    print "%24s %12.4f %16.2f" % ("compile and run plan", compiling, compiling * 1000000 / total)
+    print "%24s %12.4f %16.2f" % ("reuse compiled plan", reused, reused * 1000000 / total)
+
+if __name__ == '__main__':
+    main()
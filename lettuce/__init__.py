@@ -22,11 +22,24 @@ release = 'barium'
 
 import os
 import sys
+import Queue
+import socket
+import threading
+import multiprocessing
+from itertools import imap
 from datetime import datetime
 
 from lettuce import fs
+from lettuce import parallel
+from lettuce import sharding
+from lettuce import impact
+from lettuce import distributed
+from lettuce import coroutines
 
-from lettuce.core import Feature, TotalResult
+from lettuce.core import Feature, ScenarioPlan, TotalResult
+from lettuce.cache import FeatureCache, MatchCache, Durations, Failures, ImpactMap
+from lettuce.cache import PassedResults
+from lettuce.history import History
 
 from lettuce.terrain import after
 from lettuce.terrain import before
@@ -34,6 +47,7 @@ from lettuce.terrain import world
 
 from lettuce.decorators import step
 from lettuce.registry import call_hook
+from lettuce.registry import call_hook_where
 from lettuce.registry import STEP_REGISTRY
 from lettuce.registry import CALLBACK_REGISTRY
 
@@ -41,18 +55,49 @@ from lettuce import exceptions
 
 __all__ = ['after', 'before', 'step', 'world', 'STEP_REGISTRY', 'CALLBACK_REGISTRY', 'call_hook']
 
-try:
-    terrain = fs.FileSystem._import("terrain")
-    reload(terrain)
-except Exception, e:
-    if not "No module named terrain" in str(e):
-        string = 'Lettuce has tried to load the conventional environment ' \
-            'module "terrain"\nbut it has errors, check its contents and ' \
-            'try to run lettuce again.\n\nOriginal traceback below:\n\n'
+_terrain = None
 
-        sys.stderr.write(string)
-        sys.stderr.write(exceptions.traceback.format_exc(e))
-        raise SystemExit(1)
+def import_terrain():
+    """Imports the conventional environment module "terrain", from
+    the current directory, once per process. Runner calls it, so that
+    importing lettuce alone, as clients of the fork server do, leaves
+    the terrain out."""
+    global _terrain
+    if _terrain is not None:
+        return _terrain
+
+    try:
+        _terrain = fs.FileSystem._import("terrain")
+        reload(_terrain)
+    except Exception, e:
+        if not "No module named terrain" in str(e):
+            string = 'Lettuce has tried to load the conventional environment ' \
+                'module "terrain"\nbut it has errors, check its contents and ' \
+                'try to run lettuce again.\n\nOriginal traceback below:\n\n'
+
+            sys.stderr.write(string)
+            sys.stderr.write(exceptions.traceback.format_exc(e))
+            raise SystemExit(1)
+
+    return _terrain
+
+def _parse_feature_file(args):
+    """Parses a feature file within one of the worker processes of
+    Runner.parse_features, returning the feature or, when it has syntax
+    errors, the error message"""
+    filename, use_cache = args
+    try:
+        if use_cache:
+            return FeatureCache().load(filename), None
+
+        return Feature.from_file(filename), None
+    except exceptions.LettuceSyntaxError, e:
+        return None, e.msg
+
+def _match_sentence(sentence):
+    """Matches a step sentence within one of the worker processes of
+    Runner.resolve_steps"""
+    return STEP_REGISTRY.match(sentence, True)
 
 class Runner(object):
     """ Main lettuce's test runner
@@ -60,10 +105,72 @@ class Runner(object):
     Takes a base path as parameter (string), so that it can look for
     features and step definitions on there.
     """
-    def __init__(self, base_path, scenarios=None, verbosity=0, xml_filename=None):
+    def __init__(self, base_path, scenarios=None, verbosity=0, xml_filename=None,
+                 use_cache=False, parse_workers=None, parse_ahead=None,
+                 resolve=False, strict=False, dry_run=False, processes=None,
+                 threads=None, async_concurrency=None, coordinator=None, worker=None,
+                 shard=None, history=False, failed_first=False, last_failed=False,
+                 trace=False, changed_files=None, reuse_passed=False):
         """ lettuce.Runner will try to find a terrain.py file and
         import it from within `base_path`
+
+        When `use_cache` is True, parsed features are kept on disk
+        (see lettuce.cache.FeatureCache) and reused while their files
+        don't change.
+
+        When `parse_workers` is given, all the feature files are parsed
+        up front by that many processes, and the syntax errors of every
+        file are reported at once.
+
+        When `parse_ahead` is given, a background thread reads and parses
+        feature files while the previous ones run, staying at most that
+        many features ahead.
+
+        When `resolve` is True, every step of every feature is matched
+        before any of them runs, and the undefined ones are reported up
+        front. `strict` does the same, but doesn't run anything when
+        some step is undefined.
+
+        When `dry_run` is True, features are parsed and their steps are
+        matched and reported, but neither the steps nor any hook other
+        than the output ones are called.
+
+        When `processes` is given, scenarios run within that many forked
+        worker processes, see lettuce.parallel. When `threads` is given
+        instead, features run concurrently within that many threads.
+        When `async_concurrency` is given, the scenarios of each feature
+        run concurrently, that many at a time, along with their
+        coroutines, see lettuce.coroutines.
+
+        When `coordinator` is given, as "host:port", the scenarios are
+        handed to the workers that connect to that address, which run
+        with `worker` set to it, see lettuce.distributed.
+
+        When `shard` is given, as a (K, N) tuple, only the K-th of N
+        shards of the scenarios runs, see lettuce.sharding. With the
+        cache enabled, the duration of each scenario is recorded to
+        balance the shards of later runs, by every run but the ones of a
+        shard or of a worker, so that the jobs of a sharded run all see
+        the same durations.
+
+        When `history` is True, the results of the run are recorded
+        within .lettuce_history.db, see lettuce.history.
+
+        With the cache enabled, the scenarios that fail are recorded as
+        well. When `last_failed` is True, only them run, or all of them
+        when none failed. When `failed_first` is True, they run before
+        the others.
+
+        When `trace` is True, the source files that each scenario runs
+        code from are recorded. When `changed_files` is given, only the
+        scenarios that depend on them run, see lettuce.impact.
+
+        When `reuse_passed` is True, the examples that passed on a
+        previous run are not run again while neither their text nor the
+        code they depend on change, and are reported as cached passes,
+        see lettuce.cache.PassedResults.
         """
+        import_terrain()
 
         self.single_feature = None
         if os.path.isfile(base_path) and os.path.exists(base_path):
@@ -87,7 +194,37 @@ class Runner(object):
         reload(output)
 
         self.output = output
-        
+
+        self.feature_cache = self.match_cache = None
+        self.durations = self.failures = None
+        if use_cache:
+            self.feature_cache = FeatureCache()
+            self.match_cache = MatchCache()
+            self.durations = Durations()
+            self.failures = Failures()
+
+        self.parse_workers = parse_workers
+        self.parse_ahead = parse_ahead
+        self.resolve = resolve or strict
+        self.strict = strict
+        self.dry_run = dry_run
+        self.processes = processes
+        self.threads = threads
+        self.async_concurrency = async_concurrency
+        self.coordinator = coordinator
+        self.worker = worker
+        self.shard = shard
+        self.history = history and History() or None
+        self.failed_first = failed_first
+        self.last_failed = last_failed
+        self.trace = trace
+        self.changed_files = changed_files
+        self.impact_map = None
+        if trace or changed_files is not None:
+            self.impact_map = ImpactMap()
+
+        self.passed_results = reuse_passed and PassedResults() or None
+
         self._junit_xml_result = None
         if xml_filename:
             self._xml_file = open(xml_filename, 'w+')
@@ -99,11 +236,26 @@ class Runner(object):
         """
         for feature in total.feature_results:
             for scenario in feature.scenario_results:
-                if scenario.passed:
+                if scenario.cached:
+                    self._junit_xml_result.addCachedSuccess({'classname': '%s (%s)' % (scenario.scenario.with_file,
+                                                                                       scenario.scenario.feature.name),
+                                                             'name': scenario.scenario.name,
+                                                             'duration': scenario.duration})
+                elif scenario.passed:
                     self._junit_xml_result.addSuccess({'classname': '%s (%s)' % (scenario.scenario.with_file,
                                                                                  scenario.scenario.feature.name), 
                                                                                 'name': scenario.scenario.name,
                                                                                 'duration': scenario.duration})
+                elif not scenario.steps_failed:
+                    if scenario.steps_undefined:
+                        reason = "%d undefined steps" % len(scenario.steps_undefined)
+                    else:
+                        reason = "%d skipped steps" % len(scenario.steps_skipped)
+
+                    self._junit_xml_result.addSkip({'classname': '%s (%s)' % (scenario.scenario.with_file,
+                                                                              scenario.scenario.feature.name),
+                                                    'name': scenario.scenario.name,
+                                                    'duration': scenario.duration}, reason)
                 else:
                     for step in scenario.steps_failed:                                
                         step.why.traceback = "Step: %s\n %s" %(step.sentence, step.why.traceback)
@@ -115,47 +267,327 @@ class Runner(object):
         self._junit_xml_result.stopTestRun(total.scenarios_ran)
         self._xml_file.close()
 
-    def run(self):
+    def load_feature(self, filename):
+        """Parses the feature within `filename`, going through the
+        cache when it is enabled"""
+        if self.feature_cache:
+            return self.feature_cache.load(filename)
+
+        return Feature.from_file(filename)
+
+    def parse_features(self, features_files):
+        """Parses all the given feature files within a pool of
+        `parse_workers` processes, keeping their order. Raises
+        LettuceSyntaxErrors with the errors of every broken file."""
+        pool = multiprocessing.Pool(self.parse_workers)
+        chunksize = max(1, len(features_files) / (self.parse_workers * 4))
+        try:
+            args = [(filename, bool(self.feature_cache)) for filename in features_files]
+            parsed = pool.map(_parse_feature_file, args, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+        errors = [(filename, error) for filename, (feature, error)
+                  in zip(features_files, parsed) if error]
+        if errors:
+            raise exceptions.LettuceSyntaxErrors(errors)
+
+        return [feature for feature, error in parsed]
+
+    def parse_features_ahead(self, features_files):
+        """Yields the features within `features_files`, in order, while
+        a background thread parses the next ones into a queue of
+        `parse_ahead` features"""
+        parsed = Queue.Queue(self.parse_ahead)
+        stop = threading.Event()
+
+        def produce():
+            for filename in features_files:
+                try:
+                    item = self.load_feature(filename), None
+                except Exception:
+                    item = None, sys.exc_info()
+
+                while not stop.is_set():
+                    try:
+                        parsed.put(item, timeout=0.1)
+                        break
+                    except Queue.Full:
+                        pass
+
+                if item[1] or stop.is_set():
+                    return
+
+        producer = threading.Thread(target=produce, name='lettuce-parser')
+        producer.daemon = True
+        producer.start()
+
+        try:
+            for filename in features_files:
+                feature, error = parsed.get()
+                if error:
+                    raise error[0], error[1], error[2]
+
+                yield feature
+        finally:
+            stop.set()
+
+    def load_features(self, features_files):
+        """Returns an iterable with the features within `features_files`,
+        parsed the way the runner was told to"""
+        if self.parse_workers:
+            return self.parse_features(features_files)
+        elif self.parse_ahead:
+            return self.parse_features_ahead(features_files)
+
+        return imap(self.load_feature, features_files)
+
+    def resolve_steps(self, features):
+        """Matches every step that is going to run within `features`,
+        returning the ones that have no definition. The sentences are
+        matched by `parse_workers` processes when it is given."""
+        steps = []
+        for feature in features:
+            for index, scenario in enumerate(feature.scenarios):
+                if self.scenarios and (index + 1) not in self.scenarios:
+                    continue
+
+                steps.extend(scenario.outlines and scenario.solved_steps or scenario.steps)
+
+        sentences = list(set([step.sentence for step in steps]))
+        if self.parse_workers and len(sentences) > 1:
+            pool = multiprocessing.Pool(self.parse_workers)
+            chunksize = max(1, len(sentences) / (self.parse_workers * 4))
+            try:
+                matches = pool.map(_match_sentence, sentences, chunksize)
+            finally:
+                pool.close()
+                pool.join()
+
+            for sentence, matched in zip(sentences, matches):
+                STEP_REGISTRY.matches[sentence, True] = matched
+
+        undefined = []
+        seen = set()
+        for step in steps:
+            # the examples of an outline share the original sentence
+            if step.original_sentence in seen:
+                continue
+
+            if not STEP_REGISTRY.match(step.sentence, True):
+                seen.add(step.original_sentence)
+                undefined.append(step)
+
+        return undefined
+
+    def select(self, features, features_files):
+        """Leaves within `features` only the scenarios to run, in the
+        order they should run, returning the features that still have
+        some, along with their files"""
+        for feature in features:
+            feature.scenarios = feature.select_scenarios(self.scenarios)
+
+        failures = {}
+        if self.last_failed or self.failed_first:
+            failures = (self.failures or Failures()).load()
+
+        if self.last_failed and failures:
+            self.select_failed(features, failures)
+
+        if self.changed_files is not None:
+            self.select_changed(features)
+
+        if self.shard:
+            self.select_shard(features)
+
+        kept = [(feature, filename) for feature, filename in zip(features, features_files)
+                if feature.scenarios]
+        if self.failed_first:
+            failed = lambda scenario: scenario.id in failures
+            for feature, filename in kept:
+                feature.scenarios.sort(key=lambda scenario: not failed(scenario))
+
+            kept.sort(key=lambda (feature, filename): not failed(feature.scenarios[0]))
+
+        return [feature for feature, filename in kept], [filename for feature, filename in kept]
+
+    def select_failed(self, features, failures):
+        """Leaves within `features` only the scenarios, and examples
+        of outlines, that failed when they last ran"""
+        for feature in features:
+            scenarios = []
+            for scenario in feature.scenarios:
+                if scenario.id not in failures:
+                    continue
+
+                examples = failures[scenario.id]
+                if scenario.outlines and examples is not None:
+                    scenario.outlines = [outline for outline in scenario.outlines
+                                         if outline in examples]
+                    if not scenario.outlines:
+                        continue
+
+                scenarios.append(scenario)
+
+            feature.scenarios = scenarios
+
+    def select_changed(self, features):
+        """Leaves within `features` only the scenarios that depend on
+        the changed files, according to the last traced runs"""
+        files = self.impact_map.load()
+        changed = set([fs.FileSystem.relpath(filename) for filename in self.changed_files])
+        for feature in features:
+            feature.scenarios = [scenario for scenario in feature.scenarios
+                                 if impact.affected(scenario, files, changed)]
+
+    def select_shard(self, features):
+        """Leaves within `features` only the scenarios of the shard
+        to run"""
+        number, total = self.shard
+        scenarios = [scenario for feature in features for scenario in feature.scenarios]
+
+        durations = (self.durations or Durations()).load()
+        positions = sharding.partition([scenario.id for scenario in scenarios], total, durations)
+        in_shard = set([id(scenarios[position]) for position in positions[number - 1]])
+
+        for feature in features:
+            feature.scenarios = [scenario for scenario in feature.scenarios
+                                 if id(scenario) in in_shard]
+
+    def run(self, features_files=None):
         """ Find and load step definitions, and them find and load
         features under `base_path` specified on constructor
+
+        When `features_files` is given, only those feature files run,
+        along with the step definitions that are already loaded, see
+        lettuce.watch.
         """
+        output_only = CALLBACK_REGISTRY.output_only
+        # coordinators leave every other hook to the workers
+        CALLBACK_REGISTRY.output_only = output_only or self.dry_run or bool(self.coordinator)
+        passed_results = ScenarioPlan.passed_results
+        ScenarioPlan.passed_results = self.passed_results
+        try:
+            return self._run(features_files)
+        finally:
+            CALLBACK_REGISTRY.output_only = output_only
+            ScenarioPlan.passed_results = passed_results
+            coroutines.close_loop()
+
+    def _run(self, features_files=None):
         if self._junit_xml_result:
             self._junit_xml_result.startTestRun()
             
         started_at = datetime.now()
-        self.loader.find_and_load_step_definitions()
+        if features_files is None:
+            self.loader.find_and_load_step_definitions()
+            if self.match_cache:
+                self.match_cache.load(STEP_REGISTRY)
 
-        call_hook('before', 'all')
+        if self.worker:
+            return self._work()
 
-        results = []
-        if self.single_feature:
+        if features_files is not None:
+            features_files = list(features_files)
+        elif self.single_feature:
             features_files = [self.single_feature]
         else:
             features_files = self.loader.find_feature_files()
 
+        features = None
+        if features_files and self.resolve:
+            try:
+                features = list(self.load_features(features_files))
+            except exceptions.LettuceSyntaxError, e:
+                sys.stderr.write(e.msg)
+                raise SystemExit(2)
+
+            undefined = self.resolve_steps(features)
+            if undefined:
+                self.output.print_undefined_steps(undefined)
+                if self.strict:
+                    raise SystemExit(1)
+
+        call_hook('before', 'all')
+
+        results = []
         if not features_files:
             self.output.print_no_features_found(self.loader.base_dir)
             return
 
         failed = False
+        tracer = None
         try:
-            for filename in features_files:
-                feature = Feature.from_file(filename)
-                results.append(feature.run(self.scenarios))
+            if features is None:
+                features = self.load_features(features_files)
+
+            scenarios = self.scenarios
+            if (self.shard or self.failed_first or self.last_failed
+                or self.changed_files is not None):
+                features, features_files = self.select(list(features), features_files)
+                scenarios = None
+
+            if self.trace:
+                tracer = impact.Tracer()
+                tracer.start()
+
+            if self.processes:
+                results.extend(parallel.run_in_processes(
+                    list(features), self.processes, scenarios, dry_run=self.dry_run))
+            elif self.threads:
+                results.extend(parallel.run_in_threads(
+                    list(features), self.threads, scenarios, dry_run=self.dry_run))
+            elif self.coordinator:
+                paths = [os.path.relpath(filename, self.loader.base_dir)
+                         for filename in features_files]
+                coordinator = distributed.Coordinator(
+                    list(features), paths, self.coordinator, scenarios)
+                sys.stderr.write("lettuce is waiting for workers at %s:%d\n" % coordinator.address)
+                results.extend(coordinator.run())
+            elif self.async_concurrency:
+                results.extend(parallel.run_concurrently(
+                    features, self.async_concurrency, scenarios, dry_run=self.dry_run))
+            else:
+                for feature in features:
+                    results.append(feature.run(scenarios, dry_run=self.dry_run))
         except exceptions.LettuceSyntaxError, e:
             sys.stderr.write(e.msg)
             failed = True
 
+        except exceptions.WorkerDied, e:
+            sys.stderr.write("%s\n" % e)
+            failed = True
+
         finally:
+            if tracer:
+                tracer.stop()
+                self.impact_map.save(tracer.files)
+
+            if self.match_cache:
+                self.match_cache.save(STEP_REGISTRY)
+
             if failed:
                 raise SystemExit(2)
 
             total = TotalResult(results)
+            if self.durations and not self.dry_run:
+                # the other shards must be split from the same durations
+                if not self.shard:
+                    self.durations.save(total)
+
+                self.failures.save(total)
+
+            if self.passed_results and not self.dry_run:
+                self.passed_results.save(total)
 
             call_hook('after', 'all', total)
 
             finished_at = datetime.now()
             time_took = finished_at - started_at
+            if self.history and not self.dry_run:
+                self.history.record(total, started_at, time_took.total_seconds())
+                self.history.close()
 
             hours = time_took.seconds / 60 / 60
             minutes = time_took.seconds / 60
@@ -171,3 +603,26 @@ class Runner(object):
                 self._create_junit_xml(total)
 
             return total
+
+    def _work(self):
+        """Runs the scenarios that the coordinator hands over, calling
+        every hook except the output ones"""
+        not_output_hook = parallel.not_output_hook
+        call_hook_where(not_output_hook, 'before', 'all')
+        try:
+            results = distributed.work(self.worker, self.loader.base_dir,
+                                       self.load_feature, dry_run=self.dry_run)
+        except socket.error, e:
+            sys.stderr.write("lettuce could not reach the coordinator at %s: %s\n" % (self.worker, e))
+            raise SystemExit(2)
+        finally:
+            if self.match_cache:
+                self.match_cache.save(STEP_REGISTRY)
+
+        total = TotalResult(results)
+        # the coordinator records the durations of every scenario
+        if self.failures and not self.dry_run:
+            self.failures.save(total)
+
+        call_hook_where(not_output_hook, 'after', 'all', total)
+        return total
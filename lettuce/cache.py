@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import sys
+import shutil
+import marshal
+import json
+import hashlib
+import cPickle as pickle
+
+from lettuce.fs import FileSystem
+from lettuce.core import Feature
+from lettuce.core import Language
+
+CACHE_DIR = '.lettuce_cache'
+
+def _read(filename):
+    try:
+        f = open(filename, 'rb')
+    except IOError:
+        return None
+
+    try:
+        return pickle.load(f)
+    except Exception:
+        # corrupted or written by an incompatible lettuce: start over
+        return None
+    finally:
+        f.close()
+
+def _pickle(obj, f):
+    pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+
+def _write(filename, obj, dump=_pickle):
+    temporary = '%s.%d.tmp' % (filename, os.getpid())
+
+    try:
+        FileSystem.mkdir(FileSystem.dirname(filename))
+        f = open(temporary, 'wb')
+        try:
+            dump(obj, f)
+        finally:
+            f.close()
+
+        os.rename(temporary, filename)
+    except (IOError, OSError, TypeError, pickle.PicklingError):
+        # the cache is just a shortcut, failing to fill it is harmless
+        if FileSystem.exists(temporary):
+            os.remove(temporary)
+
+class FeatureCache(object):
+    """On-disk cache of parsed features.
+
+    Each feature file is stored already parsed, keyed by its content,
+    its path and lettuce's version, so that unchanged files can be
+    loaded without being parsed again.
+    """
+    def __init__(self, path=None):
+        self.path = path or FileSystem.current_dir(CACHE_DIR)
+        self.features_path = FileSystem.join(self.path, 'features')
+
+    def key_for(self, filename, content):
+        import lettuce
+
+        key = hashlib.sha1()
+        # the parsed tree holds paths relative to the current dir
+        for part in (lettuce.version, FileSystem.abspath(filename),
+                     FileSystem.current_dir()):
+            key.update(part.encode('utf-8'))
+            key.update('\0')
+
+        key.update(content)
+        return key.hexdigest()
+
+    def _cached_file(self, key):
+        return FileSystem.join(self.features_path, '%s.pickle' % key)
+
+    def load(self, filename):
+        """Returns the feature parsed from `filename`, parsing it only
+        when it was not found in cache"""
+        f = open(filename, 'rb')
+        content = f.read()
+        f.close()
+
+        key = self.key_for(filename, content)
+        feature = _read(self._cached_file(key))
+        if feature is None:
+            string = content.decode('utf-8')
+            language = Language.guess_from_string(string)
+            feature = Feature.from_string(string, with_file=filename, language=language)
+            _write(self._cached_file(key), feature)
+
+        return feature
+
+    def clear(self):
+        """Removes every cached feature"""
+        if FileSystem.exists(self.path):
+            shutil.rmtree(self.path)
+
+class MatchCache(object):
+    """On-disk cache of the step definition matched by each sentence.
+
+    The matches are keyed by the regexes of every step definition, in
+    registration order, so adding, removing or reordering any of them
+    starts a fresh cache.
+    """
+    def __init__(self, path=None):
+        self.path = path or FileSystem.current_dir(CACHE_DIR)
+        self.matches_path = FileSystem.join(self.path, 'matches')
+        self.loaded = 0
+
+    def key_for(self, registry):
+        import lettuce
+
+        key = hashlib.sha1(lettuce.version)
+        for regex in registry.keys():
+            key.update(repr(regex))
+            key.update('\0')
+
+        return key.hexdigest()
+
+    def _cached_file(self, registry):
+        return FileSystem.join(self.matches_path, '%s.pickle' % self.key_for(registry))
+
+    def load(self, registry):
+        """Fills `registry` with the matches found on previous runs"""
+        matches = _read(self._cached_file(registry))
+        if matches:
+            registry.matches.update(matches)
+
+        self.loaded = len(registry.matches)
+
+    def save(self, registry):
+        """Stores the matches of `registry`, if it found new ones"""
+        if len(registry.matches) > self.loaded:
+            _write(self._cached_file(registry), registry.matches)
+            self.loaded = len(registry.matches)
+
+class Durations(object):
+    """How long each scenario took on the last run it was part of, in
+    seconds, kept as JSON so that CI jobs can share it"""
+    def __init__(self, path=None):
+        self.path = path or FileSystem.current_dir(CACHE_DIR)
+        self.filename = FileSystem.join(self.path, 'durations.json')
+
+    def load(self):
+        """Returns the durations by scenario id"""
+        try:
+            f = open(self.filename)
+        except IOError:
+            return {}
+
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+        finally:
+            f.close()
+
+    def save(self, total):
+        """Records the durations of the scenarios that ran within
+        `total`, a TotalResult, keeping the ones of other scenarios"""
+        durations = self.load()
+        ran = {}
+        cached = set()
+        for result in total.scenario_results:
+            # outlines take as long as all of their examples
+            scenario_id = result.scenario.id
+            ran[scenario_id] = ran.get(scenario_id, 0) + result.duration
+            if result.cached:
+                cached.add(scenario_id)
+
+        # the scenarios reused from PassedResults keep their last duration
+        for scenario_id in cached:
+            del ran[scenario_id]
+
+        durations.update(ran)
+        _write(self.filename, durations, json.dump)
+
+class Failures(object):
+    """The scenarios that failed, or had undefined steps, on the runs
+    they were last part of. Outlines keep the values of each of their
+    failing examples."""
+    def __init__(self, path=None):
+        self.path = path or FileSystem.current_dir(CACHE_DIR)
+        self.filename = FileSystem.join(self.path, 'failures.json')
+
+    def load(self):
+        """Returns the failing examples by scenario id, None standing
+        for scenarios that are not outlines"""
+        try:
+            f = open(self.filename)
+        except IOError:
+            return {}
+
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+        finally:
+            f.close()
+
+    def save(self, total):
+        """Records the failures within `total`, a TotalResult. The
+        scenarios that passed are forgotten, while the ones that did
+        not run this time are kept"""
+        failures = self.load()
+        for result in total.scenario_results:
+            failures.pop(result.scenario.id, None)
+
+        for result in total.scenario_results:
+            if result.passed or not (result.steps_failed or result.steps_undefined):
+                continue
+
+            scenario_id = result.scenario.id
+            if result.scenario.outlines:
+                failures.setdefault(scenario_id, []).append(outline_of(result))
+            else:
+                failures[scenario_id] = None
+
+        _write(self.filename, failures, json.dump)
+
+class ImpactMap(object):
+    """The source files each scenario ran code from, on the last traced
+    run it was part of, see lettuce.impact"""
+    def __init__(self, path=None):
+        self.path = path or FileSystem.current_dir(CACHE_DIR)
+        self.filename = FileSystem.join(self.path, 'impact.json')
+
+    def load(self):
+        """Returns the files, relative to the current directory, by
+        scenario id"""
+        try:
+            f = open(self.filename)
+        except IOError:
+            return {}
+
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+        finally:
+            f.close()
+
+    def save(self, files):
+        """Records `files`, a set of file names by scenario id, keeping
+        the files of the scenarios that were not traced"""
+        impact = self.load()
+        for scenario_id, names in files.items():
+            impact[scenario_id] = sorted(names)
+
+        _write(self.filename, impact, json.dump)
+
+class PassedResults(object):
+    """The examples that passed, keyed by everything their result
+    depends on: the text of the scenario and of its example, the code of
+    the step definitions they matched, along with the source file of
+    each, and the sources of the hooks and of the terrain.
+
+    Examples whose key passed before do not need to run again.
+    """
+    def __init__(self, path=None):
+        self.path = path or FileSystem.current_dir(CACHE_DIR)
+        self.filename = FileSystem.join(self.path, 'passed.json')
+        self.keys = None
+        self.files = {}
+        self.sources = {}
+        self._environment = None
+
+    def load(self):
+        """Returns the scenario id of each key that passed"""
+        try:
+            f = open(self.filename)
+        except IOError:
+            return {}
+
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+        finally:
+            f.close()
+
+    def passed(self, key):
+        """Whether the example of `key` passed on a previous run"""
+        if self.keys is None:
+            self.keys = self.load()
+
+        return key in self.keys
+
+    def file_digest(self, filename):
+        """Digest of the content of `filename`, or of its source when it
+        is compiled, empty when it can not be read"""
+        if filename.endswith(('.pyc', '.pyo')):
+            filename = filename[:-1]
+
+        if filename not in self.files:
+            digest = hashlib.sha1()
+            try:
+                f = open(filename, 'rb')
+                try:
+                    digest.update(f.read())
+                finally:
+                    f.close()
+            except IOError:
+                # such as the code defined from strings
+                pass
+
+            self.files[filename] = digest.hexdigest()
+
+        return self.files[filename]
+
+    def source_of(self, code):
+        """Digest of the code object `code` and of the file it was
+        defined within"""
+        if code not in self.sources:
+            digest = hashlib.sha1(marshal.dumps(code))
+            digest.update(self.file_digest(code.co_filename))
+            self.sources[code] = digest.hexdigest()
+
+        return self.sources[code]
+
+    def environment(self):
+        """Digest of lettuce's version, of the sources of every hook
+        but the output ones, and of the terrain"""
+        if self._environment is None:
+            import lettuce
+            from lettuce.registry import CALLBACK_REGISTRY, is_output_hook
+
+            digests = set()
+            for situations in CALLBACK_REGISTRY.values():
+                for callbacks in situations.values():
+                    for callback in callbacks:
+                        code = getattr(callback, 'func_code', None)
+                        if code and not is_output_hook(callback):
+                            digests.add(self.source_of(code))
+
+            terrain = sys.modules.get('terrain')
+            if getattr(terrain, '__file__', None):
+                digests.add(self.file_digest(terrain.__file__))
+
+            key = hashlib.sha1(lettuce.version)
+            for digest in sorted(digests):
+                key.update(digest)
+
+            self._environment = key.hexdigest()
+
+        return self._environment
+
+    def key_for(self, scenario, outline, plans):
+        """Returns the key of the example of `scenario` with the values
+        of `outline`, whose steps are bound to their definitions by
+        `plans`, or None when some step is undefined"""
+        key = hashlib.sha1(self.environment())
+        key.update(scenario.id.encode('utf-8'))
+        key.update('\0')
+        key.update(repr(outline and sorted(outline.items())))
+        for plan in plans:
+            if plan.definition is None:
+                return None
+
+            step = plan.step
+            key.update('\0')
+            key.update(repr((step.sentence, step.keys, step.hashes)))
+            key.update(self.source_of(plan.definition.function.func_code))
+
+        return key.hexdigest()
+
+    def save(self, total):
+        """Records the examples that passed within `total`, a
+        TotalResult, forgetting the previous keys of the scenarios that
+        ran and keeping the ones of other scenarios"""
+        keys = self.load()
+        ran = set([result.scenario.id for result in total.scenario_results])
+        keys = dict([(key, scenario_id) for key, scenario_id in keys.items()
+                     if scenario_id not in ran])
+
+        for result in total.scenario_results:
+            if result.key and result.passed:
+                keys[result.key] = result.scenario.id
+
+        _write(self.filename, keys, json.dump)
+
+def outline_of(result):
+    """Returns the values of the example that `result` came from"""
+    for steps in (result.steps_passed, result.steps_failed,
+                  result.steps_skipped, result.steps_undefined):
+        for step in steps:
+            return step.related_outline
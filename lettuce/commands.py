@@ -17,9 +17,29 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
 import sys
+import socket
 import optparse
 
 import lettuce
+from lettuce import impact
+from lettuce import forkserver
+from lettuce import sharding
+from lettuce.cache import FeatureCache
+from lettuce.history import History, print_report
+from lettuce.watch import Watcher
+
+def forwarded(arguments):
+    """Returns the command line `arguments` of a --client, without
+    the ones that only tell it how to reach the server"""
+    kept = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument == '--socket':
+            next(arguments, None)
+        elif argument != '--client' and not argument.startswith('--socket='):
+            kept.append(argument)
+
+    return kept
 
 def main(args=sys.argv[1:]):
     base_path = os.path.join(os.path.dirname(os.curdir), 'features')
@@ -38,20 +58,274 @@ def main(args=sys.argv[1:]):
                       default=None,
                       help='Comma separated list of scenarios to run')
 
+    parser.add_option("--parse-workers",
+                      dest="parse_workers",
+                      type="int",
+                      default=None,
+                      help='Parse all the feature files up front, within '
+                      'this many processes')
+
+    parser.add_option("--parse-ahead",
+                      dest="parse_ahead",
+                      type="int",
+                      default=None,
+                      help='Parse feature files in background while the '
+                      'previous ones run, keeping at most this many parsed '
+                      'features in memory')
+
+    parser.add_option("--resolve-steps",
+                      dest="resolve",
+                      action="store_true",
+                      default=False,
+                      help='Match every step before running any of them, '
+                      'reporting the undefined ones up front')
+
+    parser.add_option("--strict",
+                      dest="strict",
+                      action="store_true",
+                      default=False,
+                      help='Like --resolve-steps, but do not run anything '
+                      'when some step is undefined')
+
+    parser.add_option("--dry-run",
+                      dest="dry_run",
+                      action="store_true",
+                      default=False,
+                      help='Parse the features and match their steps, '
+                      'reporting them without running any step or hook')
+
+    parser.add_option("--processes",
+                      dest="processes",
+                      type="int",
+                      default=None,
+                      help='Run the scenarios within this many worker '
+                      'processes, forked after loading the step definitions')
+
+    parser.add_option("--threads",
+                      dest="threads",
+                      type="int",
+                      default=None,
+                      help='Run the features concurrently within this many '
+                      'threads, each one with its own world')
+
+    parser.add_option("--async-concurrency",
+                      dest="async_concurrency",
+                      type="int",
+                      default=None,
+                      help='Run this many scenarios of each feature at a time, '
+                      'their coroutine steps and hooks sharing one event loop')
+
+    parser.add_option("--coordinator",
+                      dest="coordinator",
+                      default=None,
+                      metavar="[HOST]:PORT",
+                      help='Listen at this address, handing the scenarios to '
+                      'the workers that connect to it and reporting their results')
+
+    parser.add_option("--worker",
+                      dest="worker",
+                      default=None,
+                      metavar="HOST:PORT",
+                      help='Run the scenarios handed over by the coordinator '
+                      'at this address')
+
+    parser.add_option("--shard",
+                      dest="shard",
+                      default=None,
+                      metavar="K/N",
+                      help='Run only the K-th of N shards of the scenarios, '
+                      'balanced by the durations recorded on earlier runs')
 
-    options, args = parser.parse_args()
+    parser.add_option("--failed-first",
+                      dest="failed_first",
+                      action="store_true",
+                      default=False,
+                      help='Run the scenarios that failed on their last run '
+                      'before the other ones')
+
+    parser.add_option("--last-failed",
+                      dest="last_failed",
+                      action="store_true",
+                      default=False,
+                      help='Run only the scenarios, and examples of outlines, '
+                      'that failed on their last run, or all of them when none failed')
+
+    parser.add_option("--trace",
+                      dest="trace",
+                      action="store_true",
+                      default=False,
+                      help='Record the source files each scenario runs code '
+                      'from, for --changed-since and --changed-files')
+
+    parser.add_option("--changed-since",
+                      dest="changed_since",
+                      default=None,
+                      metavar="REVISION",
+                      help='Run only the scenarios that depend on the files '
+                      'changed since this git revision, according to --trace')
+
+    parser.add_option("--changed-files",
+                      dest="changed_files",
+                      default=None,
+                      help='Comma separated list of changed files, running '
+                      'only the scenarios that depend on them, according to --trace')
+
+    parser.add_option("--reuse-passed",
+                      dest="reuse_passed",
+                      action="store_true",
+                      default=False,
+                      help='Do not run again the scenarios that passed on a '
+                      'previous run, while neither their text nor the code of '
+                      'their steps, hooks and terrain change')
+
+    parser.add_option("--watch",
+                      dest="watch",
+                      action="store_true",
+                      default=False,
+                      help='Keep running, running again the features affected '
+                      'by each change to the feature files or step definitions')
+
+    parser.add_option("--server",
+                      dest="server",
+                      action="store_true",
+                      default=False,
+                      help='Import lettuce, the terrain and the step definitions '
+                      'once, and fork a run for each --client that connects to '
+                      '--socket, until interrupted')
+
+    parser.add_option("--client",
+                      dest="client",
+                      action="store_true",
+                      default=False,
+                      help='Run lettuce within the --server listening at '
+                      '--socket, with the other arguments')
+
+    parser.add_option("--socket",
+                      dest="socket",
+                      default=forkserver.SOCKET_FILE,
+                      help='The Unix socket of --server and --client, '
+                      '%s by default' % forkserver.SOCKET_FILE)
+
+    parser.add_option("--no-cache",
+                      dest="no_cache",
+                      action="store_true",
+                      default=False,
+                      help='Always parse the feature files and match the '
+                      'steps, ignoring the cache of previous runs')
+
+    parser.add_option("--no-history",
+                      dest="no_history",
+                      action="store_true",
+                      default=False,
+                      help='Do not record this run within .lettuce_history.db')
+
+    parser.add_option("--report",
+                      dest="report",
+                      type="choice",
+                      choices=['slowest', 'trends', 'slower-steps'],
+                      default=None,
+                      help='Report the slowest scenarios of the last run, their '
+                      'duration on the latest runs, or the steps that got slower '
+                      'than on --baseline, from .lettuce_history.db, and exit')
+
+    parser.add_option("--baseline",
+                      dest="baseline",
+                      default=None,
+                      help='The run id, or git revision, that --report slower-steps '
+                      'compares the last run with, the previous run by default')
+
+    parser.add_option("--threshold",
+                      dest="threshold",
+                      type="float",
+                      default=20,
+                      help='How much slower, in percent, steps must be to be '
+                      'reported by --report slower-steps')
+
+    parser.add_option("--clear-cache",
+                      dest="clear_cache",
+                      action="store_true",
+                      default=False,
+                      help='Remove the cache of previous runs and exit')
+
+    arguments = list(args)
+    options, args = parser.parse_args(arguments)
     if args:
         base_path = os.path.abspath(args[0])
 
+    if options.client:
+        try:
+            raise SystemExit(forkserver.request(forwarded(arguments), options.socket))
+        except socket.error, e:
+            sys.stderr.write("lettuce could not reach the server at %s: %s\n" % (options.socket, e))
+            raise SystemExit(2)
+
+    if options.server:
+        forkserver.serve(options.socket, base_path)
+        return
+
     try:
         options.verbosity = int(options.verbosity)
     except ValueError:
         pass
 
-    runner = lettuce.Runner(base_path, scenarios=options.scenarios, verbosity=options.verbosity)
+    shard = None
+    if options.shard:
+        try:
+            shard = sharding.parse(options.shard)
+        except ValueError:
+            parser.error('--shard takes K/N, where 1 <= K <= N, e.g. --shard 2/4')
+
+    changed_files = None
+    if options.changed_files is not None:
+        changed_files = [name for name in options.changed_files.split(',') if name]
+
+    if options.changed_since:
+        try:
+            changed_files = (changed_files or []) + impact.changed_since(options.changed_since)
+        except ValueError, e:
+            parser.error('--changed-since could not list the changed files: %s' % e)
+
+    if options.watch and (options.coordinator or options.worker):
+        parser.error('--watch can not be used along with --coordinator or --worker')
+
+    if options.report:
+        print_report(History(), options.report, options.baseline, options.threshold / 100.0)
+        return
+
+    if options.clear_cache:
+        FeatureCache().clear()
+        return
+
+    runner = lettuce.Runner(base_path, scenarios=options.scenarios,
+                            verbosity=options.verbosity,
+                            use_cache=not options.no_cache,
+                            parse_workers=options.parse_workers,
+                            parse_ahead=options.parse_ahead,
+                            resolve=options.resolve,
+                            strict=options.strict,
+                            dry_run=options.dry_run,
+                            processes=options.processes,
+                            threads=options.threads,
+                            async_concurrency=options.async_concurrency,
+                            coordinator=options.coordinator,
+                            worker=options.worker,
+                            shard=shard,
+                            history=not options.no_history,
+                            failed_first=options.failed_first,
+                            last_failed=options.last_failed,
+                            trace=options.trace,
+                            changed_files=changed_files,
+                            reuse_passed=options.reuse_passed)
+
+    if options.watch:
+        result = Watcher(runner).run()
+    else:
+        result = runner.run()
+
+    if not result or result.steps_undefined:
+        raise SystemExit(1)
 
-    result = runner.run()
-    if not result or result.steps != result.steps_passed:
+    if not options.dry_run and result.steps != result.steps_passed:
         raise SystemExit(1)
 
 if __name__ == '__main__':
@@ -16,15 +16,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import re
 import codecs
 import unicodedata
-from copy import deepcopy
 from lettuce import strings
+from lettuce import coroutines
+from lettuce import parser
 from lettuce import languages
 from lettuce.fs import FileSystem
 from lettuce.registry import STEP_REGISTRY
 from lettuce.registry import call_hook
+from lettuce.registry import call_hook_where
+from lettuce.registry import is_output_hook
 from lettuce.exceptions import ReasonToFail
 from lettuce.exceptions import NoDefinitionFound
 from lettuce.exceptions import LettuceSyntaxError
@@ -32,6 +36,9 @@ import time
 
 fs = FileSystem()
 
+# what outline placeholders look like, as opposed to markup, e.g. <br/>
+PLACEHOLDER_NAME = re.compile(r'^\w[\w -]*$', re.U)
+
 class Language(object):
     code = 'en'
     name = 'English'
@@ -69,18 +76,30 @@ class Language(object):
 class StepDefinition(object):
     """A step definition is a wrapper for user-defined callbacks. It
     gets a few metadata from file, such as filename and line number"""
+    # relative file names of each definition, by current dir
+    places = {}
+
     def __init__(self, step, function):
+        code = function.func_code
+        key = code.co_filename, os.getcwd()
+        if key not in self.places:
+            self.places[key] = fs.relpath(code.co_filename)
+
         self.function = function
-        self.file = fs.relpath(function.func_code.co_filename)
-        self.line = function.func_code.co_firstlineno + 1
+        self.file = self.places[key]
+        self.line = code.co_firstlineno + 1
         self.step = step
 
     def __call__(self, *args, **kw):
         """Method that actually wrapps the call to step definition
-        callback. Sends step object as first argument
+        callback. Sends step object as first argument, and waits for
+        coroutine functions to complete
         """
         try:
-            ret = self.function(self.step, *args, **kw)
+            if coroutines.iscoroutinefunction(self.function):
+                ret = coroutines.wait(self.function(self.step, *args, **kw))
+            else:
+                ret = self.function(self.step, *args, **kw)
             self.step.passed = True
         except Exception, e:
             self.step.failed = True
@@ -103,9 +122,11 @@ class ScenarioDescription(object):
     """A simple object that holds filename and line number of a scenario
     description (scenario within feature file)"""
 
-    def __init__(self, scenario, filename, string, language):
+    def __init__(self, scenario, filename, string, language, line=None):
         self.file = fs.relpath(filename)
-        self.line = None
+        self.line = line
+        if line is not None:
+            return
 
         for pline, part in enumerate(string.splitlines()):
             part = part.strip()
@@ -117,10 +138,15 @@ class FeatureDescription(object):
     """A simple object that holds filename and line number of a feature
     description"""
 
-    def __init__(self, feature, filename, string, language):
-        lines = [l.strip() for l in string.splitlines()]
+    def __init__(self, feature, filename, string, language, line=None,
+                 description_at=None):
         self.file = fs.relpath(filename)
-        self.line = None
+        self.line = line
+        if description_at is not None:
+            self.description_at = tuple(description_at)
+            return
+
+        lines = [l.strip() for l in string.splitlines()]
         described_at = []
         description_lines = strings.get_stripped_lines(feature.description)
         for pline, part in enumerate(lines):
@@ -145,7 +171,13 @@ class Step(object):
     ran = False
     passed = None
     failed = None
+    duration = None
+    cached = False
     related_outline = None
+    sentence_template = None
+    table_template = None
+    run_state = ('ran', 'passed', 'failed', 'why', 'defined_at',
+                 'has_definition', 'related_outline', 'duration', 'cached')
 
     def __init__(self, sentence, remaining_lines, line=None, filename=None):
         self.sentence = sentence
@@ -195,13 +227,43 @@ class Step(object):
 
         return method_name, sentence
 
+    def compile_outline(self):
+        """Splits the sentence and the table of this step around their
+        <placeholders>, so that solving each outline row takes a single
+        pass. Returns the names of the placeholders found."""
+        self.sentence_template = strings.Template(self.sentence)
+        placeholders = list(self.sentence_template.placeholders)
+
+        keys = [strings.Template(key) for key in self.keys]
+        rows = [[strings.Template(data[key]) for key in self.keys]
+                for data in self.hashes]
+
+        self.table_template = None
+        for template in keys + sum(rows, []):
+            placeholders.extend(template.placeholders)
+            if template.placeholders:
+                self.table_template = keys, rows
+
+        return placeholders
+
     def solve_and_clone(self, data):
-        sentence = self.sentence
-        for k, v in data.items():
-            sentence = sentence.replace(u'<%s>' % unicode(k), unicode(v))
+        if self.sentence_template is None:
+            self.compile_outline()
+
+        # the clone shares tables, description and scenario with its
+        # template, only the sentence and the state of a run are its own
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        for attr in self.run_state:
+            new.__dict__.pop(attr, None)
+
+        new.sentence = self.sentence_template.fill(data)
+        if self.table_template:
+            keys, rows = self.table_template
+            new.keys = tuple([key.fill(data) for key in keys])
+            new.hashes = [dict(zip(new.keys, [value.fill(data) for value in row]))
+                          for row in rows]
 
-        new = deepcopy(self)
-        new.sentence = sentence
         return new
 
     def _calc_list_length(self, lst):
@@ -255,12 +317,11 @@ class Step(object):
         return strings.parse_hashes(lines)
 
     def _get_match(self, ignore_case):
-        matched, func = None, lambda: None
-
-        for regex, func in STEP_REGISTRY.items():
-            matched = re.search(regex, self.sentence, ignore_case and re.I or 0)
-            if matched:
-                break
+        matched = STEP_REGISTRY.match(self.sentence, ignore_case)
+        if matched:
+            func = STEP_REGISTRY[matched.regex]
+        else:
+            func = lambda: None
 
         return matched, StepDefinition(self, func)
 
@@ -319,7 +380,9 @@ class Step(object):
     def run(self, ignore_case):
         """Runs a step, trying to resolve it on available step
         definitions"""
-        matched, step_definition = self.pre_run(ignore_case)
+        return self._run_matched(*self.pre_run(ignore_case))
+
+    def _run_matched(self, matched, step_definition):
         self.ran = True
         kw = matched.groupdict()
 
@@ -333,8 +396,9 @@ class Step(object):
         return True
         
     @staticmethod
-    def run_all(steps, outline = None, run_callbacks = False, ignore_case = True):
-        """Runs each step in the given list of steps.
+    def run_all(steps, outline = None, run_callbacks = False, ignore_case = True, dry_run = False):
+        """Runs each step in the given list of steps. When `dry_run` is
+        True the steps are only matched, never run.
         
         Returns a tuple of five lists:
             - The full set of steps executed
@@ -355,13 +419,13 @@ class Step(object):
                 step = step.solve_and_clone(outline)
 
             try:
-                step.pre_run(ignore_case, with_outline=outline)
+                matched, step_definition = step.pre_run(ignore_case, with_outline=outline)
 
                 if run_callbacks:
                     call_hook('before_each', 'step', step)
 
-                if not steps_failed and not steps_undefined:
-                    step.run(ignore_case)
+                if not steps_failed and not steps_undefined and not dry_run:
+                    step._run_matched(matched, step_definition)
                     steps_passed.append(step)
 
             except NoDefinitionFound, e:
@@ -388,18 +452,17 @@ class Step(object):
         
         """
         invalid_first_line_error = '\nFirst line of step "%(line)s" is in table form.'
-        if lines and strings.wise_startswith(lines[0], u'|'):
+        if lines and unicode(lines[0]).startswith(u'|'):
             raise LettuceSyntaxError(
                 None,
                 invalid_first_line_error % lines[0])
-        
+
         # Select only lines that aren't end-to-end whitespace
-        only_whitspace = re.compile('^\s*$')
-        lines = filter(lambda x: not only_whitspace.match(x), lines)
-        
+        lines = [line for line in lines if line.strip()]
+
         step_strings = []
         for line in lines:
-            if strings.wise_startswith(line, u"|"):
+            if unicode(line).startswith(u"|"):
                 step_strings[-1] += "\n%s" % line
             else:
                 step_strings.append(line)
@@ -422,22 +485,28 @@ class Step(object):
 
         return cls(sentence, remaining_lines=lines, line=line, filename=with_file)
 
+    @classmethod
+    def from_tokens(cls, sentence, rows, with_file=None):
+        """Creates a new step from the tokens of a sentence and its
+        table rows"""
+        line = with_file and sentence.line or None
+        return cls(sentence.value, remaining_lines=[row.value for row in rows],
+                   line=line, filename=with_file)
+
 class Scenario(object):
     """ Object that represents each scenario on feature files."""
     described_at = None
     indentation = 2
     table_indentation = indentation + 2
-    def __init__(self, name, remaining_lines, keys, outlines, with_file=None,
-                 original_string=None, language=None):
+    def __init__(self, name, tokens, keys, outlines, with_file=None,
+                 original_string=None, language=None, line=None):
 
         if not language:
             language = language()
 
         self.name = name
         self.language = language
-        self.steps = self._parse_remaining_lines(remaining_lines,
-                                                 with_file,
-                                                 original_string)
+        self.steps = self._parse_tokens(tokens, with_file, original_string)
         self.keys = keys
         self.outlines = outlines
         self.with_file = with_file
@@ -446,12 +515,25 @@ class Scenario(object):
         if with_file and original_string:
             scenario_definition = ScenarioDescription(self, with_file,
                                                       original_string,
-                                                      language)
+                                                      language, line)
             self._set_definition(scenario_definition)
 
-        self.solved_steps = list(self._resolve_steps(self.steps, self.outlines,
-                                                     with_file, original_string))
         self._add_myself_to_steps()
+        if self.keys:
+            self._compile_outline(with_file)
+
+    @property
+    def id(self):
+        """Identifies the scenario across runs, by its feature file,
+        relative to the current directory, and its name"""
+        return u'%s: %s' % (self.with_file and fs.relpath(self.with_file) or u'', self.name)
+
+    @property
+    def solved_steps(self):
+        """The steps of every outline row, with their placeholders
+        solved. They are built only when asked for, so that big examples
+        tables don't cost memory until they run"""
+        return list(self._resolve_steps(self.steps, self.outlines))
 
     @property
     def max_length(self):
@@ -508,70 +590,64 @@ class Scenario(object):
 
             yield (outline, steps)
 
-    def run(self, ignore_case):
+    def compile(self, ignore_case=True):
+        """Returns a ScenarioPlan that runs this scenario"""
+        return ScenarioPlan(self, ignore_case)
+
+    def run(self, ignore_case, dry_run=False):
         """Runs a scenario, running each of its steps. Also call
         before_each and after_each callbacks for steps and scenario"""
-
-        results = []
-        call_hook('before_each', 'scenario', self)
-
-        def run_scenario(almost_self, order=-1, outline=None, run_callbacks=False):
-            start = time.time()
-            all_steps, steps_passed, steps_failed, steps_undefined, reasons_to_fail = Step.run_all(self.steps, outline, run_callbacks, ignore_case)
-            skip = lambda x: x not in steps_passed and x not in steps_undefined and x not in steps_failed
-
-            steps_skipped = filter(skip, all_steps)
-            if outline:
-                call_hook(
-                    'outline', 'scenario', self, order, outline, reasons_to_fail
-                )
-
-            return ScenarioResult(
-                self,
-                steps_passed,
-                steps_failed,
-                steps_skipped,
-                steps_undefined,
-                time.time() - start 
-            )
-
-        if self.outlines:
-            first = True
-            for index, outline in enumerate(self.outlines):
-                results.append(run_scenario(self, index, outline, run_callbacks=first))
-                first = False
-        else:
-            results.append(run_scenario(self, run_callbacks=True))
-
-        call_hook('after_each', 'scenario', self)
-        return results
+        return self.compile(ignore_case).run(dry_run)
 
     def _add_myself_to_steps(self):
         for step in self.steps:
             step.scenario = self
 
-        for step in self.solved_steps:
-            step.scenario = self
-
-    def _resolve_steps(self, steps, outlines, with_file, original_string):
+    def _resolve_steps(self, steps, outlines):
         for outline in outlines:
             for step in steps:
-                sentence = step.sentence
-                for k, v in outline.items():
-                    sentence = sentence.replace(u'<%s>' % k, v)
+                yield step.solve_and_clone(outline)
+
+    def _compile_outline(self, with_file):
+        unknown = []
+        for step in self.steps:
+            placeholders = step.compile_outline()
+            for placeholder in placeholders:
+                if placeholder in self.keys or placeholder in unknown:
+                    continue
 
-                yield Step(sentence, step._remaining_lines)
+                # markup, as <br/> or <b>...</b>, is left as it is
+                if not PLACEHOLDER_NAME.match(placeholder) or \
+                   u'/' + placeholder in placeholders:
+                    continue
 
-    def _parse_remaining_lines(self, lines, with_file, original_string):
+                unknown.append(placeholder)
+
+        if unknown:
+            raise LettuceSyntaxError(
+                with_file,
+                '\nUnknown placeholders on scenario outline "%s": %s\n'
+                'They must be columns of its examples.\n' % (
+                    self.name, ", ".join([u"<%s>" % p for p in unknown])))
+
+    def _parse_tokens(self, tokens, with_file, original_string):
         invalid_first_line_error = '\nInvalid step on scenario "%s".\n' \
             'Maybe you killed the first step text of that scenario\n'
 
-        if lines and strings.wise_startswith(lines[0], u'|'):
+        if tokens and tokens[0].kind is parser.TABLE:
             raise LettuceSyntaxError(
                 with_file,
                 invalid_first_line_error % self.name)
 
-        return Step.many_from_lines(lines, with_file, original_string)
+        sentences = []
+        for token in tokens:
+            if token.kind is parser.TABLE:
+                sentences[-1][1].append(token)
+            else:
+                sentences.append((token, []))
+
+        return [Step.from_tokens(sentence, rows, with_file)
+                for sentence, rows in sentences]
 
     def _set_definition(self, definition):
         self.described_at = definition
@@ -598,29 +674,51 @@ class Scenario(object):
         if not language:
             language = Language()
 
-        splitted = strings.split_wisely(string, u"(%s):" % language.examples, True)
-        string = splitted[0]
-        keys = []
-        outlines = []
-        if len(splitted) > 1:
-            parts = [l for l in splitted[1:] if l not in language.examples]
-            part = "".join(parts)
-            keys, outlines = strings.parse_hashes(strings.get_stripped_lines(part))
+        tokens = parser.tokenize(string, language, with_file, start=parser.SCENARIO)
+        if original_string and string in original_string:
+            # line numbers must be relative to the whole feature
+            offset = original_string[:original_string.index(string)].count(u"\n")
+            tokens = [token._replace(line=token.line + offset) for token in tokens]
 
-        lines = strings.get_stripped_lines(string)
-        scenario_line = lines.pop(0)
+        return new_scenario.from_tokens(tokens, with_file, original_string, language)
 
-        for repl in (language.scenario_outline, language.scenario):
-            scenario_line = strings.remove_it(scenario_line, u"(%s): " % repl)
+    @classmethod
+    def from_tokens(new_scenario, tokens, with_file=None, original_string=None, language=None):
+        """ Creates a new scenario from tokens, the first one being the
+        scenario name"""
+
+        if not language:
+            language = Language()
+
+        steps = []
+        rows = []
+        in_examples = skip_header = False
+        for token in tokens[1:]:
+            if token.kind is parser.EXAMPLES:
+                # every examples block repeats the header of the first one
+                skip_header = bool(rows)
+                in_examples = True
+
+            elif not in_examples:
+                steps.append(token)
+
+            elif skip_header:
+                skip_header = False
+
+            else:
+                rows.append(token.value)
+
+        keys, outlines = strings.parse_hashes(rows)
 
         scenario = new_scenario(
-            name=scenario_line,
-            remaining_lines=lines,
+            name=tokens[0].value,
+            tokens=steps,
             keys=keys,
             outlines=outlines,
             with_file=with_file,
             original_string=original_string,
-            language=language
+            language=language,
+            line=tokens[0].line
         )
 
         return scenario
@@ -628,8 +726,8 @@ class Scenario(object):
 class Feature(object):
     """ Object that represents a feature."""
     described_at = None
-    def __init__(self, name, remaining_lines, with_file, original_string,
-                 language=None):
+    def __init__(self, name, tokens, with_file, original_string,
+                 language=None, line=None):
 
         if not language:
             language = language()
@@ -637,11 +735,12 @@ class Feature(object):
         self.name = name
         self.language = language
 
-        self.scenarios, self.description = self._parse_remaining_lines(
-            remaining_lines,
+        self.scenarios, description = self._parse_tokens(
+            tokens,
             original_string,
             with_file
         )
+        self.description = u"\n".join([token.value for token in description])
 
         self.original_string = original_string
 
@@ -649,7 +748,9 @@ class Feature(object):
             feature_definition = FeatureDescription(self,
                                                     with_file,
                                                     original_string,
-                                                    language)
+                                                    language,
+                                                    line,
+                                                    [t.line for t in description])
             self._set_definition(feature_definition)
 
         self._add_myself_to_scenarios()
@@ -692,35 +793,13 @@ class Feature(object):
     @classmethod
     def from_string(new_feature, string, with_file=None, language=None):
         """Creates a new feature from string"""
-        lines = strings.get_stripped_lines(string)
         if not language:
             language = Language()
 
-        found = len(re.findall(r'%s:[ ]*\w+' % language.feature, string))
-
-        if found > 1:
-            raise LettuceSyntaxError(
-                with_file,
-                'A feature file must contain ONLY ONE feature!'
-            )
-
-        elif found == 0:
-            raise LettuceSyntaxError(
-                with_file,
-                'Features must have a name. e.g: "Feature: This is my name"'
-            )
-
-
-        while lines:
-            matched = re.search(r'%s:(.*)' % language.feature, lines[0], re.I)
-            if matched:
-                name = matched.groups()[0].strip()
-                break
-
-            lines.pop(0)
-
-        feature = new_feature(name=name,
-                              remaining_lines=lines,
+        tokens = parser.tokenize(string, language, with_file)
+        feature = new_feature(name=tokens[0].value,
+                              line=tokens[0].line,
+                              tokens=tokens[1:],
                               with_file=with_file,
                               original_string=string,
                               language=language)
@@ -739,55 +818,286 @@ class Feature(object):
     def _set_definition(self, definition):
         self.described_at = definition
 
-    def _parse_remaining_lines(self, lines, original_string, with_file=None):
-
-        joined = u"\n".join(lines[1:])
-
-        # replacing occurrencies of Scenario Outline, with just "Scenario"
-        scenario_prefix = u'%s:' % self.language.first_of_scenario
-        regex = re.compile(u"%s:\s" % self.language.scenario_separator, re.U | re.I)
-        joined = regex.sub(scenario_prefix, joined)
+    def _parse_tokens(self, tokens, original_string, with_file=None):
+        description = []
+        scenario_tokens = []
 
-        parts = strings.split_wisely(joined, scenario_prefix)
+        for token in tokens:
+            if token.kind is parser.DESCRIPTION:
+                description.append(token)
 
-        description = u""
+            elif token.kind is parser.SCENARIO:
+                scenario_tokens.append([token])
 
-        if not re.search("^" + scenario_prefix, joined):
-            description = parts[0]
-            parts.pop(0)
+            else:
+                scenario_tokens[-1].append(token)
 
-        scenario_strings = [
-            u"%s: %s" % (self.language.first_of_scenario, s) for s in parts if s.strip()
-        ]
         kw = dict(
             original_string=original_string,
             with_file=with_file,
             language=self.language
         )
 
-        scenarios = [Scenario.from_string(s, **kw) for s in scenario_strings]
+        scenarios = [Scenario.from_tokens(t, **kw) for t in scenario_tokens]
 
         return scenarios, description
 
-    def run(self, scenarios=None, ignore_case=True):
-        call_hook('before_each', 'feature', self)
-        scenarios_ran = []
-
+    def select_scenarios(self, scenarios=None):
+        """Returns the scenarios to run, given their numbers (starting
+        at 1) or None for all of them"""
         if isinstance(scenarios, (tuple, list)):
             if all(map(lambda x: isinstance(x, int), scenarios)):
                 scenarios_to_run = scenarios
         else:
             scenarios_to_run = range(1, len(self.scenarios) + 1)
 
-        for index, scenario in enumerate(self.scenarios):
-            if scenarios_to_run and (index + 1) not in scenarios_to_run:
-                continue
+        return [scenario for index, scenario in enumerate(self.scenarios)
+                if not scenarios_to_run or (index + 1) in scenarios_to_run]
+
+    def compile(self, scenarios=None, ignore_case=True):
+        """Returns a FeaturePlan that runs this feature, or just the
+        given `scenarios` (numbers starting at 1)"""
+        return FeaturePlan(self, self.select_scenarios(scenarios), ignore_case)
+
+    def run(self, scenarios=None, ignore_case=True, dry_run=False):
+        call_hook('before_each', 'feature', self)
+        scenarios_ran = []
 
-            scenarios_ran.extend(scenario.run(ignore_case))
+        # compiling one scenario at a time keeps the plans out of memory
+        for scenario in self.select_scenarios(scenarios):
+            scenarios_ran.extend(scenario.run(ignore_case, dry_run))
 
         call_hook('after_each', 'feature', self)
         return FeatureResult(self, *scenarios_ran)
 
+def call_output_hook(situation, kind, *args, **kw):
+    """Calls only the hooks of output plugins"""
+    call_hook_where(is_output_hook, situation, kind, *args, **kw)
+
+class StepPlan(object):
+    """A step bound to its definition, along with the arguments that
+    the definition's regex extracted from the sentence"""
+    __slots__ = ('step', 'definition', 'args', 'kw')
+
+    def __init__(self, step, ignore_case):
+        self.step = step
+        self.definition = None
+        self.args = ()
+        self.kw = {}
+
+        matched = STEP_REGISTRY.match(step.sentence, ignore_case)
+        if matched:
+            self.definition = StepDefinition(step, STEP_REGISTRY[matched.regex])
+            self.kw = matched.groupdict()
+            if not self.kw:
+                self.args = matched.groups()
+
+    def prepare(self, outline=None):
+        """Clears the state the step got from its last run, binding it
+        to its definition again"""
+        step = self.step
+        for attribute in Step.run_state:
+            step.__dict__.pop(attribute, None)
+
+        step.related_outline = outline
+        if self.definition is not None:
+            step.has_definition = True
+            step.defined_at = self.definition
+
+        return step
+
+class ScenarioPlan(object):
+    """A scenario compiled for running: its steps, already matched to
+    their definitions, or the steps of its outline, which are solved and
+    matched for each of its examples as it comes.
+
+    A plan can run many times. The steps of a scenario without examples
+    are reused to report its results, so these are only valid until the
+    next run. It must be compiled again if step definitions change.
+    """
+    def __init__(self, scenario, ignore_case=True):
+        self.scenario = scenario
+        self.ignore_case = ignore_case
+        self.plans = None
+        if not scenario.outlines:
+            self.plans = tuple([StepPlan(step, ignore_case) for step in scenario.steps])
+
+    @property
+    def examples(self):
+        """Yields the order, outline and step plans of each example,
+        solving the steps of an outline one example at a time"""
+        if not self.scenario.outlines:
+            yield -1, None, self.plans
+            return
+
+        for order, outline in enumerate(self.scenario.outlines):
+            yield order, outline, tuple([
+                StepPlan(step.solve_and_clone(outline), self.ignore_case)
+                for step in self.scenario.steps])
+
+    # the PassedResults of the examples that are not run again when
+    # their inputs did not change, set by the Runner while it runs
+    passed_results = None
+
+    def run(self, dry_run=False):
+        """Runs the scenario, returning a ScenarioResult for each of
+        its examples"""
+        keys = [None] * (len(self.scenario.outlines) or 1)
+        if self.passed_results and not dry_run:
+            keys = [self.passed_results.key_for(self.scenario, outline, plans)
+                    for order, outline, plans in self.examples]
+
+        cached = [key is not None and self.passed_results.passed(key) for key in keys]
+        hook = all(cached) and call_output_hook or call_hook
+
+        results = []
+        hook('before_each', 'scenario', self.scenario)
+
+        first = True
+        for (order, outline, plans), key, reuse in zip(self.examples, keys, cached):
+            result = self._run_example(order, outline, plans, first, dry_run, reuse)
+            result.key = key
+            result.cached = reuse
+            results.append(result)
+            first = False
+
+        hook('after_each', 'scenario', self.scenario)
+        return results
+
+    def _run_example(self, order, outline, plans, run_callbacks, dry_run, cached=False):
+        start = time.time()
+        steps_passed = []
+        steps_failed = []
+        steps_skipped = []
+        steps_undefined = []
+        reasons_to_fail = []
+        hook = cached and call_output_hook or call_hook
+
+        for plan in plans:
+            step = plan.prepare(outline)
+            if plan.definition is None:
+                steps_undefined.append(step)
+
+            else:
+                if run_callbacks:
+                    hook('before_each', 'step', step)
+
+                if steps_failed or steps_undefined or dry_run:
+                    steps_skipped.append(step)
+
+                elif cached:
+                    step.ran = step.passed = step.cached = True
+                    steps_passed.append(step)
+
+                else:
+                    step.ran = True
+                    started = time.time()
+                    try:
+                        plan.definition(*plan.args, **plan.kw)
+                        step.passed = True
+                        steps_passed.append(step)
+                    except Exception:
+                        steps_failed.append(step)
+                        reasons_to_fail.append(step.why)
+
+                    step.duration = time.time() - started
+
+            if run_callbacks:
+                hook('after_each', 'step', step)
+
+        if outline:
+            hook(
+                'outline', 'scenario', self.scenario, order, outline, reasons_to_fail
+            )
+
+        result = ScenarioResult(
+            self.scenario,
+            steps_passed,
+            steps_failed,
+            steps_skipped,
+            steps_undefined,
+            time.time() - start
+        )
+        result.steps = [plan.step for plan in plans]
+        return result
+
+    def serialize(self, results):
+        """Returns the state of every step within `results`, which must
+        come from running this plan, as data that can be sent to
+        another process or written as JSON"""
+        data = []
+        for result in results:
+            states = {}
+            for state in ScenarioResult.states:
+                for step in getattr(result, 'steps_%s' % state):
+                    states[id(step)] = state
+
+            steps = []
+            for ran in result.steps:
+                step = {'state': states.get(id(ran), 'skipped')}
+                if ran.ran:
+                    step['duration'] = ran.duration
+
+                if ran.why:
+                    step['why'] = ran.why.serialize()
+
+                steps.append(step)
+
+            data.append({'duration': result.duration, 'steps': steps,
+                         'key': result.key, 'cached': result.cached})
+
+        return data
+
+    def deserialize(self, data):
+        """Returns the ScenarioResults that `serialize` turned into
+        `data`, setting the state of this plan's steps accordingly"""
+        results = []
+        for example, (order, outline, plans) in zip(data, self.examples):
+            steps = dict([(state, []) for state in ScenarioResult.states])
+            for plan, state in zip(plans, example['steps']):
+                step = plan.prepare(outline)
+                steps[state['state']].append(step)
+                if state['state'] in ('passed', 'failed'):
+                    step.ran = True
+                    step.duration = state.get('duration')
+                    step.passed = state['state'] == 'passed'
+                    step.failed = not step.passed
+                    step.cached = step.passed and example.get('cached', False)
+
+                if 'why' in state:
+                    step.why = ReasonToFail.deserialize(state['why'])
+
+            result = ScenarioResult(
+                self.scenario,
+                steps['passed'],
+                steps['failed'],
+                steps['skipped'],
+                steps['undefined'],
+                example['duration']
+            )
+            result.steps = [plan.step for plan in plans]
+            result.key = example.get('key')
+            result.cached = example.get('cached', False)
+            results.append(result)
+
+        return results
+
+class FeaturePlan(object):
+    """A feature compiled for running, see ScenarioPlan"""
+    def __init__(self, feature, scenarios, ignore_case=True):
+        self.feature = feature
+        self.scenarios = tuple([scenario.compile(ignore_case) for scenario in scenarios])
+
+    def run(self, dry_run=False):
+        """Runs the feature, returning its FeatureResult"""
+        call_hook('before_each', 'feature', self.feature)
+        scenarios_ran = []
+        for plan in self.scenarios:
+            scenarios_ran.extend(plan.run(dry_run))
+
+        call_hook('after_each', 'feature', self.feature)
+        return FeatureResult(self.feature, *scenarios_ran)
+
 class FeatureResult(object):
     """Object that holds results of each scenario ran from within a feature"""
     def __init__(self, feature, *scenario_results):
@@ -800,6 +1110,14 @@ class FeatureResult(object):
 
 class ScenarioResult(object):
     """Object that holds results of each step ran from within a scenario"""
+    states = ('passed', 'failed', 'skipped', 'undefined')
+    # the key of the inputs of the example, see lettuce.cache.PassedResults
+    key = None
+    # whether the example was not run, as it passed before
+    cached = False
+    # every step of the example, in order, when it came from a ScenarioPlan
+    steps = ()
+
     def __init__(self, scenario, steps_passed, steps_failed, steps_skipped,
                  steps_undefined, duration):
 
@@ -818,6 +1136,18 @@ class ScenarioResult(object):
     def passed(self):
         return self.total_steps is len(self.steps_passed)
 
+def propose_definitions(steps):
+    """Returns the steps, within the given undefined ones, that have
+    distinct proposed definitions"""
+    proposed = []
+    sentences = set()
+    for step in steps:
+        if step.proposed_sentence not in sentences:
+            sentences.add(step.proposed_sentence)
+            proposed.append(step)
+
+    return proposed
+
 class TotalResult(object):
     def __init__(self, feature_results):
         self.feature_results = feature_results
@@ -839,16 +1169,9 @@ class TotalResult(object):
                 self._proposed_definitions.extend(scenario_result.steps_undefined)
 
 
-    def _filter_proposed_definitions(self):
-        sentences = []
-        for step in self._proposed_definitions:
-            if step.proposed_sentence not in sentences:
-                sentences.append(step.proposed_sentence)
-                yield step
-
     @property
     def proposed_definitions(self):
-        return list(self._filter_proposed_definitions())
+        return propose_definitions(self._proposed_definitions)
 
     @property
     def features_ran(self):
@@ -865,3 +1188,7 @@ class TotalResult(object):
     @property
     def scenarios_passed(self):
         return len([result for result in self.scenario_results if result.passed])
+
+    @property
+    def scenarios_cached(self):
+        return len([result for result in self.scenario_results if result.cached])
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Drives step definitions and hooks written as coroutines.
+
+Python 2 has no asyncio, so coroutines are written with trollius, its
+backport, and supported only when it is installed:
+
+    @step(u'I fetch (.*)')
+    @asyncio.coroutine
+    def fetch(step, url):
+        response = yield From(get(url))
+
+Each thread runs those coroutines until complete on an event loop of
+its own, created the first time it needs one. When scenarios run
+concurrently (see lettuce.parallel.run_concurrently), every thread
+hands them over to a single loop instead, which runs them as
+concurrent tasks, each one seeing the `world` of the thread that waits
+for it.
+"""
+import sys
+import threading
+
+try:
+    import trollius as asyncio
+except ImportError:
+    asyncio = None
+
+local = threading.local()
+shared = None
+
+def iscoroutinefunction(function):
+    return asyncio is not None and asyncio.iscoroutinefunction(function)
+
+def call(function, *args, **kw):
+    """Calls `function`, waiting for it to complete when it is a
+    coroutine function"""
+    if not iscoroutinefunction(function):
+        return function(*args, **kw)
+
+    return wait(function(*args, **kw))
+
+def wait(coroutine):
+    """Runs `coroutine` until it completes, returning its result"""
+    if shared is not None and threading.current_thread() is not shared.thread:
+        return shared.wait(coroutine)
+
+    return get_loop().run_until_complete(coroutine)
+
+def get_loop():
+    """Returns the event loop of the current thread"""
+    loop = getattr(local, 'loop', None)
+    if loop is None:
+        loop = local.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+    return loop
+
+def close_loop():
+    """Closes the event loop of the current thread, if it has one"""
+    loop = local.__dict__.pop('loop', None)
+    if loop is not None:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+def forget_loop():
+    """Drops, without closing it, the event loop that a forked process
+    inherited, as its file descriptors are shared with the parent"""
+    if local.__dict__.pop('loop', None) is not None:
+        asyncio.set_event_loop(None)
+
+def within(coroutine, local, namespace):
+    """Wraps `coroutine` so that, whenever it resumes, the attributes of
+    the thread local `local` are the ones within `namespace`, which
+    gets whatever the coroutine changes"""
+    resume, args = coroutine.send, (None, )
+    while True:
+        local.__dict__.clear()
+        local.__dict__.update(namespace)
+        try:
+            future = resume(*args)
+        finally:
+            namespace.clear()
+            namespace.update(local.__dict__)
+
+        try:
+            value = yield future
+        except BaseException:
+            resume, args = coroutine.throw, sys.exc_info()
+        else:
+            resume, args = coroutine.send, (value, )
+
+class SharedLoop(object):
+    """An event loop running within a thread of its own, where other
+    threads wait for their coroutines to complete, seeing their own
+    attributes of the thread local `local`"""
+    def __init__(self, local):
+        self.local = local
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name='lettuce-event-loop')
+        self.thread.daemon = True
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def wait(self, coroutine):
+        coroutine = within(coroutine, self.local, self.local.__dict__)
+        done = threading.Event()
+        tasks = []
+
+        def start():
+            task = asyncio.ensure_future(coroutine, loop=self.loop)
+            task.add_done_callback(lambda task: done.set())
+            tasks.append(task)
+
+        self.loop.call_soon_threadsafe(start)
+        done.wait()
+        return tasks[0].result()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+def share_loop(local):
+    """Starts the loop that runs the coroutines of every thread, until
+    `unshare_loop` is called"""
+    global shared
+    if asyncio is not None and shared is None:
+        shared = SharedLoop(local)
+        shared.thread.start()
+
+def unshare_loop():
+    global shared
+    if shared is not None:
+        shared.stop()
+        shared = None
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Spreads the scenarios of a run over workers on other machines.
+
+`lettuce --coordinator :PORT` finds and parses the features, but runs
+none of them. Instead, it hands one scenario at a time to each worker
+that connects with `lettuce --worker HOST:PORT`, started from a copy
+of the same tree and with the same verbosity. The workers send back
+the output and results of each scenario, which the coordinator writes
+and reports in the order of the features, as a serial run would, JUnit
+file included. The scenario of a worker that disconnects before
+sending back its result, or that sends something else than these
+messages, goes back to the queue, to be run by another worker.
+
+Each message is a JSON object within a line of its own:
+
+ * the worker says {"hello": hostname}, and gets {"worker": number};
+ * the coordinator sends {"feature": path, "scenario": index, "line":
+   line}, where path is relative to the base directory of the run, and
+   line is where the scenario starts within it, as the workers parse
+   every scenario of the file while the coordinator may have selected
+   some of them. Outlines also send their "examples" to run;
+ * the worker answers with the same keys, plus the "output" and
+   "results" of that scenario, and gets the next one;
+ * the coordinator sends {"done": true} when every scenario ran.
+
+The coordinator only calls the hooks of the output plugins, and the
+workers call all the other ones. `before.all` and `after.all` run in
+each worker, as it starts and finishes, while `each_worker` and
+`each_feature` hooks run the same way as within forked processes, see
+lettuce.parallel.
+"""
+import json
+import time
+import errno
+import select
+import socket
+from collections import deque
+
+from lettuce.core import FeatureResult
+from lettuce.parallel import Replay
+from lettuce.parallel import run_scenario
+from lettuce.parallel import scenario_tasks
+from lettuce.parallel import not_output_hook
+from lettuce.registry import call_hook
+from lettuce.registry import call_hook_where
+from lettuce.fs import FileSystem
+
+def parse_address(address):
+    """Turns "host:port" into a (host, port) tuple. The host may be
+    left out, as in ":port", to listen on every interface."""
+    host, colon, port = address.rpartition(':')
+    return host, int(port)
+
+class Connection(object):
+    """A socket that sends and receives JSON objects, one per line"""
+    def __init__(self, sock):
+        self.socket = sock
+        self.received = ''
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def send(self, message):
+        self.socket.sendall(json.dumps(message) + '\n')
+
+    def receive(self):
+        """Reads the socket once, returning the messages that arrived
+        completely, or None when the other side closed it"""
+        try:
+            data = self.socket.recv(65536)
+        except socket.error:
+            data = ''
+
+        if not data:
+            return None
+
+        lines = (self.received + data).split('\n')
+        self.received = lines.pop()
+        return [json.loads(line) for line in lines]
+
+    def read(self):
+        """Waits for the next message, returning None when the other
+        side closed the socket"""
+        while '\n' not in self.received:
+            data = self.socket.recv(65536)
+            if not data:
+                return None
+
+            self.received += data
+
+        line, self.received = self.received.split('\n', 1)
+        return json.loads(line)
+
+    def close(self):
+        self.socket.close()
+
+class Coordinator(object):
+    """Hands the scenarios of `features` to the workers connecting to
+    `address`. `paths` are the feature files, relative to the base
+    directory of the run."""
+    def __init__(self, features, paths, address, scenarios=None, ignore_case=True):
+        self.features = features
+        self.paths = paths
+        self.indexes = dict([(path, index) for index, path in enumerate(paths)])
+        self.tasks = scenario_tasks(features, scenarios)
+        self.pending = deque(self.tasks)
+        self.replay = Replay(features, self.tasks, ignore_case)
+        self.connections = []
+        self.running = {}
+        self.idle = []
+        self.workers = 0
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(parse_address(address))
+        self.server.listen(128)
+        self.address = self.server.getsockname()
+
+    def run(self):
+        """Waits for workers until every scenario ran, returning a
+        FeatureResult for each feature"""
+        try:
+            if not self.tasks:
+                self.replay.finish()
+
+            while not self.replay.finished:
+                try:
+                    readable = select.select([self.server] + self.connections, [], [])[0]
+                except select.error, e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+
+                    raise
+
+                for ready in readable:
+                    if ready is self.server:
+                        self.connections.append(Connection(self.server.accept()[0]))
+                    elif ready in self.connections:
+                        self.receive(ready)
+        finally:
+            self.close()
+
+        return self.replay.feature_results
+
+    def receive(self, connection):
+        try:
+            messages = connection.receive()
+        except ValueError:
+            # not JSON, whatever connected is no worker
+            messages = None
+
+        if messages is None:
+            self.drop(connection)
+            return
+
+        for message in messages:
+            try:
+                self.handle(connection, message)
+            except (KeyError, TypeError, ValueError):
+                self.drop(connection)
+                return
+
+    def handle(self, connection, message):
+        if 'hello' in message:
+            self.send(connection, {'worker': self.workers})
+            self.workers += 1
+            self.dispatch(connection)
+
+        elif self.running.get(connection) == (message['feature'], message['scenario']):
+            output, results = message['output'], message['results']
+            if not isinstance(output, basestring) or not isinstance(results, list):
+                self.drop(connection)
+                return
+
+            del self.running[connection]
+            self.replay.add(self.indexes[message['feature']], message['scenario'],
+                            output, results)
+            self.dispatch(connection)
+
+    def dispatch(self, connection):
+        """Sends the next scenario to a worker that is done with the
+        previous one, or keeps it idle when none is left"""
+        if connection not in self.connections:
+            return
+
+        if not self.pending:
+            self.idle.append(connection)
+            return
+
+        feature_index, scenario_index = self.pending.popleft()
+        scenario = self.features[feature_index].scenarios[scenario_index]
+        message = {'feature': self.paths[feature_index], 'scenario': scenario_index,
+                   'line': scenario.described_at.line}
+        if scenario.outlines:
+            message['examples'] = scenario.outlines
+
+        self.running[connection] = self.paths[feature_index], scenario_index
+        self.send(connection, message)
+
+    def send(self, connection, message):
+        try:
+            connection.send(message)
+        except socket.error:
+            self.drop(connection)
+
+    def drop(self, connection):
+        """Forgets a worker that went away, queueing its scenario again"""
+        if connection not in self.connections:
+            return
+
+        self.connections.remove(connection)
+        if connection in self.idle:
+            self.idle.remove(connection)
+
+        connection.close()
+        running = self.running.pop(connection, None)
+        if running is not None:
+            path, scenario_index = running
+            self.pending.appendleft((self.indexes[path], scenario_index))
+            while self.idle and self.pending:
+                self.dispatch(self.idle.pop(0))
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send({'done': True})
+            except socket.error:
+                pass
+
+            connection.close()
+
+        self.connections = []
+        self.running.clear()
+        self.idle = []
+        self.server.close()
+
+def connect(address, timeout=30):
+    """Connects to the coordinator at `address`, retrying for `timeout`
+    seconds, as workers may start before it"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return Connection(socket.create_connection(parse_address(address)))
+        except socket.error:
+            if time.time() > deadline:
+                raise
+
+            time.sleep(0.1)
+
+def work(address, base_dir, load_feature, ignore_case=True, dry_run=False):
+    """Runs the scenarios handed over by the coordinator at `address`,
+    until it says they are done, returning a FeatureResult for each
+    feature this worker ran scenarios of"""
+    connection = connect(address)
+    connection.send({'hello': socket.gethostname()})
+    welcome = connection.read()
+    if not welcome or 'worker' not in welcome:
+        # every scenario ran before this worker arrived
+        connection.close()
+        return []
+
+    number = welcome['worker']
+
+    features = {}
+    scenarios_ran = {}
+    current = None
+    call_hook('before_each', 'worker', number)
+    try:
+        for message in iter(connection.read, None):
+            if message.get('done'):
+                break
+
+            path = message['feature']
+            if path not in features:
+                features[path] = load_feature(FileSystem.join(base_dir, path))
+                scenarios_ran[path] = []
+
+            feature = features[path]
+            if feature is not current:
+                if current is not None:
+                    call_hook_where(not_output_hook, 'after_each', 'feature', current)
+
+                call_hook_where(not_output_hook, 'before_each', 'feature', feature)
+                current = feature
+
+            lines = [scenario.described_at.line for scenario in feature.scenarios]
+            index = lines.index(message['line'])
+            if 'examples' in message:
+                feature.scenarios[index].outlines = message['examples']
+
+            output, results, data = run_scenario(feature, index, ignore_case, dry_run)
+            scenarios_ran[path].extend(results)
+            message.update(output=output, results=data)
+            connection.send(message)
+
+        if current is not None:
+            call_hook_where(not_output_hook, 'after_each', 'feature', current)
+    finally:
+        call_hook('after_each', 'worker', number)
+        connection.close()
+
+    return [FeatureResult(features[ran], *scenarios_ran[ran])
+            for ran in sorted(features)]
@@ -20,11 +20,15 @@ import sys
 from optparse import make_option
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
 from django.test.utils import setup_test_environment
 from django.test.utils import teardown_test_environment
 
 from lettuce import Runner
+from lettuce import import_terrain
 from lettuce import registry
+from lettuce import impact
+from lettuce import sharding
 
 from lettuce.django import server
 from lettuce.django import harvest_lettuces
@@ -56,6 +60,68 @@ class Command(BaseCommand):
         
         make_option('-x', '--xml', action='store', dest='xml_filename', default=None,
             help='Outputs JUnit compatible XML to given file'),
+
+        make_option('--parse-workers', action='store', dest='parse_workers', default=None,
+            type='int', help='Parse all the feature files up front, within this many processes'),
+
+        make_option('--parse-ahead', action='store', dest='parse_ahead', default=None,
+            type='int', help='Parse feature files in background while the previous ones run, '
+            'keeping at most this many parsed features in memory'),
+
+        make_option('--resolve-steps', action='store_true', dest='resolve', default=False,
+            help='Match every step before running any of them, reporting the undefined ones up front'),
+
+        make_option('--strict', action='store_true', dest='strict', default=False,
+            help='Like --resolve-steps, but do not run anything when some step is undefined'),
+
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Parse the features and match their steps, reporting them without running '
+            'any step or hook, nor the test server'),
+
+        make_option('--processes', action='store', dest='processes', default=None, type='int',
+            help='Run the scenarios within this many worker processes, forked after loading '
+            'the step definitions. They all share the same test database and server'),
+
+        make_option('--threads', action='store', dest='threads', default=None, type='int',
+            help='Run the features concurrently within this many threads, each one with its own world'),
+
+        make_option('--async-concurrency', action='store', dest='async_concurrency', default=None,
+            type='int', help='Run this many scenarios of each feature at a time, their coroutine '
+            'steps and hooks sharing one event loop'),
+
+        make_option('--shard', action='store', dest='shard', default=None, metavar='K/N',
+            help='Run only the K-th of N shards of the scenarios, balanced by the durations '
+            'recorded on earlier runs'),
+
+        make_option('--failed-first', action='store_true', dest='failed_first', default=False,
+            help='Run the scenarios that failed on their last run before the other ones'),
+
+        make_option('--last-failed', action='store_true', dest='last_failed', default=False,
+            help='Run only the scenarios, and examples of outlines, that failed on their last run, '
+            'or all of them when none failed'),
+
+        make_option('--trace', action='store_true', dest='trace', default=False,
+            help='Record the source files each scenario runs code from, '
+            'for --changed-since and --changed-files'),
+
+        make_option('--changed-since', action='store', dest='changed_since', default=None,
+            metavar='REVISION', help='Run only the scenarios that depend on the files changed '
+            'since this git revision, according to --trace'),
+
+        make_option('--changed-files', action='store', dest='changed_files', default=None,
+            help='Comma separated list of changed files, running only the scenarios that '
+            'depend on them, according to --trace'),
+
+        make_option('--reuse-passed', action='store_true', dest='reuse_passed', default=False,
+            help='Do not run again the scenarios that passed on a previous run, while neither '
+            'their text nor the code of their steps, hooks and terrain change'),
+
+        make_option('--no-history', action='store_true', dest='no_history', default=False,
+            help='Do not record this run within .lettuce_history.db'),
+
+        make_option('--no-cache', action='store_true', dest='no_cache', default=False,
+            help='Always parse the feature files and match the steps, '
+            'ignoring the cache of previous runs'),
     )
     def stopserver(self, failed=False):
         raise SystemExit(int(failed))
@@ -75,13 +141,34 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         setup_test_environment()
+        # the terrain registers the hooks of the server and of harvest,
+        # which are called before any Runner
+        import_terrain()
 
         settings.DEBUG = options.get('debug', False)
 
         verbosity = int(options.get('verbosity', 4))
         apps_to_run = tuple(options.get('apps', '').split(","))
         apps_to_avoid = tuple(options.get('avoid_apps', '').split(","))
-        run_server = not options.get('no_server', False)
+        dry_run = options.get('dry_run', False)
+        run_server = not options.get('no_server', False) and not dry_run
+
+        shard = None
+        if options.get('shard'):
+            try:
+                shard = sharding.parse(options['shard'])
+            except ValueError:
+                raise CommandError('--shard takes K/N, where 1 <= K <= N, e.g. --shard 2/4')
+
+        changed_files = None
+        if options.get('changed_files') is not None:
+            changed_files = [name for name in options['changed_files'].split(',') if name]
+
+        if options.get('changed_since'):
+            try:
+                changed_files = (changed_files or []) + impact.changed_since(options['changed_since'])
+            except ValueError, e:
+                raise CommandError('--changed-since could not list the changed files: %s' % e)
 
         paths = self.get_paths(args, apps_to_run, apps_to_avoid)
         if run_server:
@@ -92,6 +179,8 @@ class Command(BaseCommand):
 
         failed = False
 
+        output_only = registry.CALLBACK_REGISTRY.output_only
+        registry.CALLBACK_REGISTRY.output_only = output_only or dry_run
         registry.call_hook('before', 'harvest', locals())
         results = []
         try:
@@ -103,13 +192,33 @@ class Command(BaseCommand):
                 if app_module is not None:
                     registry.call_hook('before_each', 'app', app_module)
 
-                runner = Runner(path, options.get('scenarios'), verbosity, options.get('xml_filename', None))
+                runner = Runner(path, options.get('scenarios'), verbosity,
+                                options.get('xml_filename', None),
+                                use_cache=not options.get('no_cache', False),
+                                parse_workers=options.get('parse_workers'),
+                                parse_ahead=options.get('parse_ahead'),
+                                resolve=options.get('resolve', False),
+                                strict=options.get('strict', False),
+                                dry_run=dry_run,
+                                processes=options.get('processes'),
+                                threads=options.get('threads'),
+                                async_concurrency=options.get('async_concurrency'),
+                                shard=shard,
+                                history=not options.get('no_history', False),
+                                failed_first=options.get('failed_first', False),
+                                last_failed=options.get('last_failed', False),
+                                trace=options.get('trace', False),
+                                changed_files=changed_files,
+                                reuse_passed=options.get('reuse_passed'))
                 result = runner.run()
                 if app_module is not None:
                     registry.call_hook('after_each', 'app', app_module, result)
 
                 results.append(result)
-                if not result or result.steps != result.steps_passed:
+                if not result or result.steps_undefined:
+                    failed = True
+
+                elif not dry_run and result.steps != result.steps_passed:
                     failed = True
 
         except Exception, e:
@@ -118,5 +227,6 @@ class Command(BaseCommand):
 
         finally:
             registry.call_hook('after', 'harvest', results)
+            registry.CALLBACK_REGISTRY.output_only = output_only
             server.stop(failed)
             teardown_test_environment()
@@ -39,8 +39,56 @@ class ReasonToFail(object):
         self.cause = unicode(exc)
         self.traceback = traceback.format_exc(exc)
 
+    def serialize(self):
+        """Returns the reason as data that can be sent to another
+        process or written as JSON"""
+        kind = type(self.exception)
+        return {
+            'module': kind.__module__,
+            'type': kind.__name__,
+            'args': [unicode(arg) for arg in self.exception.args],
+            'cause': self.cause,
+            'traceback': self.traceback,
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        """Returns the ReasonToFail that `serialize` turned into `data`.
+        The exception is rebuilt from its class when it can be imported,
+        or from a stand-in class with the same name otherwise."""
+        try:
+            module = __import__(data['module'], fromlist=[data['type']])
+            kind = getattr(module, data['type'])
+        except (ImportError, AttributeError):
+            kind = None
+
+        if not isinstance(kind, type) or not issubclass(kind, BaseException):
+            kind = type(str(data['type']), (Exception, ), {'__module__': data['module']})
+
+        exception = kind.__new__(kind)
+        exception.args = tuple(data['args'])
+
+        reason = cls.__new__(cls)
+        reason.exception = exception
+        reason.cause = data['cause']
+        reason.traceback = data['traceback']
+        return reason
+
+class WorkerDied(Exception):
+    """Raised when the worker processes running scenarios exited
+    before running all of them"""
+
 class LettuceSyntaxError(SyntaxError):
     def __init__(self, filename, string):
         self.filename = filename
         self.msg = "Syntax error at: %s\n%s\n" % (filename, string)
 
+class LettuceSyntaxErrors(LettuceSyntaxError):
+    """ Syntax errors found in many feature files at once, so that all
+    of them can be reported together. Takes a list of (filename,
+    message) tuples.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        self.filename = errors[0][0]
+        self.msg = "".join([msg for filename, msg in errors])
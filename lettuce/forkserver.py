@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Keeps lettuce, the terrain and the step definitions imported within
+a daemon, so that short runs don't spend most of their time importing
+them.
+
+`lettuce --server [PATH]` imports the step definitions under PATH and
+listens on a Unix socket, .lettuce_server.sock by default. Each
+`lettuce --client ARGS` sends its arguments to it, and the server forks
+a child that runs lettuce with them, as `lettuce ARGS` would, only
+reloading the terrain and the step modules that changed since the server
+started, after dropping what they registered before.
+
+Each message is a JSON object within a line of its own:
+
+ * the client sends {"args": arguments, "cwd": directory};
+ * the server sends {"stdout": data} and {"stderr": data} as the run
+   writes them, and {"exit": status} when it finishes.
+
+The data is the output decoded as latin-1, which maps every byte to a
+character of its own, so that output split within a character survives.
+The server only runs requests from the directory it started at, as the
+terrain it imported belongs there. Standard input is not forwarded.
+"""
+import os
+import sys
+import errno
+import select
+import signal
+import socket
+import traceback
+
+from lettuce import registry
+from lettuce import import_terrain
+from lettuce.fs import FeatureLoader
+from lettuce.fs import FileSystem
+from lettuce.distributed import Connection
+
+SOCKET_FILE = '.lettuce_server.sock'
+
+def preload(base_path):
+    """Imports the terrain and the step definitions under `base_path`,
+    recording them as preloaded so that the runs forked later don't
+    import them again"""
+    import_terrain()
+    loader = FeatureLoader(base_path)
+    files = FileSystem.locate(loader.base_dir, '*.py')
+    loader.load_step_definitions(files)
+    terrain = terrain_file()
+    if terrain and terrain not in files:
+        files.append(terrain)
+
+    for filename in files:
+        FeatureLoader.preloaded[filename] = os.stat(filename).st_mtime
+
+def terrain_file():
+    """Returns the source file of the terrain lettuce imported,
+    or None"""
+    filename = getattr(sys.modules.get('terrain'), '__file__', None)
+    if filename and filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+
+    return filename and os.path.abspath(filename)
+
+def reload_terrain():
+    """Reloads the terrain when it changed since the server started,
+    dropping the hooks it registered before"""
+    filename = terrain_file()
+    if filename not in FeatureLoader.preloaded or not os.path.exists(filename):
+        return
+
+    mtime = os.stat(filename).st_mtime
+    if FeatureLoader.preloaded[filename] == mtime:
+        return
+
+    registry.forget(filename)
+    root = os.path.dirname(filename)
+    sys.path.insert(0, root)
+    try:
+        reload(sys.modules['terrain'])
+    finally:
+        sys.path.remove(root)
+
+    # the step modules under the base directory may include it
+    FeatureLoader.preloaded[filename] = mtime
+
+def serve(path, base_path):
+    """Serves the requests of clients connecting to the Unix socket at
+    `path`, until interrupted"""
+    preload(base_path)
+    root = os.getcwd()
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(16)
+    # the children that handle requests are reaped right away
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    sys.stderr.write("lettuce is serving at %s, press Ctrl-C to stop\n" % path)
+
+    try:
+        while True:
+            try:
+                sock = listener.accept()[0]
+            except socket.error, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+
+                raise
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork():
+                sock.close()
+                continue
+
+            try:
+                listener.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                handle(Connection(sock), root)
+            finally:
+                os._exit(0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+def handle(connection, root):
+    """Runs the request that arrives through `connection` within a
+    child process, sending back its output and exit status"""
+    request = connection.read()
+    if not request:
+        return
+
+    stdout, stdout_child = os.pipe()
+    stderr, stderr_child = os.pipe()
+    pid = os.fork()
+    if not pid:
+        connection.close()
+        os.close(stdout)
+        os.close(stderr)
+        os.dup2(stdout_child, 1)
+        os.dup2(stderr_child, 2)
+        os._exit(run(request['args'], request['cwd'], root))
+
+    os.close(stdout_child)
+    os.close(stderr_child)
+    streams = {stdout: 'stdout', stderr: 'stderr'}
+    try:
+        while streams:
+            for fd in select.select(list(streams), [], [])[0]:
+                data = os.read(fd, 65536)
+                if data:
+                    connection.send({streams[fd]: data.decode('latin-1')})
+                else:
+                    os.close(fd)
+                    del streams[fd]
+    except socket.error:
+        # the client went away, there is no one to tell the results to
+        os.kill(pid, signal.SIGTERM)
+
+    status = os.waitpid(pid, 0)[1]
+    code = 1
+    if os.WIFEXITED(status):
+        code = os.WEXITSTATUS(status)
+
+    try:
+        connection.send({'exit': code})
+    except socket.error:
+        pass
+
+def run(args, cwd, root):
+    """Runs lettuce with the command line arguments `args` from within
+    `cwd`, returning its exit status"""
+    # they may be replaced, as by nose, but the output goes to 1 and 2
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+    try:
+        if os.path.realpath(cwd) != os.path.realpath(root):
+            sys.stderr.write("the lettuce server runs from %s, it can not run from %s\n" % (root, cwd))
+            return 2
+
+        from lettuce import commands
+        sys.argv = ['lettuce'] + list(args)
+        try:
+            reload_terrain()
+            commands.main(args)
+        except SystemExit, e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+
+            sys.stderr.write("%s\n" % e.code)
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+        return 0
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+def request(args, path=None):
+    """Asks the server listening at `path` to run lettuce with the
+    command line arguments `args`, writing its output along the way.
+    Returns its exit status."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path or SOCKET_FILE)
+    connection = Connection(sock)
+    connection.send({'args': list(args), 'cwd': os.getcwd()})
+
+    streams = {'stdout': sys.stdout, 'stderr': sys.stderr}
+    try:
+        while True:
+            message = connection.read()
+            if message is None:
+                sys.stderr.write("the lettuce server went away before the run finished\n")
+                return 2
+
+            if 'exit' in message:
+                return message['exit']
+
+            for name, data in message.items():
+                streams[name].write(data.encode('latin-1'))
+                streams[name].flush()
+    finally:
+        connection.close()
@@ -25,15 +25,33 @@ import zipfile
 from glob import glob
 from os.path import abspath, join, dirname, curdir, exists
 
+from lettuce import registry
+
 class FeatureLoader(object):
     """Loader class responsible for findind features and step
     definitions along a given path on filesystem"""
+    # modification time of the step modules that lettuce.forkserver
+    # loaded up front, by file name
+    preloaded = {}
+
     def __init__(self, base_dir):
         self.base_dir = FileSystem.abspath(base_dir)
 
     def find_and_load_step_definitions(self):
         files = FileSystem.locate(self.base_dir, '*.py')
+        self.load_step_definitions(files)
+
+    def load_step_definitions(self, files):
+        """Imports, or reloads, the modules of the given files"""
         for filename in files:
+            if filename in self.preloaded:
+                if self.preloaded[filename] == os.stat(filename).st_mtime:
+                    # loaded by the fork server, and unchanged since
+                    continue
+
+                # what it registered before would match along the new one
+                registry.forget(filename)
+
             root = FileSystem.dirname(filename)
             sys.path.insert(0, root)
             to_load = FileSystem.filename(filename, with_extension=False)
@@ -57,17 +75,17 @@ class FileSystem(object):
     @classmethod
     def _import(cls, name):
         sys.path.insert(0, cls.current_dir())
-        fp, pathname, description = imp.find_module(name)
-
+        fp = None
         try:
-            module = imp.load_module(name, fp, pathname, description)
-            sys.path.remove(cls.current_dir())
-            return module
+            fp, pathname, description = imp.find_module(name)
+            return imp.load_module(name, fp, pathname, description)
         finally:
             # Since we may exit via an exception, close fp explicitly.
             if fp:
                 fp.close()
 
+            sys.path.remove(cls.current_dir())
+
     @classmethod
     def pushd(cls, *path):
         """Change current dir to `path`, adding it to a stack. Can be
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Keeps the outcome of every run within a SQLite database, to spot
+scenarios and steps that got slower over time.
+
+Each run is recorded along with the git revision it ran at, when there
+is one, and the status and duration of each of its scenarios, one row
+per example of outlines, and of each of their steps.
+"""
+import sys
+import sqlite3
+import subprocess
+
+from lettuce.fs import FileSystem
+
+HISTORY_FILE = '.lettuce_history.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    revision TEXT,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS scenarios (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    scenario TEXT NOT NULL,
+    example INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    scenario TEXT NOT NULL,
+    example INTEGER NOT NULL,
+    line INTEGER,
+    sentence TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS scenarios_by_run ON scenarios (run, scenario);
+CREATE INDEX IF NOT EXISTS steps_by_run ON steps (run, scenario, sentence);
+"""
+
+def git_revision():
+    """Returns the git revision of the current directory, or None"""
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = process.communicate()[0]
+    except OSError:
+        return None
+
+    return process.returncode == 0 and output.strip() or None
+
+def status_of(result):
+    if result.cached:
+        return 'cached'
+    elif result.passed:
+        return 'passed'
+    elif result.steps_failed:
+        return 'failed'
+    elif result.steps_undefined:
+        return 'undefined'
+
+    return 'skipped'
+
+class History(object):
+    """The run history kept within `filename`"""
+    def __init__(self, filename=None):
+        self.filename = filename or FileSystem.current_dir(HISTORY_FILE)
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.filename, timeout=30)
+            self._connection.executescript(SCHEMA)
+
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def record(self, total, started_at, duration, revision=None):
+        """Records the results of `total`, a TotalResult, returning
+        the id of the new run, or None when the database can not be
+        written, as the history must not fail a run that is over"""
+        try:
+            return self._record(total, started_at, duration, revision)
+        except sqlite3.Error, e:
+            self.close()
+            sys.stderr.write("lettuce could not record the run within %s: %s\n" % (self.filename, e))
+            return None
+
+    def _record(self, total, started_at, duration, revision):
+        with self.connection as connection:
+            cursor = connection.execute(
+                'INSERT INTO runs (started_at, revision, duration) VALUES (?, ?, ?)',
+                (started_at.isoformat(), revision or git_revision(), duration))
+            run = cursor.lastrowid
+
+            examples = {}
+            scenarios, steps = [], []
+            for result in total.scenario_results:
+                scenario_id = result.scenario.id
+                example = examples[scenario_id] = examples.get(scenario_id, -1) + 1
+                duration = result.duration
+                if result.cached:
+                    # it did not run, so it has no duration to tell
+                    duration = None
+
+                scenarios.append((run, scenario_id, example, status_of(result), duration))
+
+                for status in ('passed', 'failed', 'skipped', 'undefined'):
+                    for step in getattr(result, 'steps_%s' % status):
+                        steps.append((run, scenario_id, example, step.described_at.line,
+                                      step.sentence, status, step.duration))
+
+            connection.executemany('INSERT INTO scenarios VALUES (?, ?, ?, ?, ?)', scenarios)
+            connection.executemany('INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?)', steps)
+
+        return run
+
+    def runs(self, limit=None):
+        """Returns (id, started_at, revision, duration) for the latest
+        runs, the latest first"""
+        query = 'SELECT id, started_at, revision, duration FROM runs ORDER BY id DESC'
+        if limit:
+            query += ' LIMIT %d' % limit
+
+        return self.connection.execute(query).fetchall()
+
+    def find_run(self, reference=None):
+        """Returns the id of the run `reference` stands for: a run id,
+        or the latest run at a revision starting with it. Without a
+        reference, returns the run before the latest one."""
+        if reference is None:
+            runs = self.runs(2)
+            return len(runs) == 2 and runs[1][0] or None
+
+        if reference.isdigit():
+            found = self.connection.execute(
+                'SELECT id FROM runs WHERE id = ?', (int(reference), )).fetchone()
+            if found:
+                return found[0]
+
+        found = self.connection.execute(
+            'SELECT id FROM runs WHERE revision LIKE ? ORDER BY id DESC LIMIT 1',
+            (reference + '%', )).fetchone()
+        return found and found[0] or None
+
+    def slowest(self, limit=10, run=None):
+        """Returns (scenario, duration, status) for the slowest
+        scenarios of `run`, the latest one by default. The duration of
+        outlines adds up all of their examples."""
+        run = run or self.runs(1)[0][0]
+        return self.connection.execute(
+            'SELECT scenario, SUM(duration), MIN(status) FROM scenarios '
+            'WHERE run = ? AND duration IS NOT NULL GROUP BY scenario ORDER BY SUM(duration) DESC LIMIT ?', (run, limit)).fetchall()
+
+    def trends(self, limit=10, runs=5):
+        """Returns (scenario, durations) for the slowest scenarios of
+        the latest run, where durations has one item per each of the
+        latest `runs` runs, oldest first, None when it did not run"""
+        ids = [run for run, started_at, revision, duration in reversed(self.runs(runs))]
+        trends = []
+        for scenario, duration, status in self.slowest(limit, ids[-1]):
+            found = dict(self.connection.execute(
+                'SELECT run, SUM(duration) FROM scenarios WHERE scenario = ? AND run >= ? '
+                'GROUP BY run', (scenario, ids[0])).fetchall())
+            trends.append((scenario, [found.get(run) for run in ids]))
+
+        return trends
+
+    def slower_steps(self, baseline, threshold=0.2, run=None):
+        """Returns (scenario, sentence, baseline duration, duration)
+        for the steps of `run`, the latest one by default, that took
+        more than `threshold` times longer than on `baseline`"""
+        run = run or self.runs(1)[0][0]
+        return self.connection.execute(
+            'SELECT current.scenario, current.sentence, past.duration, current.duration '
+            'FROM (SELECT scenario, sentence, AVG(duration) AS duration FROM steps '
+            '      WHERE run = ? AND duration IS NOT NULL GROUP BY scenario, sentence) current '
+            'JOIN (SELECT scenario, sentence, AVG(duration) AS duration FROM steps '
+            '      WHERE run = ? AND duration IS NOT NULL GROUP BY scenario, sentence) past '
+            'ON current.scenario = past.scenario AND current.sentence = past.sentence '
+            'WHERE past.duration > 0 AND current.duration > past.duration * (1 + ?) '
+            'ORDER BY current.duration - past.duration DESC',
+            (run, baseline, threshold)).fetchall()
+
+def print_report(history, kind, baseline=None, threshold=0.2, stream=None):
+    """Writes one of the reports, "slowest", "trends" or
+    "slower-steps", to `stream`, sys.stdout by default"""
+    stream = stream or sys.stdout
+    write = lambda text: stream.write(text.encode('utf-8'))
+
+    if not FileSystem.exists(history.filename) or not history.runs(1):
+        write(u"No runs recorded within %s yet\n" % history.filename)
+        return
+
+    if kind == 'slowest':
+        for scenario, duration, status in history.slowest():
+            write(u"%9.3fs  %-9s %s\n" % (duration, status, scenario))
+
+    elif kind == 'trends':
+        for scenario, durations in history.trends():
+            durations = [duration is None and '      -' or '%6.3fs' % duration
+                         for duration in durations]
+            write(u"%s  %s\n" % (' '.join(durations), scenario))
+
+    elif kind == 'slower-steps':
+        run = history.find_run(baseline)
+        if run is None:
+            write(u"No baseline run found for %s\n" % (baseline or 'the previous run'))
+            return
+
+        write(u"Steps more than %d%% slower than on run %d:\n" % (threshold * 100, run))
+        for scenario, sentence, past, current in history.slower_steps(run, threshold):
+            write(u"%9.3fs -> %.3fs  %s (%s)\n" % (past, current, sentence, scenario))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Finds out which source files each scenario depends on, to run only
+the scenarios that a change may affect.
+
+While tracing, every function called within a scenario adds its file
+to the ones of that scenario, along with the feature file itself. Only
+files under the current directory count, leaving out lettuce itself
+and installed packages. Tracing covers the scenarios that run within
+the current process and its threads, but not within forked workers.
+
+Scenarios without any recorded file, as new ones, always count as
+affected.
+"""
+import os
+import sys
+import threading
+import subprocess
+
+from lettuce.core import ScenarioPlan
+from lettuce.fs import FileSystem
+
+SCENARIO_RUN = ScenarioPlan.run.im_func.func_code
+LETTUCE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+class Tracer(object):
+    """Records the source files that each scenario runs code from"""
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or os.getcwd()) + os.sep
+        self.files = {}
+        self.local = threading.local()
+        self.names = {}
+        self.previous = None
+
+    def start(self):
+        self.previous = sys.gettrace()
+        threading.settrace(self.trace)
+        sys.settrace(self.trace)
+
+    def stop(self):
+        sys.settrace(self.previous)
+        threading.settrace(self.previous)
+
+    def name_of(self, filename):
+        """Returns `filename` relative to the current directory, or
+        None when it is not one of the files to track"""
+        if filename not in self.names:
+            path = os.path.abspath(filename)
+            if (not path.startswith(self.root) or path.startswith(LETTUCE_DIR)
+                or 'site-packages' in path or not os.path.exists(path)):
+                self.names[filename] = None
+            else:
+                self.names[filename] = FileSystem.relpath(path)
+
+        return self.names[filename]
+
+    def trace(self, frame, event, arg):
+        code = frame.f_code
+        if code is SCENARIO_RUN:
+            scenario = frame.f_locals['self'].scenario
+            files = self.local.files = self.files.setdefault(scenario.id, set())
+            if scenario.with_file:
+                files.add(FileSystem.relpath(scenario.with_file))
+
+            return self.leave
+
+        files = getattr(self.local, 'files', None)
+        if files is not None:
+            name = self.name_of(code.co_filename)
+            if name:
+                files.add(name)
+
+    def leave(self, frame, event, arg):
+        if event == 'return':
+            self.local.files = None
+
+        return self.leave
+
+def changed_since(revision):
+    """Returns the files, relative to the current directory, that
+    changed since the git `revision`, untracked ones included. Raises
+    ValueError when git can't tell."""
+    changed = []
+    for command in (['git', 'diff', '--name-only', '--relative', revision, '--'],
+                    ['git', 'ls-files', '--others', '--exclude-standard']):
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            output, error = process.communicate()
+        except OSError, e:
+            raise ValueError('git could not run: %s' % e)
+
+        if process.returncode != 0:
+            raise ValueError((error.strip().splitlines() or ['git failed'])[0])
+
+        changed.extend([line.decode('utf-8') for line in output.splitlines() if line])
+
+    return changed
+
+def affected(scenario, impact, changed):
+    """Tells whether `scenario` depends on any of the `changed` files,
+    according to `impact`, the files of each scenario by id"""
+    files = impact.get(scenario.id)
+    if not files:
+        return True
+
+    return not changed.isdisjoint(files)
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Runs scenarios within forked worker processes, or features within
+a pool of threads.
+
+The parent process parses the features and calls the `before.all`
+hooks before forking, so the workers inherit the step definitions,
+`terrain` and whatever those hooks left in `world`. Each worker then
+pulls one scenario at a time from a shared queue, so a long feature is
+spread over many workers.
+
+Hooks run this way:
+
+ * `before.all` and `after.all` run once, in the parent;
+ * `before.each_worker` and `after.each_worker` run in each worker, as
+   it starts and before it exits, receiving the worker number;
+ * `each_feature` hooks, except the output ones, run in the worker the
+   first time it picks a scenario of that feature, and when it moves to
+   another feature or exits. So they may run once per worker;
+ * `each_scenario`, `each_step` and `outline` hooks run in the worker.
+
+The output of each scenario is captured within the worker and written
+by the parent, in the order of the features, along with the output of
+the `each_feature` hooks of the output plugins.
+
+Within threads, whole features run concurrently, each thread starting
+with a copy of the `world` that the `before.all` hooks left in the main
+thread. The output of each feature is buffered, and written in the
+order of the features as they finish.
+
+Running concurrently, features run one after the other, along with
+their hooks, while their scenarios run within a pool of threads. Each
+scenario starts with a copy of the `world` of the main thread, and the
+coroutines of every one of them run as concurrent tasks on a single
+event loop, see lettuce.coroutines.
+"""
+import sys
+import Queue
+import threading
+import multiprocessing
+from StringIO import StringIO
+from multiprocessing.pool import ThreadPool
+
+from lettuce import coroutines
+
+from lettuce.core import FeatureResult
+from lettuce.exceptions import WorkerDied
+from lettuce.registry import call_hook
+from lettuce.registry import call_hook_where
+from lettuce.registry import is_output_hook
+from lettuce.registry import world
+
+not_output_hook = lambda callback: not is_output_hook(callback)
+
+def scenario_tasks(features, scenarios=None):
+    """Returns a (feature index, scenario index) tuple for each
+    scenario to run, in order"""
+    tasks = []
+    for feature_index, feature in enumerate(features):
+        selected = set(map(id, feature.select_scenarios(scenarios)))
+        for scenario_index, scenario in enumerate(feature.scenarios):
+            if id(scenario) in selected:
+                tasks.append((feature_index, scenario_index))
+
+    return tasks
+
+def run_scenario(feature, scenario_index, ignore_case=True, dry_run=False):
+    """Runs a scenario capturing its output, returning that output
+    along with its results and their serialized data"""
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        plan = feature.scenarios[scenario_index].compile(ignore_case)
+        results = plan.run(dry_run)
+        data = plan.serialize(results)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+    if isinstance(output, str):
+        output = output.decode('utf-8')
+
+    return output, results, data
+
+def work(number, features, tasks, results, ignore_case=True, dry_run=False):
+    """Body of each worker process: runs the scenarios in `tasks` until
+    it gets None, putting their output and results in `results`"""
+    coroutines.forget_loop()
+    call_hook('before_each', 'worker', number)
+    current = None
+    try:
+        for feature_index, scenario_index in iter(tasks.get, None):
+            feature = features[feature_index]
+            if feature is not current:
+                if current is not None:
+                    call_hook_where(not_output_hook, 'after_each', 'feature', current)
+
+                call_hook_where(not_output_hook, 'before_each', 'feature', feature)
+                current = feature
+
+            output, _, data = run_scenario(feature, scenario_index, ignore_case, dry_run)
+            results.put((feature_index, scenario_index, output, data))
+
+        if current is not None:
+            call_hook_where(not_output_hook, 'after_each', 'feature', current)
+    finally:
+        call_hook('after_each', 'worker', number)
+        coroutines.close_loop()
+
+class Replay(object):
+    """Writes the output of scenarios and rebuilds their results in
+    the parent process, in the order of `tasks`, whichever order they
+    arrive in"""
+    def __init__(self, features, tasks, ignore_case=True):
+        self.features = features
+        self.tasks = tasks
+        self.ignore_case = ignore_case
+        self.arrived = {}
+        self.position = 0
+        self.feature_index = -1
+        self.scenarios_ran = []
+        self.feature_results = []
+
+    @property
+    def finished(self):
+        return self.position == len(self.tasks)
+
+    def add(self, feature_index, scenario_index, output, data):
+        self.arrived[feature_index, scenario_index] = output, data
+        while not self.finished and self.tasks[self.position] in self.arrived:
+            task = self.tasks[self.position]
+            self._replay(task, *self.arrived.pop(task))
+            self.position += 1
+
+        if self.finished:
+            self.finish()
+
+    def finish(self):
+        self._move_to(len(self.features))
+
+    def _move_to(self, feature_index):
+        # features without scenarios to run still get their hooks and
+        # results, as when running serially
+        while self.feature_index < feature_index:
+            if self.feature_index >= 0:
+                feature = self.features[self.feature_index]
+                call_hook_where(is_output_hook, 'after_each', 'feature', feature)
+                self.feature_results.append(FeatureResult(feature, *self.scenarios_ran))
+                self.scenarios_ran = []
+
+            self.feature_index += 1
+            if self.feature_index < len(self.features):
+                feature = self.features[self.feature_index]
+                call_hook_where(is_output_hook, 'before_each', 'feature', feature)
+
+    def _replay(self, (feature_index, scenario_index), output, data):
+        feature = self.features[feature_index]
+        self._move_to(feature_index)
+
+        sys.stdout.write(output.encode('utf-8'))
+        plan = feature.scenarios[scenario_index].compile(self.ignore_case)
+        self.scenarios_ran.extend(plan.deserialize(data))
+
+def run_in_processes(features, processes, scenarios=None, ignore_case=True, dry_run=False):
+    """Runs the `features` within `processes` forked workers,
+    returning a FeatureResult for each of them"""
+    tasks = scenario_tasks(features, scenarios)
+    replay = Replay(features, tasks, ignore_case)
+    if not tasks:
+        replay.finish()
+        return replay.feature_results
+
+    processes = min(processes, len(tasks))
+
+    queue = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for task in tasks:
+        queue.put(task)
+
+    for number in range(processes):
+        queue.put(None)
+
+    workers = [
+        multiprocessing.Process(target=work, name='lettuce-worker-%d' % number,
+                                args=(number, features, queue, results, ignore_case, dry_run))
+        for number in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        while not replay.finished:
+            try:
+                replay.add(*results.get(timeout=0.1))
+            except Queue.Empty:
+                if not any([worker.is_alive() for worker in workers]):
+                    raise WorkerDied(
+                        'lettuce workers exited before running %d scenarios'
+                        % (len(tasks) - replay.position))
+    finally:
+        for worker in workers:
+            if not replay.finished:
+                worker.terminate()
+
+            worker.join()
+
+    return replay.feature_results
+
+class ThreadedStdout(object):
+    """Stands for sys.stdout, writing what each thread prints into its
+    own buffer, when it has one"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def buffer(self):
+        self.local.buffer = StringIO()
+
+    def release(self):
+        output = self.local.buffer.getvalue()
+        del self.local.buffer
+        return output
+
+    def write(self, data):
+        getattr(self.local, 'buffer', self.stream).write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def run_in_threads(features, threads, scenarios=None, ignore_case=True, dry_run=False):
+    """Runs the `features` within a pool of `threads` threads,
+    returning a FeatureResult for each of them"""
+    stdout = sys.stdout
+    sys.stdout = proxy = ThreadedStdout(stdout)
+
+    tasks = Queue.Queue()
+    for index in range(len(features)):
+        tasks.put(index)
+
+    finished = {}
+    condition = threading.Condition()
+    initial_world = dict(world.__dict__)
+
+    def work():
+        world.__dict__.update(initial_world)
+        try:
+            run_features()
+        finally:
+            coroutines.close_loop()
+
+    def run_features():
+        while True:
+            try:
+                index = tasks.get_nowait()
+            except Queue.Empty:
+                return
+
+            result = error = None
+            proxy.buffer()
+            try:
+                result = features[index].run(scenarios, ignore_case, dry_run)
+            except BaseException:
+                # e.g. SystemExit from a failing hook, raised again below
+                error = sys.exc_info()
+            finally:
+                output = proxy.release()
+
+            with condition:
+                finished[index] = output, result, error
+                condition.notify()
+
+            if error:
+                return
+
+    pool = [threading.Thread(target=work, name='lettuce-thread-%d' % number)
+            for number in range(min(threads, len(features)))]
+    for thread in pool:
+        thread.daemon = True
+        thread.start()
+
+    results = []
+    try:
+        for index in range(len(features)):
+            with condition:
+                while index not in finished:
+                    condition.wait(0.1)
+
+                output, result, error = finished.pop(index)
+
+            stdout.write(output)
+            if error:
+                raise error[0], error[1], error[2]
+
+            results.append(result)
+    finally:
+        sys.stdout = stdout
+        while not tasks.empty():
+            try:
+                tasks.get_nowait()
+            except Queue.Empty:
+                break
+
+        for thread in pool:
+            thread.join()
+
+    return results
+
+def run_concurrently(features, concurrency, scenarios=None, ignore_case=True, dry_run=False):
+    """Runs the scenarios of each feature concurrently, at most
+    `concurrency` at a time, returning a FeatureResult for each
+    feature"""
+    stdout = sys.stdout
+    sys.stdout = proxy = ThreadedStdout(stdout)
+    pool = ThreadPool(concurrency)
+    coroutines.share_loop(world)
+
+    def run(args):
+        scenario, initial_world = args
+        world.__dict__.clear()
+        world.__dict__.update(initial_world)
+
+        result = error = None
+        proxy.buffer()
+        try:
+            result = scenario.run(ignore_case, dry_run)
+        except BaseException:
+            # e.g. SystemExit from a failing hook, raised again below
+            error = sys.exc_info()
+        finally:
+            output = proxy.release()
+
+        return output, result, error
+
+    results = []
+    try:
+        for feature in features:
+            call_hook('before_each', 'feature', feature)
+            initial_world = dict(world.__dict__)
+            tasks = [(scenario, initial_world)
+                     for scenario in feature.select_scenarios(scenarios)]
+
+            scenarios_ran = []
+            for output, result, error in pool.imap(run, tasks):
+                stdout.write(output)
+                if error:
+                    raise error[0], error[1], error[2]
+
+                scenarios_ran.extend(result)
+
+            call_hook('after_each', 'feature', feature)
+            results.append(FeatureResult(feature, *scenarios_ran))
+    finally:
+        sys.stdout = stdout
+        pool.terminate()
+        pool.join()
+        coroutines.unshare_loop()
+
+    return results
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import re
+from collections import namedtuple
+from lettuce.exceptions import LettuceSyntaxError
+
+FEATURE = 'feature'
+DESCRIPTION = 'description'
+SCENARIO = 'scenario'
+STEP = 'step'
+EXAMPLES = 'examples'
+TABLE = 'table'
+
+Token = namedtuple('Token', 'kind line value')
+
+class Keywords(object):
+    """Compiled regexes for the keywords of a language, built once
+    per language code"""
+    cache = {}
+
+    def __init__(self, language):
+        self.feature = re.compile(u'%s:(.*)' % language.feature, re.I)
+        self.feature_count = re.compile(u'%s:[ ]*\w+' % language.feature)
+        self.scenario = re.compile(u'(%s):' % language.scenario_separator, re.I | re.U)
+        self.examples = re.compile(u'(%s):' % language.examples, re.I | re.U)
+
+    @classmethod
+    def of(cls, language):
+        if language.code not in cls.cache:
+            cls.cache[language.code] = cls(language)
+
+        return cls.cache[language.code]
+
+def tokenize(string, language, filename=None, start=FEATURE):
+    """Reads each line of `string` once, returning a list of tokens.
+
+    Every token is a tuple of (kind, line number, value), where kind is
+    one of FEATURE, DESCRIPTION, SCENARIO, STEP, EXAMPLES or TABLE.
+    Feature files start looking for a FEATURE, while a single scenario
+    can be tokenized by passing `start=SCENARIO`.
+    """
+    keywords = Keywords.of(language)
+    tokens = []
+    state = start
+    features_found = 0
+
+    for number, line in enumerate(string.splitlines()):
+        line = line.strip()
+        if not line:
+            continue
+
+        number += 1
+        if start is FEATURE:
+            features_found += len(keywords.feature_count.findall(line))
+
+        if state is FEATURE:
+            matched = keywords.feature.search(line)
+            if matched:
+                tokens.append(Token(FEATURE, number, matched.group(1).strip()))
+                state = DESCRIPTION
+
+            continue
+
+        matched = keywords.scenario.match(line)
+        if matched or state is SCENARIO:
+            if matched:
+                line = line[matched.end():].strip()
+
+            tokens.append(Token(SCENARIO, number, line))
+            state = STEP
+
+        elif state is DESCRIPTION:
+            tokens.append(Token(DESCRIPTION, number, line))
+
+        elif keywords.examples.match(line):
+            tokens.append(Token(EXAMPLES, number, line))
+            state = EXAMPLES
+
+        elif line.startswith(u'#'):
+            continue
+
+        elif state is EXAMPLES or line.startswith(u'|'):
+            tokens.append(Token(TABLE, number, line))
+
+        else:
+            tokens.append(Token(STEP, number, line))
+
+    if features_found > 1:
+        raise LettuceSyntaxError(
+            filename,
+            'A feature file must contain ONLY ONE feature!'
+        )
+
+    elif start is FEATURE and features_found == 0:
+        raise LettuceSyntaxError(
+            filename,
+            'Features must have a name. e.g: "Feature: This is my name"'
+        )
+
+    return tokens
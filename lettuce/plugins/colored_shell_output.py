@@ -71,6 +71,8 @@ def print_step_ran(step):
         write_out("\033[A" * (len(step.hashes) + 1))
 
     string = step.represent_string(step.original_sentence)
+    if step.cached:
+        string = string.rstrip() + " (cached pass)\n"
 
     if not step.failed:
         string = wrap_file_and_line(string, '\033[1;30m', '\033[0m')
@@ -175,11 +177,16 @@ def print_end(total):
         color = "\033[0;31m"
 
     word = total.scenarios_ran > 1 and "scenarios" or "scenario"
-    write_out("\033[1;37m%d %s (%s%d passed\033[1;37m)\033[0m\n" % (
+    cached = ""
+    if total.scenarios_cached:
+        cached = "\033[1;37m, \033[1;32m%d cached" % total.scenarios_cached
+
+    write_out("\033[1;37m%d %s (%s%d passed%s\033[1;37m)\033[0m\n" % (
         total.scenarios_ran,
         word,
         color,
-        total.scenarios_passed
+        total.scenarios_passed - total.scenarios_cached,
+        cached
         )
     )
 
@@ -212,20 +219,32 @@ def print_end(total):
     )
 
     if total.proposed_definitions:
-        wrt("\n\033[0;33mYou can implement step definitions for undefined steps with these snippets:\n\n")
-        wrt("# -*- coding: utf-8 -*-\n")
-        wrt("from lettuce import step\n\n")
-
-        last = len(total.proposed_definitions) - 1
-        for current, step in enumerate(total.proposed_definitions):
-            method_name = step.proposed_method_name
-            wrt("@step(u'%s')\n" % step.proposed_sentence)
-            wrt("def %s:\n" % method_name)
-            wrt("    assert False, 'This step must be implemented'")
-            if current is last:
-                wrt("\033[0m")
-
-            wrt("\n")
+        print_proposed_definitions(total.proposed_definitions)
+
+def print_proposed_definitions(steps):
+    wrt("\n\033[0;33mYou can implement step definitions for undefined steps with these snippets:\n\n")
+    wrt("# -*- coding: utf-8 -*-\n")
+    wrt("from lettuce import step\n\n")
+
+    last = len(steps) - 1
+    for current, step in enumerate(steps):
+        method_name = step.proposed_method_name
+        wrt("@step(u'%s')\n" % step.proposed_sentence)
+        wrt("def %s:\n" % method_name)
+        wrt("    assert False, 'This step must be implemented'")
+        if current is last:
+            wrt("\033[0m")
+
+        wrt("\n")
+
+def print_undefined_steps(steps):
+    word = len(steps) > 1 and "steps" or "step"
+    wrt("\033[0;33m%d undefined %s:\033[0m\n" % (len(steps), word))
+    for step in steps:
+        wrt("\033[0;33m    %s \033[1;30m# %s:%d\033[0m\n" % (
+            step.sentence, step.described_at.file, step.described_at.line))
+
+    print_proposed_definitions(core.propose_definitions(steps))
 
 def print_no_features_found(where):
     where = core.fs.relpath(where)
@@ -180,6 +180,12 @@ class JUnitXmlResult(object):
         self._test_case_string(test)
         self._results.append('/>\n')
 
+    def addCachedSuccess(self, test):
+        """A success that was not run again, as its inputs passed before"""
+        self._test_case_string(test)
+        self._results.append('>\n')
+        self._results.append('<system-out>cached pass</system-out>\n</testcase>\n')
+
     def addSkip(self, test, reason):        
         self._test_case_string(test)
         self._results.append('>\n')
@@ -49,11 +49,16 @@ def print_end(total):
         )
     )
 
+    cached = ""
+    if total.scenarios_cached:
+        cached = ", %d cached" % total.scenarios_cached
+
     word = total.scenarios_ran > 1 and "scenarios" or "scenario"
-    logging.info("%d %s (%d passed)\n" % (
+    logging.info("%d %s (%d passed%s)\n" % (
         total.scenarios_ran,
         word,
-        total.scenarios_passed
+        total.scenarios_passed - total.scenarios_cached,
+        cached
         )
     )
 
@@ -65,6 +70,12 @@ def print_end(total):
         )
     )
 
+def print_undefined_steps(steps):
+    word = len(steps) > 1 and "steps" or "step"
+    logging.info("%d undefined %s:\n" % (len(steps), word))
+    for step in steps:
+        logging.info("    %s # %s:%d\n" % (step.sentence, step.described_at.file, step.described_at.line))
+
 def print_no_features_found(where):
     where = core.fs.relpath(where)
     if not where.startswith(os.sep):
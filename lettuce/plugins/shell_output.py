@@ -39,7 +39,10 @@ def print_step_ran(step):
     if step.hashes:
         wrt("\033[A" * (len(step.hashes) + 1))
 
-    if step.defined_at:
+    if step.cached:
+        wrt("\033[A" + step.represent_string(step.original_sentence).rstrip() + " (cached pass)\n")
+
+    elif step.defined_at:
         wrt("\033[A" + step.represent_string(step.original_sentence))
 
     else:
@@ -95,11 +98,16 @@ def print_end(total):
         )
     )
 
+    cached = ""
+    if total.scenarios_cached:
+        cached = ", %d cached" % total.scenarios_cached
+
     word = total.scenarios_ran > 1 and "scenarios" or "scenario"
-    wrt("%d %s (%d passed)\n" % (
+    wrt("%d %s (%d passed%s)\n" % (
         total.scenarios_ran,
         word,
-        total.scenarios_passed
+        total.scenarios_passed - total.scenarios_cached,
+        cached
         )
     )
 
@@ -122,14 +130,25 @@ def print_end(total):
     )
 
     if total.proposed_definitions:
-        wrt("\nYou can implement step definitions for undefined steps with these snippets:\n\n")
-        wrt("# -*- coding: utf-8 -*-\n")
-        wrt("from lettuce import step\n\n")
-        for step in total.proposed_definitions:
-            method_name = step.proposed_method_name
-            wrt("@step(u'%s')\n" % step.proposed_sentence)
-            wrt("def %s:\n" % method_name)
-            wrt("    assert False, 'This step must be implemented'\n")
+        print_proposed_definitions(total.proposed_definitions)
+
+def print_proposed_definitions(steps):
+    wrt("\nYou can implement step definitions for undefined steps with these snippets:\n\n")
+    wrt("# -*- coding: utf-8 -*-\n")
+    wrt("from lettuce import step\n\n")
+    for step in steps:
+        method_name = step.proposed_method_name
+        wrt("@step(u'%s')\n" % step.proposed_sentence)
+        wrt("def %s:\n" % method_name)
+        wrt("    assert False, 'This step must be implemented'\n")
+
+def print_undefined_steps(steps):
+    word = len(steps) > 1 and "steps" or "step"
+    wrt("%d undefined %s:\n" % (len(steps), word))
+    for step in steps:
+        wrt("    %s # %s:%d\n" % (step.sentence, step.described_at.file, step.described_at.line))
+
+    print_proposed_definitions(core.propose_definitions(steps))
 
 def print_no_features_found(where):
     where = core.fs.relpath(where)
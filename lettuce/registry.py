@@ -14,9 +14,16 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import re
 import sys
+import string
+import sre_parse
 import threading
 import traceback
+from sre_constants import LITERAL, AT, SUBPATTERN
+from sre_constants import AT_BEGINNING, AT_BEGINNING_STRING, AT_END, AT_END_STRING
+from lettuce import coroutines
 
 world = threading.local()
 world._set = False
@@ -26,7 +33,233 @@ class CleanableDict(dict):
         for k in self.keys():
             del self[k]
 
+WORD_CHARS = frozenset(string.ascii_lowercase + string.digits + '_')
+WORDS = re.compile(r'[a-z0-9_]+')
+
+def _flatten(items):
+    for op, av in items:
+        if op is SUBPATTERN:
+            # a group must match as a whole, so its items are sequential
+            for item in _flatten(av[-1]):
+                yield item
+        else:
+            yield op, av
+
+def _is_boundary(op, av, edges):
+    if op is AT:
+        return av in edges
+
+    return op is LITERAL and unichr(av).lower() not in WORD_CHARS
+
+def indexable_words(regex):
+    """Returns the lowercase words that every sentence matched by
+    `regex` must contain as a whole word, i.e. literal runs of
+    [a-z0-9_] that the regex surrounds with literal non-word characters
+    or anchors."""
+    try:
+        items = list(_flatten(sre_parse.parse(regex)))
+    except Exception:
+        return []
+
+    words = []
+    start = None
+    for position, (op, av) in enumerate(items + [(None, None)]):
+        is_word = op is LITERAL and unichr(av).lower() in WORD_CHARS
+        if is_word:
+            if start is None:
+                start = position
+
+            continue
+
+        if start is not None:
+            # at the edges of an unanchored regex the word may be just
+            # a piece of a longer one in the sentence
+            opens = start > 0 and _is_boundary(
+                items[start - 1][0], items[start - 1][1],
+                (AT_BEGINNING, AT_BEGINNING_STRING))
+            closes = op is not None and _is_boundary(
+                op, av, (AT_END, AT_END_STRING))
+
+            if opens and closes:
+                words.append(u''.join(
+                    [unichr(code) for _, code in items[start:position]]).lower())
+
+            start = None
+
+    return words
+
+class StepIndex(object):
+    """Narrows down the step definitions that can match a sentence.
+
+    Each definition is filed under the longest word it requires, so
+    only the definitions whose word shows up in the sentence (plus the
+    ones without any required word) are tried, still in registration
+    order.
+    """
+    def __init__(self, regexes):
+        self.by_word = {}
+        self.unindexed = []
+
+        for position, regex in enumerate(regexes):
+            words = indexable_words(regex)
+            if words:
+                word = max(words, key=len)
+                self.by_word.setdefault(word, []).append(position)
+            else:
+                self.unindexed.append(position)
+
+    def candidates(self, sentence):
+        positions = list(self.unindexed)
+        for word in set(WORDS.findall(sentence.lower())):
+            positions.extend(self.by_word.get(word, ()))
+
+        positions.sort()
+        return positions
+
+class StepMatch(object):
+    """The groups that the regex of a step definition extracted from a
+    sentence, detached from the `re` match object so it can be kept
+    around and pickled"""
+    def __init__(self, regex, groups, named):
+        self.regex = regex
+        self._groups = groups
+        self._named = named
+
+    def groups(self):
+        return self._groups
+
+    def groupdict(self):
+        return dict(self._named)
+
+class StepDict(CleanableDict):
+    """Maps the regex of each step definition to its function.
+
+    The regexes are compiled once, for both case modes, when the step
+    is registered, and are iterated in registration order. The match
+    found for each sentence is remembered in `matches` until the
+    registry changes.
+    """
+    def __init__(self, *args, **kw):
+        self._lock = threading.RLock()
+        self._order = []
+        self._compiled = {}
+        self._matchers = {}
+        self._index = None
+        self._changes = 0
+        self.matches = {}
+        super(StepDict, self).__init__()
+        self.update(*args, **kw)
+
+    def _changed(self):
+        self._changes += 1
+        self._matchers.clear()
+        self._index = None
+        self.matches.clear()
+
+    def __setitem__(self, regex, func):
+        compiled = re.compile(regex), re.compile(regex, re.I)
+        with self._lock:
+            if regex not in self:
+                self._order.append(regex)
+
+            self._compiled[regex] = compiled
+            self._changed()
+            super(StepDict, self).__setitem__(regex, func)
+
+    def __delitem__(self, regex):
+        with self._lock:
+            super(StepDict, self).__delitem__(regex)
+            self._order.remove(regex)
+            del self._compiled[regex]
+            self._changed()
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def update(self, *args, **kw):
+        for regex, func in dict(*args, **kw).items():
+            self[regex] = func
+
+    def keys(self):
+        with self._lock:
+            return list(self._order)
+
+    def values(self):
+        return [self[regex] for regex in self._order]
+
+    def items(self):
+        return [(regex, self[regex]) for regex in self._order]
+
+    def iterkeys(self):
+        return iter(self._order)
+
+    def itervalues(self):
+        return (self[regex] for regex in self._order)
+
+    def iteritems(self):
+        return ((regex, self[regex]) for regex in self._order)
+
+    def pop(self, regex, *default):
+        if regex not in self:
+            return super(StepDict, self).pop(regex, *default)
+
+        func = self[regex]
+        del self[regex]
+        return func
+
+    def compiled(self, ignore_case):
+        """Returns a list of (compiled regex, function) in
+        registration order"""
+        index = ignore_case and 1 or 0
+        with self._lock:
+            if index not in self._matchers:
+                self._matchers[index] = [
+                    (self._compiled[regex][index], self[regex]) for regex in self._order
+                ]
+
+            return self._matchers[index]
+
+    def matching(self, sentence, ignore_case):
+        """Returns the (compiled regex, function) pairs that may match
+        `sentence`, in registration order"""
+        with self._lock:
+            if self._index is None:
+                self._index = StepIndex(self._order)
+
+            index = self._index
+            matchers = self.compiled(ignore_case)
+
+        return [matchers[position] for position in index.candidates(sentence)]
+
+    def match(self, sentence, ignore_case):
+        """Returns the StepMatch of the first step definition that
+        matches `sentence`, or None"""
+        key = sentence, bool(ignore_case)
+        try:
+            return self.matches[key]
+        except KeyError:
+            pass
+
+        changes = self._changes
+        found = None
+        for regex, func in self.matching(sentence, ignore_case):
+            matched = regex.search(sentence)
+            if matched:
+                found = StepMatch(regex.pattern, matched.groups(), matched.groupdict())
+                break
+
+        with self._lock:
+            # don't remember matches against a registry that changed meanwhile
+            if changes == self._changes:
+                self.matches[key] = found
+
+        return found
+
 class CallbackDict(CleanableDict):
+    # when True, only the callbacks of output plugins are called
+    output_only = False
+    _lock = threading.RLock()
+
     def _function_matches(self, one, other):
         params = 'co_filename', 'co_firstlineno'
         matches = list()
@@ -39,14 +272,15 @@ class CallbackDict(CleanableDict):
         return all(matches)
 
     def append_to(self, where, when, function):
-        found = False
+        with self._lock:
+            found = False
 
-        for other_function in self[where][when]:
-            if self._function_matches(other_function,function):
-                found = True
+            for other_function in self[where][when]:
+                if self._function_matches(other_function,function):
+                    found = True
 
-        if not found:
-            self[where][when].append(function)
+            if not found:
+                self[where][when].append(function)
 
     def clear(self):
         for name, action_dict in self.items():
@@ -55,7 +289,7 @@ class CallbackDict(CleanableDict):
                     callback_list.pop()
 
 
-STEP_REGISTRY = CleanableDict()
+STEP_REGISTRY = StepDict()
 CALLBACK_REGISTRY = CallbackDict(
     {
         'all': {
@@ -79,6 +313,10 @@ CALLBACK_REGISTRY = CallbackDict(
             'before_each': list(),
             'after_each': list()
         },
+        'worker': {
+            'before_each': list(),
+            'after_each': list()
+        },
         'harvest': {
             'before': list(),
             'after': list()
@@ -94,10 +332,25 @@ CALLBACK_REGISTRY = CallbackDict(
     }
 )
 
+def is_output_hook(callback):
+    return getattr(callback, '__module__', '').startswith('lettuce.plugins.')
+
 def call_hook(situation, kind, *args, **kw):
-    for callback in CALLBACK_REGISTRY[kind][situation]:
+    call_hook_where(None, situation, kind, *args, **kw)
+
+def call_hook_where(accept, situation, kind, *args, **kw):
+    """Calls the hooks for which `accept(callback)` is true, or all of
+    them when `accept` is None"""
+    # a copy, as other threads may be adding callbacks meanwhile
+    for callback in list(CALLBACK_REGISTRY[kind][situation]):
+        if CALLBACK_REGISTRY.output_only and not is_output_hook(callback):
+            continue
+
+        if accept is not None and not accept(callback):
+            continue
+
         try:
-            callback(*args, **kw)
+            coroutines.call(callback, *args, **kw)
         except Exception, e:
             traceback.print_exc(e)
             sys.exit(2)
@@ -105,3 +358,39 @@ def call_hook(situation, kind, *args, **kw):
 def clear():
     STEP_REGISTRY.clear()
     CALLBACK_REGISTRY.clear()
+
+def source_file(function):
+    """Returns the absolute path of the source file that `function`
+    was defined within, or None"""
+    code = getattr(function, 'func_code', None)
+    if code is None:
+        return None
+
+    filename = os.path.abspath(code.co_filename)
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+
+    return filename
+
+def hooks_within(filename):
+    """Returns the callbacks registered from `filename`"""
+    filename = os.path.abspath(filename)
+    return [callback
+            for situations in CALLBACK_REGISTRY.values()
+            for callbacks in situations.values()
+            for callback in callbacks
+            if source_file(callback) == filename]
+
+def forget(filename):
+    """Drops the step definitions and callbacks registered from
+    `filename`, so that reloading its module registers them afresh"""
+    filename = os.path.abspath(filename)
+    for regex, function in STEP_REGISTRY.items():
+        if source_file(function) == filename:
+            del STEP_REGISTRY[regex]
+
+    with CALLBACK_REGISTRY._lock:
+        for situations in CALLBACK_REGISTRY.values():
+            for callbacks in situations.values():
+                callbacks[:] = [callback for callback in callbacks
+                                if source_file(callback) != filename]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Splits the scenarios of a run into shards, so that independent CI
+jobs can run one shard each.
+
+When earlier runs recorded how long the scenarios took (see
+lettuce.cache.Durations), the longest ones are placed first, each one
+within the shard that would finish earliest, so that the shards take
+about the same time. Scenarios without a recorded duration count as
+taking the average. Without any duration at all, scenarios are spread
+by a hash of their id.
+
+Either way, the shards depend only on the scenario ids and durations,
+so every job must see the same durations file. Runs of a shard, and of
+workers, leave it as it is: the durations come from the full runs, and
+from coordinators, which get them from their workers.
+"""
+import heapq
+import hashlib
+
+def parse(string):
+    """Turns "K/N" into a (K, N) tuple, raising ValueError unless
+    1 <= K <= N"""
+    number, total = map(int, string.split('/'))
+    if not 1 <= number <= total:
+        raise ValueError('the shard must be within 1/%d and %d/%d' % (total, total, total))
+
+    return number, total
+
+def stable_hash(text):
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)
+
+def partition(ids, shards, durations=None):
+    """Splits the scenario `ids` into `shards` lists, returning the
+    positions within `ids` that fall in each one"""
+    durations = durations or {}
+    known = [durations[scenario_id] for scenario_id in ids if scenario_id in durations]
+    bins = [[] for shard in range(shards)]
+    if not known:
+        for position, scenario_id in enumerate(ids):
+            bins[stable_hash(scenario_id) % shards].append(position)
+
+        return bins
+
+    average = sum(known) / len(known)
+    duration = lambda position: durations.get(ids[position], average)
+    longest_first = sorted(range(len(ids)),
+                           key=lambda position: (-duration(position), ids[position], position))
+
+    loads = [(0.0, shard) for shard in range(shards)]
+    for position in longest_first:
+        load, shard = heapq.heappop(loads)
+        bins[shard].append(position)
+        heapq.heappush(loads, (load + duration(position), shard))
+
+    for positions in bins:
+        positions.sort()
+
+    return bins
@@ -30,11 +30,16 @@ def get_stripped_lines(string):
     lines = [unicode(l.strip()) for l in string.splitlines()]
     return filter(lambda x:x, lines)
 
+_separators = {}
+
 def split_wisely(string, sep, strip=False):
     string = unicode(string)
     sep = unicode(sep)
 
-    regex = re.compile(escape_if_necessary(sep),  re.UNICODE | re.M | re.I)
+    regex = _separators.get(sep)
+    if regex is None:
+        regex = re.compile(escape_if_necessary(sep),  re.UNICODE | re.M | re.I)
+        _separators[sep] = regex
 
     items = filter(lambda x: x, regex.split(string))
     if strip:
@@ -61,6 +66,25 @@ def rfill(string, times, char=u" ", append=u""):
 
     return unicode(string) + unicode(append)
 
+class Template(object):
+    """A string with <placeholder> slots. It is split once, so that it
+    can be filled with many dicts in a single pass each"""
+    placeholder = re.compile(r'<([^<>\s](?:[^<>]*[^<>\s])?)>', re.U)
+
+    def __init__(self, string):
+        self.string = unicode(string)
+        self.parts = self.placeholder.split(self.string)
+        self.placeholders = self.parts[1::2]
+
+    def fill(self, data):
+        if not self.placeholders:
+            return self.string
+
+        parts = self.parts[:]
+        parts[1::2] = [unicode(data.get(name, u'<%s>' % name))
+                       for name in self.placeholders]
+        return u"".join(parts)
+
 def getlen(string):
     return len(string) + 1
 
@@ -39,6 +39,11 @@ class main(object):
         CALLBACK_REGISTRY.append_to('feature', "%s_each" % cls.__name__, function)
         return function
 
+    @classmethod
+    def each_worker(cls, function):
+        CALLBACK_REGISTRY.append_to('worker', "%s_each" % cls.__name__, function)
+        return function
+
     @classmethod
     def harvest(cls, function):
         CALLBACK_REGISTRY.append_to('harvest', cls.__name__, function)
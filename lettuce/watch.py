@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Keeps lettuce running, running the features again as their files,
+or the step definitions they use, change.
+
+The feature and python files under the base directory, along with the
+terrain, are polled for changes. Only the step modules that changed are
+reloaded, after their step definitions and hooks are dropped from the
+registry, and only the features that use them run again. A change to
+the terrain, or to any module that registers hooks, runs every feature,
+while a change to any other module, such as the ones that step
+definitions import, loads every module again.
+"""
+import os
+import sys
+import time
+import traceback
+
+from lettuce import registry
+from lettuce.fs import FileSystem
+from lettuce.exceptions import LettuceSyntaxError
+from lettuce.registry import STEP_REGISTRY
+
+class Watcher(object):
+    """Runs the features of `runner`, a lettuce.Runner, and then the
+    ones affected by each change, checking for changes every `interval`
+    seconds"""
+    def __init__(self, runner, interval=0.2):
+        self.runner = runner
+        self.interval = interval
+        self.stats = {}
+
+    def terrain_file(self):
+        terrain = sys.modules.get('terrain')
+        filename = getattr(terrain, '__file__', None)
+        if filename and filename.endswith(('.pyc', '.pyo')):
+            filename = filename[:-1]
+
+        return filename and os.path.abspath(filename)
+
+    def feature_files(self):
+        if self.runner.single_feature:
+            return [os.path.abspath(self.runner.single_feature)]
+
+        return self.runner.loader.find_feature_files()
+
+    def watched_files(self):
+        files = FileSystem.locate(self.runner.loader.base_dir, '*.py')
+        files.extend(self.feature_files())
+        terrain = self.terrain_file()
+        if terrain:
+            files.append(terrain)
+
+        return files
+
+    def snapshot(self):
+        """Returns the modification time and size of each watched file"""
+        stats = {}
+        for filename in self.watched_files():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+
+            stats[filename] = stat.st_mtime, stat.st_size
+
+        return stats
+
+    def changes(self):
+        """Returns the files that were changed, added or removed since
+        the last call"""
+        stats = self.snapshot()
+        changed = [filename for filename in set(stats) | set(self.stats)
+                   if stats.get(filename) != self.stats.get(filename)]
+        self.stats = stats
+        return sorted(changed)
+
+    def definition_files(self, filenames):
+        """Returns the files of the step definitions matched by the
+        steps of each feature within `filenames`"""
+        files = {}
+        for filename in filenames:
+            try:
+                feature = self.runner.load_feature(filename)
+            except LettuceSyntaxError:
+                # it runs anyway, to report its syntax errors
+                files[filename] = None
+                continue
+
+            found = files[filename] = set()
+            for scenario in feature.scenarios:
+                for order, outline, plans in scenario.compile().examples:
+                    for plan in plans:
+                        if plan.definition is not None:
+                            found.add(registry.source_file(plan.definition.function))
+
+        return files
+
+    def registered_files(self):
+        """Returns the files that step definitions and hooks were
+        registered from"""
+        files = set([registry.source_file(function) for function in STEP_REGISTRY.values()])
+        for situations in registry.CALLBACK_REGISTRY.values():
+            for callbacks in situations.values():
+                files.update([registry.source_file(callback) for callback in callbacks])
+
+        return files
+
+    def reload(self, modules):
+        """Reloads the changed `modules`, which are file names, after
+        dropping what they registered before. Returns whether any of
+        them registers hooks."""
+        hooks = False
+        terrain = self.terrain_file()
+        for filename in modules:
+            hooks = hooks or filename == terrain or bool(registry.hooks_within(filename))
+            registry.forget(filename)
+
+        for filename in modules:
+            if not os.path.exists(filename):
+                continue
+
+            # .pyc files only tell the second their source changed at
+            for compiled in (filename + 'c', filename + 'o'):
+                if os.path.exists(compiled):
+                    os.remove(compiled)
+
+            if filename == terrain:
+                reload(sys.modules['terrain'])
+            else:
+                self.runner.loader.load_step_definitions([filename])
+
+            hooks = hooks or bool(registry.hooks_within(filename))
+
+        return hooks
+
+    def affected(self, changed):
+        """Reloads the step modules within `changed`, returning the
+        feature files that must run again, or None when every module
+        must be loaded again, as some of them imports a changed module
+        that registers neither steps nor hooks"""
+        features = self.feature_files()
+        modules = set([filename for filename in changed if filename.endswith('.py')])
+        rerun = set([filename for filename in changed if filename in features])
+        if not modules:
+            return [filename for filename in features if filename in rerun]
+
+        registered = self.registered_files()
+        before = self.definition_files(features)
+        if self.reload(modules):
+            return features
+
+        if modules - registered - self.registered_files():
+            return None
+
+        after = self.definition_files(features)
+        for filename in features:
+            used = (before[filename] or set()) | (after[filename] or set())
+            if used & modules or after[filename] is None:
+                rerun.add(filename)
+
+        return [filename for filename in features if filename in rerun]
+
+    def check(self):
+        """Runs the features affected by the changes since the last
+        check, returning the result, or None when none ran. Errors, as
+        from a feature or a step module saved half edited, are reported
+        and left until they are fixed by a later change."""
+        changed = self.changes()
+        if not changed:
+            return None
+
+        try:
+            features = self.affected(changed)
+            if features is None:
+                return self.runner.run()
+            elif features:
+                return self.runner.run(features)
+        except SystemExit, e:
+            # syntax errors of features are reported before exiting
+            if e.code is not None and not isinstance(e.code, int):
+                sys.stderr.write("%s\n" % e.code)
+        except Exception:
+            traceback.print_exc()
+
+        return None
+
+    def run(self):
+        """Runs every feature, and then the affected ones on each
+        change, until interrupted. Returns the result of the last run"""
+        self.stats = self.snapshot()
+        total = self.runner.run()
+        sys.stderr.write("lettuce is watching for changes, press Ctrl-C to stop\n")
+        try:
+            while True:
+                time.sleep(self.interval)
+                total = self.check() or total
+        except KeyboardInterrupt:
+            return total
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import sys
+import shutil
+import socket
+import tempfile
+import threading
+import multiprocessing
+from StringIO import StringIO
+from os.path import dirname, join, abspath
+from nose.tools import assert_equals
+
+from lettuce import Runner
+from lettuce import distributed
+from lettuce.core import Feature
+from lettuce.cache import Durations, Failures, ImpactMap
+
+current_dir = abspath(dirname(__file__))
+ojoin = lambda *x: join(current_dir, 'output_features', *x)
+
+def free_address():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    address = '127.0.0.1:%d' % sock.getsockname()[1]
+    sock.close()
+    return address
+
+def run_worker(path, address):
+    sys.stdout = open(os.devnull, 'w')
+    Runner(path, verbosity=3, worker=address).run()
+
+def test_workers_report_like_a_serial_run():
+    "Scenarios run by workers are reported by the coordinator as a serial run"
+
+    for name in ('many_successful_scenarios', 'fail_outline', 'failed_table'):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            serial = Runner(ojoin(name), verbosity=3).run()
+            serial_output = sys.stdout.getvalue()
+
+            address = free_address()
+            workers = [multiprocessing.Process(target=run_worker, args=(ojoin(name), address))
+                       for number in range(2)]
+            for worker in workers:
+                worker.start()
+
+            sys.stdout = StringIO()
+            coordinated = Runner(ojoin(name), verbosity=3, coordinator=address).run()
+            coordinated_output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        for worker in workers:
+            # a worker may show up after the coordinator finished
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+
+        assert_equals(coordinated_output, serial_output)
+        assert_equals(coordinated.steps_passed, serial.steps_passed)
+        assert_equals(coordinated.steps_failed, serial.steps_failed)
+
+def test_scenarios_of_workers_that_died_are_queued_again():
+    "The coordinator hands the scenario of a worker that disconnected to another one"
+    feature = Feature.from_file(ojoin('many_successful_scenarios', 'first.feature'))
+    coordinator = distributed.Coordinator([feature], ['first.feature'], '127.0.0.1:0')
+    address = '%s:%d' % coordinator.address
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    thread = threading.Thread(target=lambda: results.extend(coordinator.run()))
+    thread.daemon = True
+    results = []
+    thread.start()
+    try:
+        dying = distributed.connect(address)
+        dying.send({'hello': 'dying'})
+        assert_equals(dying.read(), {'worker': 0})
+        assert_equals(dying.read(), {'feature': 'first.feature', 'scenario': 0,
+                                     'line': feature.scenarios[0].described_at.line})
+        dying.close()
+
+        worker = distributed.connect(address)
+        worker.send({'hello': 'worker'})
+        assert_equals(worker.read(), {'worker': 1})
+
+        handed = []
+        for message in iter(worker.read, None):
+            if message.get('done'):
+                break
+
+            handed.append(message['scenario'])
+            message.update(output=u'', results=[{'duration': 0, 'steps': [{'state': 'passed'}]}])
+            worker.send(message)
+
+        worker.close()
+        thread.join()
+    finally:
+        sys.stdout = stdout
+
+    assert_equals(handed, [0, 1])
+    assert_equals(len(results[0].scenario_results), 2)
+    assert all([result.passed for result in results[0].scenario_results])
+
+def test_malformed_messages_drop_only_their_connection():
+    "The coordinator drops whatever sends it something else than a worker would, queueing its scenario again"
+    feature = Feature.from_file(ojoin('many_successful_scenarios', 'first.feature'))
+    coordinator = distributed.Coordinator([feature], ['first.feature'], '127.0.0.1:0')
+    address = '%s:%d' % coordinator.address
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    thread = threading.Thread(target=lambda: results.extend(coordinator.run()))
+    thread.daemon = True
+    results = []
+    thread.start()
+    try:
+        garbage = distributed.connect(address)
+        garbage.socket.sendall('GET / HTTP/1.0\r\n\r\n')
+        assert_equals(garbage.read(), None)
+
+        unexpected = distributed.connect(address)
+        unexpected.send({'hello': 'unexpected'})
+        assert_equals(unexpected.read(), {'worker': 0})
+        assert_equals(unexpected.read()['scenario'], 0)
+        unexpected.send({'feature': 'first.feature'})
+        assert_equals(unexpected.read(), None)
+
+        worker = distributed.connect(address)
+        worker.send({'hello': 'worker'})
+        assert_equals(worker.read(), {'worker': 1})
+
+        handed = []
+        for message in iter(worker.read, None):
+            if message.get('done'):
+                break
+
+            handed.append(message['scenario'])
+            message.update(output=u'', results=[{'duration': 0, 'steps': [{'state': 'passed'}]}])
+            worker.send(message)
+
+        worker.close()
+        thread.join()
+    finally:
+        sys.stdout = stdout
+
+    assert_equals(handed, [0, 1])
+    assert_equals(len(results[0].scenario_results), 2)
+
+def run_capturing_stdout(runner):
+    """Runs `runner`, along with a worker when it is a coordinator"""
+    worker = None
+    if runner.coordinator:
+        worker = multiprocessing.Process(
+            target=run_worker, args=(runner.loader.base_dir, runner.coordinator))
+        worker.start()
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        total = runner.run()
+        return total, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+        if worker is not None:
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+
+def test_coordinated_shards_run_the_scenarios_of_the_shard():
+    "Workers run the scenarios of the shard the coordinator selected"
+    first, second = Feature.from_file(ojoin('many_successful_scenarios', 'first.feature')).scenarios
+
+    def runner(**kw):
+        runner = Runner(ojoin('many_successful_scenarios'), verbosity=3, shard=(2, 2), **kw)
+        runner.durations = Durations(cache_dir)
+        runner.durations.load = lambda: {first.id: 2.0, second.id: 1.0}
+        runner.failures = Failures(cache_dir)
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        serial, serial_output = run_capturing_stdout(runner())
+        coordinated, coordinated_output = run_capturing_stdout(runner(coordinator=free_address()))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    assert_equals([result.scenario.name for result in serial.scenario_results],
+                  [u'Do nothing (again)'])
+    assert_equals(coordinated_output, serial_output)
+    assert_equals(coordinated.steps_passed, serial.steps_passed)
+
+def test_coordinated_last_failed_runs_the_examples_that_failed():
+    "Workers run only the examples that failed last time, when the coordinator selects them"
+
+    def runner(**kw):
+        runner = Runner(ojoin('fail_outline'), verbosity=3, **kw)
+        runner.durations = Durations(cache_dir)
+        runner.failures = Failures(cache_dir)
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        run_capturing_stdout(runner())
+        serial, serial_output = run_capturing_stdout(runner(last_failed=True))
+        coordinated, coordinated_output = run_capturing_stdout(
+            runner(last_failed=True, coordinator=free_address()))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    assert_equals(len(serial.scenario_results), 1)
+    assert_equals(coordinated_output, serial_output)
+    assert_equals(coordinated.steps_failed, serial.steps_failed)
+
+def test_coordinated_failed_first_runs_the_scenarios_that_failed_first():
+    "Workers run the scenarios in the order the coordinator put them, failed ones first"
+    first, second = Feature.from_file(ojoin('many_successful_scenarios', 'first.feature')).scenarios
+
+    def runner(**kw):
+        runner = Runner(ojoin('many_successful_scenarios'), verbosity=3, failed_first=True, **kw)
+        runner.durations = Durations(cache_dir)
+        runner.failures = Failures(cache_dir)
+        runner.failures.load = lambda: {second.id: None}
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        serial, serial_output = run_capturing_stdout(runner())
+        coordinated, coordinated_output = run_capturing_stdout(runner(coordinator=free_address()))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    assert_equals([result.scenario.name for result in serial.scenario_results],
+                  [u'Do nothing (again)', u'Do nothing'])
+    assert_equals(coordinated_output, serial_output)
+
+def test_coordinated_changed_files_run_the_scenarios_that_depend_on_them():
+    "Workers run only the scenarios depending on the changed files, when the coordinator selects them"
+    first, second = Feature.from_file(ojoin('many_successful_scenarios', 'first.feature')).scenarios
+
+    def runner(**kw):
+        runner = Runner(ojoin('many_successful_scenarios'), verbosity=3, changed_files=['b.py'], **kw)
+        runner.durations = Durations(cache_dir)
+        runner.failures = Failures(cache_dir)
+        runner.impact_map = ImpactMap(cache_dir)
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        ImpactMap(cache_dir).save({first.id: ['a.py'], second.id: ['b.py']})
+        serial, serial_output = run_capturing_stdout(runner())
+        coordinated, coordinated_output = run_capturing_stdout(runner(coordinator=free_address()))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    assert_equals([result.scenario.name for result in serial.scenario_results],
+                  [u'Do nothing (again)'])
+    assert_equals(coordinated_output, serial_output)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import shutil
+import tempfile
+from os.path import dirname, join, abspath, exists
+from nose.tools import assert_equals, assert_not_equals, with_setup
+from mox import Mox
+
+from lettuce import core
+from lettuce.cache import FeatureCache
+
+current_dir = abspath(dirname(__file__))
+cjoin = lambda *x: join(current_dir, 'simple_features', *x)
+
+cache_dir = None
+
+def create_cache_dir():
+    global cache_dir
+    cache_dir = tempfile.mkdtemp()
+
+def remove_cache_dir():
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+@with_setup(create_cache_dir, remove_cache_dir)
+def test_cached_feature_looks_like_the_parsed_one():
+    "FeatureCache loads the same feature that Feature.from_file parses"
+
+    feature_file = cjoin('1st_feature_dir', 'some.feature')
+    cache = FeatureCache(cache_dir)
+
+    cache.load(feature_file)
+    cached = cache.load(feature_file)
+    parsed = core.Feature.from_file(feature_file)
+
+    assert_equals(cached.name, parsed.name)
+    assert_equals(cached.description, parsed.description)
+    assert_equals(cached.described_at.line, parsed.described_at.line)
+    assert_equals(
+        [s.name for s in cached.scenarios],
+        [s.name for s in parsed.scenarios],
+    )
+    assert_equals(
+        [s.outlines for s in cached.scenarios],
+        [s.outlines for s in parsed.scenarios],
+    )
+
+    for cached_scenario, parsed_scenario in zip(cached.scenarios, parsed.scenarios):
+        assert_equals(cached_scenario.feature, cached)
+        assert_equals(
+            [(s.sentence, s.described_at.line) for s in cached_scenario.steps],
+            [(s.sentence, s.described_at.line) for s in parsed_scenario.steps],
+        )
+
+@with_setup(create_cache_dir, remove_cache_dir)
+def test_cached_feature_is_not_parsed_again():
+    "FeatureCache does not parse a feature file that did not change"
+
+    feature_file = cjoin('1st_feature_dir', 'one_more.feature')
+    cache = FeatureCache(cache_dir)
+    cache.load(feature_file)
+
+    mox = Mox()
+    mox.StubOutWithMock(core.Feature, 'from_string')
+    mox.ReplayAll()
+
+    try:
+        feature = cache.load(feature_file)
+        mox.VerifyAll()
+    finally:
+        mox.UnsetStubs()
+
+    assert_equals(type(feature), core.Feature)
+
+def test_cache_key_depends_on_file_content():
+    "FeatureCache keys change along with the content of the feature file"
+
+    cache = FeatureCache(cache_dir)
+    feature_file = cjoin('1st_feature_dir', 'some.feature')
+
+    assert_equals(
+        cache.key_for(feature_file, 'Feature: one'),
+        cache.key_for(feature_file, 'Feature: one'),
+    )
+    assert_not_equals(
+        cache.key_for(feature_file, 'Feature: one'),
+        cache.key_for(feature_file, 'Feature: two'),
+    )
+
+@with_setup(create_cache_dir, remove_cache_dir)
+def test_clear_cache():
+    "FeatureCache.clear removes the cached features"
+
+    cache = FeatureCache(join(cache_dir, 'cache'))
+    cache.load(cjoin('1st_feature_dir', 'some.feature'))
+    assert exists(cache.features_path)
+
+    cache.clear()
+    assert not exists(cache.path)
+
+@with_setup(create_cache_dir, remove_cache_dir)
+def test_match_cache_is_kept_by_registry():
+    "MatchCache restores the matches only for the same step definitions"
+    from lettuce.registry import StepDict
+    from lettuce.cache import MatchCache
+
+    steps = StepDict()
+    steps[r'^I have (\d+) apples$'] = lambda step, amount: None
+    steps.match(u'I have 2 apples', True)
+
+    MatchCache(cache_dir).save(steps)
+
+    restored = StepDict()
+    restored[r'^I have (\d+) apples$'] = lambda step, amount: None
+    MatchCache(cache_dir).load(restored)
+    assert_equals(restored.matches.keys(), [(u'I have 2 apples', True)])
+    assert_equals(restored.match(u'I have 2 apples', True).groups(), ('2', ))
+
+    other = StepDict()
+    other[r'^I have (\d+) pears$'] = lambda step, amount: None
+    MatchCache(cache_dir).load(other)
+    assert_equals(other.matches, {})
+
+@with_setup(create_cache_dir, remove_cache_dir)
+def test_durations_add_up_outline_examples():
+    "Durations records how long each scenario took, keeping the ones of scenarios that did not run"
+    from lettuce.cache import Durations
+
+    class Result(object):
+        cached = False
+
+        def __init__(self, scenario, duration):
+            self.scenario = scenario
+            self.duration = duration
+
+    class Total(object):
+        def __init__(self, *results):
+            self.scenario_results = results
+
+    feature = core.Feature.from_file(cjoin('1st_feature_dir', 'some.feature'))
+    first = feature.scenarios[0]
+
+    durations = Durations(cache_dir)
+    durations.save(Total(Result(first, 1.5), Result(first, 0.5)))
+    assert_equals(durations.load(), {first.id: 2.0})
+
+    second = core.Feature.from_file(cjoin('1st_feature_dir', 'one_more.feature')).scenarios[0]
+    durations.save(Total(Result(second, 3.0)))
+    assert_equals(Durations(cache_dir).load(), {first.id: 2.0, second.id: 3.0})
@@ -129,3 +129,18 @@ def test_feature_loaded_from_file_sets_step_line_and_step_filenames():
 
     assert_equals(step4.sentence, "* the result should be 40 on the screen")
     assert_equals(step4.described_at.line, 10)
+
+def test_steps_with_the_same_sentence_get_their_own_lines():
+    "Feature.from_file gives each step its own line, even when the " \
+    "same sentence is found many times within the feature file"
+
+    feature_file = cjoin('1st_feature_dir', 'more_features_here', 'another.feature')
+
+    feature = Feature.from_file(feature_file)
+    scenario1, scenario2 = feature.scenarios
+
+    assert_equals(scenario1.steps[2].sentence, "* I press divide")
+    assert_equals(scenario1.steps[2].described_at.line, 9)
+
+    assert_equals(scenario2.steps[2].sentence, "* I press divide")
+    assert_equals(scenario2.steps[2].described_at.line, 15)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import tempfile
+from StringIO import StringIO
+from os.path import dirname, join, abspath
+from nose.tools import assert_equals
+
+from lettuce import forkserver
+
+current_dir = abspath(dirname(__file__))
+ojoin = lambda *x: join(current_dir, 'output_features', *x)
+
+def start_server(path, base_path):
+    pid = os.fork()
+    if not pid:
+        try:
+            sys.stderr = StringIO()
+            forkserver.serve(path, base_path)
+        finally:
+            os._exit(0)
+
+    deadline = time.time() + 10
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return pid
+        except socket.error:
+            if time.time() > deadline:
+                raise
+
+            time.sleep(0.05)
+        finally:
+            sock.close()
+
+def request(args, path):
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = StringIO(), StringIO()
+    try:
+        status = forkserver.request(args, path)
+        return status, sys.stdout.getvalue(), sys.stderr.getvalue()
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+def test_server_runs_each_request_within_a_child():
+    "The fork server runs lettuce for each client, sending back its output and exit status"
+
+    socket_dir = tempfile.mkdtemp()
+    path = join(socket_dir, 'lettuce.sock')
+    pid = start_server(path, ojoin('many_successful_features'))
+    try:
+        status, output, errors = request(
+            [ojoin('many_successful_features'), '-v', '3', '--no-cache', '--no-history'], path)
+        assert_equals(status, 0)
+        assert '2 scenarios (2 passed)' in output, (output, errors)
+
+        status, output, errors = request(
+            [ojoin('fail_outline'), '-v', '3', '--no-cache', '--no-history'], path)
+        assert_equals(status, 1)
+        assert 'AssertionError' in output, (output, errors)
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+def test_client_forwards_the_arguments_it_was_given():
+    "lettuce --client sends the server the arguments main was called with, but the ones of the client"
+    from lettuce import commands
+
+    socket_dir = tempfile.mkdtemp()
+    path = join(socket_dir, 'lettuce.sock')
+    pid = start_server(path, ojoin('many_successful_features'))
+    stdout, argv = sys.stdout, sys.argv
+    sys.stdout, sys.argv = StringIO(), ['lettuce', '--unknown-to-lettuce']
+    try:
+        try:
+            commands.main(['--client', '--socket', path, ojoin('many_successful_features'),
+                           '-v', '3', '--no-cache', '--no-history'])
+            raise AssertionError('The client should exit with the status of the run')
+        except SystemExit, e:
+            assert_equals(e.code, 0)
+
+        assert '2 scenarios (2 passed)' in sys.stdout.getvalue(), sys.stdout.getvalue()
+    finally:
+        sys.stdout, sys.argv = stdout, argv
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+FEATURE = u"""Feature: Served steps
+  Scenario: Do served steps
+    Given I do the new served step
+    And I do the old served step
+"""
+
+STEPS = u"""from lettuce import step
+
+@step(u'I do the %s served step')
+def do(step):
+    pass
+"""
+
+def write(filename, content):
+    f = open(filename, 'w')
+    f.write(content.encode('utf-8'))
+    f.close()
+
+    # as if the file was changed well after it was first written
+    mtime = os.stat(filename).st_mtime + 10
+    os.utime(filename, (mtime, mtime))
+
+def test_server_reloads_the_step_modules_that_changed():
+    "The fork server drops the steps a changed module registered before, reloading it"
+
+    socket_dir = tempfile.mkdtemp()
+    path = join(socket_dir, 'lettuce.sock')
+    write(join(socket_dir, 'served.feature'), FEATURE)
+    write(join(socket_dir, 'served_steps.py'), STEPS % 'old')
+    pid = start_server(path, socket_dir)
+    try:
+        args = [socket_dir, '-v', '3', '--no-cache', '--no-history']
+        status, output, errors = request(args, path)
+        assert_equals(status, 1)
+        assert "@step(u'Given I do the new served step')" in output, (output, errors)
+
+        write(join(socket_dir, 'served_steps.py'), STEPS % 'new')
+        status, output, errors = request(args, path)
+        assert_equals(status, 1)
+        assert "@step(u'Given I do the new served step')" not in output, (output, errors)
+        assert "@step(u'And I do the old served step')" in output, (output, errors)
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+def test_terrain_is_reloaded_when_it_changed():
+    "The terrain the server imported is reloaded along its hooks, once it changed"
+    from lettuce import world
+    from lettuce import registry
+    from lettuce.fs import FeatureLoader
+
+    terrain_dir = tempfile.mkdtemp()
+    filename = join(terrain_dir, 'terrain.py')
+    terrain = sys.modules.get('terrain')
+    try:
+        write(filename, u"from lettuce import world\nworld.served_terrain = 'old'\n")
+        sys.path.insert(0, terrain_dir)
+        sys.modules.pop('terrain', None)
+        try:
+            __import__('terrain')
+        finally:
+            sys.path.remove(terrain_dir)
+
+        FeatureLoader.preloaded[filename] = os.stat(filename).st_mtime
+        forkserver.reload_terrain()
+        assert_equals(world.served_terrain, 'old')
+
+        write(filename, u"from lettuce import world\nworld.served_terrain = 'new'\n")
+        forkserver.reload_terrain()
+        assert_equals(world.served_terrain, 'new')
+    finally:
+        FeatureLoader.preloaded.pop(filename, None)
+        registry.forget(filename)
+        if terrain is None:
+            sys.modules.pop('terrain', None)
+        else:
+            sys.modules['terrain'] = terrain
+
+        shutil.rmtree(terrain_dir, ignore_errors=True)
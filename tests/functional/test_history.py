@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import sys
+import shutil
+import tempfile
+from datetime import datetime
+from StringIO import StringIO
+from os.path import dirname, join, abspath
+from nose.tools import assert_equals, with_setup
+
+from lettuce import Runner
+from lettuce.history import History, print_report
+
+current_dir = abspath(dirname(__file__))
+ojoin = lambda *x: join(current_dir, 'output_features', *x)
+
+history_dir = None
+
+def create_history_dir():
+    global history_dir
+    history_dir = tempfile.mkdtemp()
+
+def remove_history_dir():
+    shutil.rmtree(history_dir, ignore_errors=True)
+
+def run(name):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        return Runner(ojoin(name), verbosity=3).run()
+    finally:
+        sys.stdout = stdout
+
+@with_setup(create_history_dir, remove_history_dir)
+def test_history_records_scenarios_and_steps():
+    "History keeps the status and duration of each scenario, example and step of a run"
+    history = History(join(history_dir, 'history.db'))
+    total = run('fail_outline')
+    run_id = history.record(total, datetime.now(), 1.5, revision='abc123')
+
+    assert_equals(history.runs(), [(run_id, history.runs()[0][1], u'abc123', 1.5)])
+    statuses = history.connection.execute(
+        'SELECT example, status FROM scenarios WHERE run = ? ORDER BY example', (run_id, )).fetchall()
+    assert_equals(statuses, [(0, u'passed'), (1, u'failed'), (2, u'passed')])
+
+    steps = history.connection.execute(
+        'SELECT COUNT(*) FROM steps WHERE run = ?', (run_id, )).fetchone()[0]
+    assert_equals(steps, total.steps)
+    assert_equals(history.find_run('abc'), run_id)
+
+@with_setup(create_history_dir, remove_history_dir)
+def test_history_warns_when_it_can_not_record_a_run():
+    "History warns, instead of failing, when its database can not be written"
+    history = History(history_dir)
+    total = run('many_successful_scenarios')
+
+    stderr = sys.stderr
+    sys.stderr = StringIO()
+    try:
+        assert_equals(history.record(total, datetime.now(), 1.5), None)
+        warning = sys.stderr.getvalue()
+    finally:
+        sys.stderr = stderr
+
+    assert warning.startswith('lettuce could not record the run within %s' % history_dir), warning
+
+@with_setup(create_history_dir, remove_history_dir)
+def test_history_reports_steps_that_got_slower():
+    "History reports the steps that took longer than on the baseline run"
+    history = History(join(history_dir, 'history.db'))
+
+    total = run('many_successful_scenarios')
+    for result in total.scenario_results:
+        for step in result.steps_passed:
+            step.duration = 0.1
+
+    history.record(total, datetime.now(), 1)
+
+    slow = total.scenario_results[0].steps_passed[0]
+    slow.duration = 0.5
+    total.scenario_results[0].duration = 1.0
+    history.record(total, datetime.now(), 1)
+
+    assert_equals(
+        [(sentence, past, current) for scenario, sentence, past, current
+         in history.slower_steps(history.find_run())],
+        [(slow.sentence, 0.1, 0.5)],
+    )
+    assert_equals(history.slowest(1)[0][0], total.scenario_results[0].scenario.id)
+
+    report = StringIO()
+    print_report(history, 'trends', stream=report)
+    assert_equals(len(report.getvalue().splitlines()), 2)
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
+import sys
 import lettuce
 
 from StringIO import StringIO
@@ -55,8 +56,7 @@ def test_try_to_import_terrain():
     os.chdir(sandbox_path)
 
     try:
-        import lettuce
-        reload(lettuce)
+        Runner(sandbox_path)
         raise AssertionError('The runner should raise ImportError !')
     except SystemExit:
         assert_stderr_lines(
@@ -64,10 +64,10 @@ def test_try_to_import_terrain():
             '"terrain"\nbut it has errors, check its contents and ' \
             'try to run lettuce again.\n\nOriginal traceback below:\n\n' \
             "Traceback (most recent call last):\n"
-            '  File "%(lettuce_core_file)s", line 43, in <module>\n'
-            '    terrain = fs.FileSystem._import("terrain")\n' \
-            '  File "%(lettuce_fs_file)s", line 63, in _import\n' \
-            '    module = imp.load_module(name, fp, pathname, description)\n' \
+            '  File "%(lettuce_core_file)s", line %(import_line)d, in import_terrain\n'
+            '    _terrain = fs.FileSystem._import("terrain")\n' \
+            '  File "%(lettuce_fs_file)s", line %(load_line)d, in _import\n' \
+            '    return imp.load_module(name, fp, pathname, description)\n' \
             '  File "%(terrain_file)s", line 18\n' \
             '    it is here just to cause a syntax error\n' \
             "                  ^\n" \
@@ -75,6 +75,8 @@ def test_try_to_import_terrain():
                 'lettuce_core_file': abspath(join(lettuce_dir, '__init__.py')),
                 'lettuce_fs_file': abspath(join(lettuce_dir, 'fs.py')),
                 'terrain_file': abspath(lettuce_path('..', 'tests', 'functional', 'sandbox', 'terrain.py')),
+                'import_line': lettuce.import_terrain.func_code.co_firstlineno + 10,
+                'load_line': lettuce.fs.FileSystem._import.im_func.func_code.co_firstlineno + 6,
             }
         )
 
@@ -697,6 +699,62 @@ def test_feature_without_name():
         % filename
     )
 
+@with_setup(prepare_stderr)
+def test_parse_workers_report_all_syntax_errors():
+    "syntax checking: Parsing with workers reports the errors of every file"
+
+    runner = Runner(sjoin(), parse_workers=2)
+    assert_raises(SystemExit, runner.run)
+
+    stderr = sys.stderr.getvalue()
+    assert (
+        'Syntax error at: %s\n'
+        'A feature file must contain ONLY ONE feature!\n'
+        % syntax_feature_name('many_features_a_file')
+    ) in stderr
+
+    assert (
+        'Syntax error at: %s\n'
+        'Features must have a name. e.g: "Feature: This is my name"\n'
+        % syntax_feature_name('feature_without_name')
+    ) in stderr
+
+@with_setup(prepare_stdout)
+def test_parse_workers_run_features():
+    "Features parsed with workers run just like the ones parsed serially"
+
+    runner = Runner(join(abspath(dirname(__file__)), 'output_features',
+                         'many_successful_features'), parse_workers=2)
+    total = runner.run()
+
+    assert_equals(total.features_ran, 2)
+    assert_equals(total.steps_passed, 4)
+
+@with_setup(prepare_stdout)
+def test_parse_ahead_keeps_the_order_of_features():
+    "Features parsed ahead in background run in the same order"
+
+    path = join(abspath(dirname(__file__)), 'simple_features')
+    serially = Runner(path).run()
+    ahead = Runner(path, parse_ahead=1).run()
+
+    feature_names = lambda total: [r.feature.name for r in total.feature_results]
+    assert_equals(feature_names(ahead), feature_names(serially))
+
+@with_setup(prepare_stderr)
+def test_parse_ahead_reports_syntax_errors():
+    "syntax checking: Features parsed ahead in background report syntax errors"
+
+    filename = syntax_feature_name('feature_without_name')
+    runner = Runner(filename, parse_ahead=2)
+    assert_raises(SystemExit, runner.run)
+
+    assert_stderr_lines(
+        'Syntax error at: %s\n'
+        'Features must have a name. e.g: "Feature: This is my name"\n'
+        % filename
+    )
+
 
 @with_setup(prepare_stdout)
 def test_output_snippets_with_groups_within_double_quotes_colorless():
@@ -878,3 +936,301 @@ def test_output_snippets_with_normalized_unicode_names():
         u"def entao_eu_fico_felizao(step):\n"
         u"    assert False, 'This step must be implemented'\n"
     )
+
+@with_setup(prepare_stdout)
+def test_strict_reports_undefined_steps_without_running():
+    "Running strictly reports the undefined steps up front and runs nothing"
+
+    runner = Runner(feature_name('double-quoted-snippet'), verbosity=3, strict=True)
+    assert_raises(SystemExit, runner.run)
+
+    assert_stdout_lines(
+        u'1 undefined step:\n'
+        u'    Given I have "stuff here" and "more @#$%ˆ& bizar sutff h3r3" # tests/functional/output_features/double-quoted-snippet/double-quoted-snippet.feature:3\n'
+        u'\n'
+        u'You can implement step definitions for undefined steps with these snippets:\n'
+        u'\n'
+        u"# -*- coding: utf-8 -*-\n"
+        u'from lettuce import step\n'
+        u'\n'
+        u'@step(u\'Given I have "(.*)" and "(.*)"\')\n'
+        u'def given_i_have_group1_and_group2(step, group1, group2):\n'
+        u'    assert False, \'This step must be implemented\'\n'
+    )
+
+@with_setup(prepare_stdout)
+def test_resolve_steps_finds_every_step_definition():
+    "Resolving steps up front, with workers, finds the definitions of outlines and runs them"
+
+    runner = Runner(feature_name('success_outline'), verbosity=3,
+                    resolve=True, parse_workers=2)
+    features = list(runner.load_features([feature_name('success_outline')]))
+    runner.loader.find_and_load_step_definitions()
+
+    assert_equals(runner.resolve_steps(features), [])
+
+    total = runner.run()
+    assert_equals(total.steps_undefined, 0)
+
+def test_resolve_steps_reports_undefined_outline_steps_once():
+    "Resolving steps up front reports the undefined steps of outlines once, not once per example"
+
+    runner = Runner(feature_name('success_outline'), verbosity=3, resolve=True)
+    feature = Feature.from_string(u"""
+Feature: Undefined outline
+  Scenario Outline: Undefined
+    Given I have <count> undefined things within an outline
+    Then I have undefined things within an outline
+
+    Examples:
+      | count |
+      | 1     |
+      | 2     |
+""")
+
+    undefined = runner.resolve_steps([feature])
+    assert_equals([step.sentence for step in undefined], [
+        u'Given I have 1 undefined things within an outline',
+        u'Then I have undefined things within an outline',
+    ])
+
+@with_setup(prepare_stdout)
+def test_dry_run_matches_steps_without_running_them():
+    "A dry run reports every step as skipped, calling no hooks but the output ones"
+    import tempfile
+
+    if hasattr(world, 'my_balance'):
+        del world.my_balance
+
+    xml_file, xml_filename = tempfile.mkstemp(suffix='.xml')
+    os.close(xml_file)
+    try:
+        runner = Runner(feature_name('success_table'), verbosity=3,
+                        xml_filename=xml_filename, dry_run=True)
+        total = runner.run()
+        xml = open(xml_filename).read()
+    finally:
+        os.remove(xml_filename)
+
+    assert_equals(total.steps, 5)
+    assert_equals(total.steps_skipped, 5)
+    assert_equals(total.steps_passed, 0)
+    assert_equals(total.steps_undefined, 0)
+    assert not hasattr(world, 'my_balance'), 'the before.all hook should not run'
+    assert '<skip>5 skipped steps</skip>' in xml
+    assert 'Feature: Table Success' in sys.stdout.getvalue()
+
+def run_capturing_stdout(runner):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        total = runner.run()
+        return total, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+def test_processes_report_like_a_serial_run():
+    "Running scenarios within worker processes reports them as a serial run"
+
+    for name in ('many_successful_scenarios', 'success_outline', 'fail_outline', 'failed_table'):
+        serial, serial_output = run_capturing_stdout(
+            Runner(ojoin(name), verbosity=3))
+        parallel, parallel_output = run_capturing_stdout(
+            Runner(ojoin(name), verbosity=3, processes=2))
+
+        assert_equals(parallel_output, serial_output)
+        for attribute in ('features_ran', 'scenarios_ran', 'scenarios_passed',
+                          'steps', 'steps_passed', 'steps_failed',
+                          'steps_skipped', 'steps_undefined'):
+            assert_equals(getattr(parallel, attribute), getattr(serial, attribute))
+
+        assert_equals(
+            [step.why.exception.__class__ for result in parallel.scenario_results
+             for step in result.steps_failed],
+            [step.why.exception.__class__ for result in serial.scenario_results
+             for step in result.steps_failed],
+        )
+
+def test_threads_report_like_a_serial_run():
+    "Running features within threads reports them as a serial run"
+
+    for name in ('many_successful_features', 'success_table', 'fail_outline'):
+        serial, serial_output = run_capturing_stdout(
+            Runner(ojoin(name), verbosity=3))
+        threaded, threaded_output = run_capturing_stdout(
+            Runner(ojoin(name), verbosity=3, threads=2))
+
+        assert_equals(threaded_output, serial_output)
+        assert_equals(threaded.steps_passed, serial.steps_passed)
+        assert_equals(threaded.steps_failed, serial.steps_failed)
+
+def test_concurrent_scenarios_report_like_a_serial_run():
+    "Running scenarios concurrently reports them as a serial run"
+
+    for name in ('many_successful_scenarios', 'success_outline', 'failed_table'):
+        serial, serial_output = run_capturing_stdout(
+            Runner(ojoin(name), verbosity=3))
+        concurrent, concurrent_output = run_capturing_stdout(
+            Runner(ojoin(name), verbosity=3, async_concurrency=2))
+
+        assert_equals(concurrent_output, serial_output)
+        assert_equals(concurrent.steps_passed, serial.steps_passed)
+        assert_equals(concurrent.steps_failed, serial.steps_failed)
+
+def test_shards_run_every_scenario_once():
+    "Shards of a run, put together, run each of its scenarios once"
+
+    serial, serial_output = run_capturing_stdout(
+        Runner(ojoin('many_successful_features'), verbosity=3))
+
+    ran = []
+    for number in (1, 2, 3):
+        total, output = run_capturing_stdout(
+            Runner(ojoin('many_successful_features'), verbosity=3, shard=(number, 3)))
+        ran.extend([result.scenario.id for result in total.scenario_results])
+
+    assert_equals(sorted(ran), sorted([result.scenario.id for result in serial.scenario_results]))
+
+def test_shards_run_every_scenario_once_with_the_cache_on():
+    "Shards run one after another split the scenarios the same way, as they record no durations"
+    import json
+    import shutil
+    import tempfile
+    from lettuce.cache import Durations, Failures
+
+    def runner(**kw):
+        runner = Runner(ojoin('many_successful_features'), verbosity=3, **kw)
+        runner.durations = Durations(cache_dir)
+        runner.failures = Failures(cache_dir)
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        serial, output = run_capturing_stdout(runner())
+        ids = sorted([result.scenario.id for result in serial.scenario_results])
+        # far longer than they take, so that the split would change
+        # if a shard recorded how long its scenarios took
+        f = open(Durations(cache_dir).filename, 'w')
+        json.dump({ids[0]: 2.0, ids[1]: 1.0}, f)
+        f.close()
+
+        ran = []
+        for number in (1, 2):
+            total, output = run_capturing_stdout(runner(shard=(number, 2)))
+            ran.extend([result.scenario.id for result in total.scenario_results])
+
+        assert_equals(Durations(cache_dir).load(), {ids[0]: 2.0, ids[1]: 1.0})
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    assert_equals(sorted(ran), ids)
+
+def test_last_failed_runs_only_the_examples_that_failed():
+    "With --last-failed, only the scenarios and examples that failed last time run"
+    import shutil
+    import tempfile
+    from lettuce.cache import Durations, Failures
+
+    def runner(**kw):
+        runner = Runner(ojoin('fail_outline'), verbosity=3, **kw)
+        runner.durations = Durations(cache_dir)
+        runner.failures = Failures(cache_dir)
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        first, output = run_capturing_stdout(runner())
+        again, output = run_capturing_stdout(runner(last_failed=True))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    assert_equals(len(first.scenario_results), 3)
+    assert_equals(len(again.scenario_results), 1)
+    assert_equals(
+        again.scenario_results[0].steps_failed[0].related_outline,
+        first.scenario_results[1].steps_failed[0].related_outline,
+    )
+
+def test_failed_first_runs_the_features_that_failed_before():
+    "With --failed-first, the features and scenarios that failed last time run first"
+    from lettuce.cache import Failures
+
+    runner = Runner(ojoin('many_successful_features'), verbosity=3, failed_first=True)
+    files = runner.loader.find_feature_files()
+    features = [Feature.from_file(filename) for filename in files]
+
+    failing = features[-1].scenarios[-1]
+    runner.failures = Failures()
+    runner.failures.load = lambda: {failing.id: None}
+
+    selected, selected_files = runner.select(features, files)
+    assert_equals(selected[0].scenarios[0], failing)
+    assert_equals(selected_files[0], files[-1])
+    assert_equals(sorted(selected_files), sorted(files))
+
+def test_changed_files_run_only_the_scenarios_that_depend_on_them():
+    "Traced runs record the files of each scenario, to run only the ones depending on changed files"
+    import shutil
+    import tempfile
+    from lettuce.cache import ImpactMap
+
+    def runner(**kw):
+        runner = Runner(ojoin('many_successful_features'), verbosity=3, **kw)
+        runner.impact_map = ImpactMap(cache_dir)
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        traced, output = run_capturing_stdout(runner(trace=True))
+        files = ImpactMap(cache_dir).load()
+
+        one = fs.relpath(ojoin('many_successful_features', 'one.feature'))
+        steps = fs.relpath(ojoin('many_successful_features', 'dumb_steps.py'))
+        assert_equals(len(files), 2)
+        for scenario_files in files.values():
+            assert steps in scenario_files, scenario_files
+            assert not [name for name in scenario_files if name.startswith('lettuce/')]
+
+        changed, output = run_capturing_stdout(runner(changed_files=[one]))
+        assert_equals([result.scenario.with_file for result in changed.scenario_results],
+                      [ojoin('many_successful_features', 'one.feature')])
+
+        everything, output = run_capturing_stdout(runner(changed_files=[steps]))
+        assert_equals(len(everything.scenario_results), 2)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def test_reuse_passed_does_not_run_the_examples_that_passed_before():
+    "With --reuse-passed, the examples that passed before are reported as cached passes"
+    import shutil
+    import tempfile
+    from lettuce.cache import PassedResults
+
+    def runner(name, **kw):
+        runner = Runner(ojoin(name), verbosity=3, reuse_passed=True, **kw)
+        runner.passed_results = PassedResults(cache_dir)
+        return runner
+
+    cache_dir = tempfile.mkdtemp()
+    xml_file, xml_filename = tempfile.mkstemp(suffix='.xml')
+    os.close(xml_file)
+    try:
+        first, output = run_capturing_stdout(runner('fail_outline'))
+        again, output = run_capturing_stdout(runner('fail_outline'))
+        assert_equals(first.scenarios_cached, 0)
+        assert_equals([result.cached for result in again.scenario_results],
+                      [True, False, True])
+        assert_equals(again.steps_failed, first.steps_failed)
+        assert '3 scenarios (0 passed, 2 cached)' in output, output
+
+        run_capturing_stdout(runner('success_table'))
+        cached, output = run_capturing_stdout(runner('success_table', xml_filename=xml_filename))
+        xml = open(xml_filename).read()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.remove(xml_filename)
+
+    assert_equals(cached.scenarios_cached, 1)
+    assert_equals(cached.steps_passed, 5)
+    assert '(cached pass)' in output, output
+    assert '<system-out>cached pass</system-out>' in xml
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import sys
+import shutil
+import tempfile
+from StringIO import StringIO
+from os.path import dirname, join, abspath
+from nose.tools import assert_equals, with_setup
+
+from lettuce import Runner
+from lettuce import registry
+from lettuce.registry import STEP_REGISTRY
+from lettuce.watch import Watcher
+
+FEATURE = u"""Feature: Watched %(name)s
+  Scenario: Do %(name)s
+    Given I do %(name)s
+"""
+
+STEPS = u"""from lettuce import step
+
+@step(u'I do %(name)s')
+def i_do(step):
+    assert %(passes)s
+"""
+
+root_dir = dirname(dirname(dirname(abspath(__file__))))
+watched_dir = None
+old_path = None
+
+def create_watched_dir():
+    global watched_dir, old_path
+    watched_dir = tempfile.mkdtemp()
+    # lettuce reloads its plugins on each Runner, relative to the path
+    # it was imported from, which earlier tests may have left behind
+    old_path = os.getcwd()
+    os.chdir(root_dir)
+
+def remove_watched_dir():
+    os.chdir(old_path)
+    for name in ('one', 'two'):
+        registry.forget(join(watched_dir, 'watched_%s_steps.py' % name))
+        sys.modules.pop('watched_%s_steps' % name, None)
+
+    shutil.rmtree(watched_dir, ignore_errors=True)
+
+def write(filename, content):
+    f = open(join(watched_dir, filename), 'w')
+    f.write(content.encode('utf-8'))
+    f.close()
+
+    # as if the file was changed well after it was first written
+    mtime = os.stat(join(watched_dir, filename)).st_mtime + 10
+    os.utime(join(watched_dir, filename), (mtime, mtime))
+
+def run(runner, *args):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        return runner.run(*args)
+    finally:
+        sys.stdout = stdout
+
+def check(watcher):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        return watcher.check()
+    finally:
+        sys.stdout = stdout
+
+@with_setup(create_watched_dir, remove_watched_dir)
+def test_watcher_runs_only_the_features_affected_by_a_change():
+    "Watcher reloads only the changed step modules, running only the features that use them"
+
+    for name in ('one', 'two'):
+        write('%s.feature' % name, FEATURE % {'name': name})
+        write('watched_%s_steps.py' % name, STEPS % {'name': name, 'passes': True})
+
+    runner = Runner(watched_dir, verbosity=3)
+    watcher = Watcher(runner)
+    watcher.stats = watcher.snapshot()
+    total = run(runner)
+    assert_equals(total.scenarios_passed, 2)
+
+    write('watched_one_steps.py', STEPS % {'name': 'one', 'passes': False})
+    changed = watcher.changes()
+    assert_equals(changed, [join(watched_dir, 'watched_one_steps.py')])
+
+    features = watcher.affected(changed)
+    assert_equals(features, [join(watched_dir, 'one.feature')])
+    assert_equals(len([regex for regex in STEP_REGISTRY if 'I do one' in regex]), 1)
+
+    total = run(runner, features)
+    assert_equals(total.scenarios_ran, 1)
+    assert_equals(total.steps_failed, 1)
+
+    write('two.feature', FEATURE % {'name': 'two'} + u"    And I do two\n")
+    features = watcher.affected(watcher.changes())
+    assert_equals(features, [join(watched_dir, 'two.feature')])
+    assert_equals(run(runner, features).steps_passed, 2)
+
+@with_setup(create_watched_dir, remove_watched_dir)
+def test_watcher_survives_files_saved_half_edited():
+    "Watcher reports the errors of broken features and step modules, and keeps watching"
+
+    write('one.feature', FEATURE % {'name': 'one'})
+    write('watched_one_steps.py', STEPS % {'name': 'one', 'passes': True})
+
+    runner = Runner(watched_dir, verbosity=3)
+    watcher = Watcher(runner)
+    watcher.stats = watcher.snapshot()
+    assert_equals(run(runner).scenarios_passed, 1)
+
+    stderr = sys.stderr
+    sys.stderr = StringIO()
+    try:
+        write('one.feature', FEATURE % {'name': 'one'} + u"Feature: Saved half edited\n")
+        assert_equals(check(watcher), None)
+        assert 'ONLY ONE feature' in sys.stderr.getvalue(), sys.stderr.getvalue()
+
+        write('watched_one_steps.py', u"from lettuce import step\n\n@step(u'I do one'\n")
+        assert_equals(check(watcher), None)
+        assert 'SyntaxError' in sys.stderr.getvalue(), sys.stderr.getvalue()
+    finally:
+        sys.stderr = stderr
+
+    write('one.feature', FEATURE % {'name': 'one'})
+    write('watched_one_steps.py', STEPS % {'name': 'one', 'passes': True})
+    assert_equals(check(watcher).scenarios_passed, 1)
@@ -164,3 +164,18 @@ def test_scenario_outline_represent_examples():
         '    | first     | primeiro  |\n'
         '    | second    | segundo   |\n'
     )
+
+def test_step_solve_and_clone_shares_the_template():
+    "Step.solve_and_clone shares the template tables, but not its run state"
+
+    step = core.Step.from_string(STEP_WITH_TABLE.replace('my shelf', '<where>'))
+    step.passed = True
+    step.defined_at = 'somewhere'
+
+    clone = step.solve_and_clone({'where': 'the kitchen'})
+    assert_equals(clone.sentence, 'Given I have the following items in the kitchen:')
+    assert_equals(clone.original_sentence, step.original_sentence)
+    assert clone.hashes is step.hashes
+    assert_equals(clone.passed, None)
+    assert_equals(clone.defined_at, None)
+    assert_equals(step.sentence, 'Given I have the following items in <where>:')
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import sys
+from StringIO import StringIO
+from nose.tools import assert_equals, with_setup
+from nose.plugins.skip import SkipTest
+
+from lettuce import before, step, world
+from lettuce import coroutines
+from lettuce import parallel
+from lettuce import registry
+from lettuce.core import Feature
+
+FEATURE = """
+Feature: Coroutines
+  Scenario: 1st one
+    Given I wait for "first"
+
+  Scenario: 2nd one
+    Given I wait for "second"
+
+  Scenario: 3rd one
+    Given I wait for "third"
+"""
+
+def requires_trollius():
+    if coroutines.asyncio is None:
+        raise SkipTest('trollius is not installed')
+
+def coroutine_environ():
+    requires_trollius()
+    registry.clear()
+    world.waits = []
+
+    @step(r'I wait for "(.*)"')
+    @coroutines.asyncio.coroutine
+    def wait_for(step, name):
+        world.waits.append(('started', name))
+        yield coroutines.asyncio.From(coroutines.asyncio.sleep(0.05))
+        world.waits.append(('finished', name))
+
+def coroutine_teardown():
+    registry.clear()
+    coroutines.close_loop()
+
+@with_setup(coroutine_environ, coroutine_teardown)
+def test_coroutine_step_definitions_run_until_complete():
+    "Coroutine step definitions run until complete on the event loop of the thread"
+    feature = Feature.from_string(FEATURE)
+    result = feature.run()
+
+    assert_equals(result.scenario_results[0].steps_passed[0].sentence,
+                  u'Given I wait for "first"')
+    assert_equals(world.waits, [
+        ('started', 'first'), ('finished', 'first'),
+        ('started', 'second'), ('finished', 'second'),
+        ('started', 'third'), ('finished', 'third'),
+    ])
+
+@with_setup(coroutine_environ, coroutine_teardown)
+def test_coroutine_step_definitions_can_fail():
+    "Coroutine step definitions fail with the exception they raise"
+    @step(r'I break')
+    @coroutines.asyncio.coroutine
+    def i_break(step):
+        yield coroutines.asyncio.From(coroutines.asyncio.sleep(0))
+        raise AssertionError('broken')
+
+    feature = Feature.from_string("""
+Feature: Failing coroutines
+  Scenario: Failing
+    Given I break
+""")
+    step_result = feature.run().scenario_results[0].steps_failed[0]
+    assert_equals(step_result.why.exception.args, ('broken', ))
+
+@with_setup(coroutine_environ, coroutine_teardown)
+def test_coroutine_hooks_run_until_complete():
+    "Coroutine hooks run until complete before the step"
+    @before.each_step
+    @coroutines.asyncio.coroutine
+    def before_step(step):
+        yield coroutines.asyncio.From(coroutines.asyncio.sleep(0))
+        world.waits.append(('hook', step.sentence))
+
+    Feature.from_string(FEATURE).scenarios[0].run(True)
+    assert_equals(world.waits[:2], [
+        ('hook', u'Given I wait for "first"'), ('started', 'first'),
+    ])
+
+@with_setup(coroutine_environ, coroutine_teardown)
+def test_scenarios_run_concurrently_on_one_loop():
+    "Scenarios running concurrently wait for their coroutines together"
+    waits = []
+    world.waits = waits
+    feature = Feature.from_string(FEATURE)
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        results = parallel.run_concurrently([feature], 3)
+    finally:
+        sys.stdout = stdout
+
+    assert_equals(len(results[0].scenario_results), 3)
+    assert all([result.passed for result in results[0].scenario_results])
+    assert_equals([kind for kind, name in waits[:3]], ['started'] * 3)
@@ -110,7 +110,7 @@ Feature: Big table
 FEATURE8 = """
 Feature: Big scenario outline
   Scenario: big scenario outlines
-    Given I do fill 'description' with '<value_two>'
+    Given I do fill 'description' with '<another_one>'
 
   Examples:
     | value_two_thousand_and_three | another_one | and_even_bigger |
@@ -121,7 +121,7 @@ Feature: Big scenario outline
 FEATURE9 = """
 Feature: Big scenario outline
   Scenario: big scenario outlines
-    Given I do fill 'description' with '<value_two>'
+    Given I do fill 'description' with 'value_two'
 
   Examples:
     | value_two_thousand_and_three_biiiiiiiiiiiiiiiiiiiiiiiiiiiiig |
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from lettuce import parser
+from lettuce.core import Language
+from lettuce.exceptions import LettuceSyntaxError
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+FEATURE = u"""
+# language: en
+Feature: Tokenize features
+    In order to parse quickly
+
+    Scenario Outline: Do many things
+        Given I have <number> things
+          | name  |
+          # | ignored |
+          | thing |
+        # just a comment
+
+    Examples:
+        | number |
+        | 1      |
+"""
+
+def test_tokenize_feature():
+    "parser.tokenize reads a feature into tokens with their line numbers"
+
+    tokens = parser.tokenize(FEATURE, Language())
+    assert_equals(
+        tokens,
+        [
+            (parser.FEATURE, 3, u'Tokenize features'),
+            (parser.DESCRIPTION, 4, u'In order to parse quickly'),
+            (parser.SCENARIO, 6, u'Do many things'),
+            (parser.STEP, 7, u'Given I have <number> things'),
+            (parser.TABLE, 8, u'| name  |'),
+            (parser.TABLE, 10, u'| thing |'),
+            (parser.EXAMPLES, 13, u'Examples:'),
+            (parser.TABLE, 14, u'| number |'),
+            (parser.TABLE, 15, u'| 1      |'),
+        ]
+    )
+
+def test_tokenize_scenario():
+    "parser.tokenize can start right at a scenario"
+
+    tokens = parser.tokenize(u"Scenario: Alone\n  Given I am alone", Language(),
+                             start=parser.SCENARIO)
+    assert_equals(
+        tokens,
+        [
+            (parser.SCENARIO, 1, u'Alone'),
+            (parser.STEP, 2, u'Given I am alone'),
+        ]
+    )
+
+def test_tokenize_checks_feature_count():
+    "parser.tokenize fails when there are no features or more than one"
+
+    assert_raises(LettuceSyntaxError, parser.tokenize,
+                  u"Scenario: Orphan", Language())
+    assert_raises(LettuceSyntaxError, parser.tokenize,
+                  u"Feature: One\nFeature: Two", Language())
@@ -251,6 +251,16 @@ def test_scenario_sentences_can_be_solved():
         assert_equals(type(step), Step)
         assert_equals(step.sentence, expected_sentence)
 
+def test_scenario_outlines_are_solved_on_demand():
+    "Steps of scenario outlines are not solved while parsing"
+    scenario = Scenario.from_string(OUTLINED_SCENARIO)
+
+    assert 'solved_steps' not in vars(scenario)
+    evaluated = scenario.evaluated
+    outline, steps = evaluated.next()
+    assert_equals(outline['input_1'], '20')
+    assert_equals(steps[0].sentence, 'Given I have entered 20 into the calculator')
+
 def test_solved_steps_also_have_scenario_as_attribute():
     "Steps solved in scenario outlines also have scenario as attribute"
     scenario = Scenario.from_string(OUTLINED_SCENARIO)
@@ -370,3 +380,76 @@ def test_scenario_aggregate_all_examples_blocks():
             {'input_1': '12', 'input_2': '40', 'button': 'add', 'output': '52'},
         ]
     )
+
+OUTLINED_SCENARIO_WITH_UNKNOWN_PLACEHOLDER = """
+Scenario Outline: Add two numbers
+    Given I have entered <input_1> into the calculator
+    And I have entered <input_3> into the calculator
+
+    Examples:
+      | input_1 | input_2 |
+      | 20      | 30      |
+"""
+
+OUTLINED_SCENARIO_WITH_MARKUP = """
+Scenario Outline: Greet in html
+    Given I greet <name>
+    Then I see "<h1>Hi <name></h1><br/>"
+
+    Examples:
+      | name |
+      | John |
+"""
+
+OUTLINED_SCENARIO_WITH_PLACEHOLDERS_ON_TABLE = """
+Scenario Outline: Fill a form
+    Given I fill the form with:
+      | field | value   |
+      | name  | <name>  |
+      | age   | <age>   |
+
+    Examples:
+      | name | age |
+      | John | 30  |
+      | Mary | 25  |
+"""
+
+def test_scenario_outline_fails_on_unknown_placeholders():
+    "Placeholders that are not columns of the examples fail while parsing"
+
+    try:
+        Scenario.from_string(OUTLINED_SCENARIO_WITH_UNKNOWN_PLACEHOLDER)
+        raise AssertionError('LettuceSyntaxError should have been raised')
+    except LettuceSyntaxError, e:
+        assert_equals(
+            e.msg,
+            'Syntax error at: None\n\n'
+            'Unknown placeholders on scenario outline "Add two numbers": <input_3>\n'
+            'They must be columns of its examples.\n\n'
+        )
+
+def test_scenario_outline_leaves_markup_alone():
+    "Markup within outline steps is neither a placeholder nor an error"
+    scenario = Scenario.from_string(OUTLINED_SCENARIO_WITH_MARKUP)
+
+    greet, see = scenario.solved_steps
+    assert_equals(greet.sentence, u'Given I greet John')
+    assert_equals(see.sentence, u'Then I see "<h1>Hi John</h1><br/>"')
+
+def test_scenario_outline_solves_placeholders_on_tables():
+    "Placeholders within step tables are solved along with the sentence"
+    scenario = Scenario.from_string(OUTLINED_SCENARIO_WITH_PLACEHOLDERS_ON_TABLE)
+
+    first, second = scenario.solved_steps
+    assert_equals(
+        first.hashes,
+        [{'field': 'name', 'value': 'John'}, {'field': 'age', 'value': '30'}]
+    )
+    assert_equals(
+        second.hashes,
+        [{'field': 'name', 'value': 'Mary'}, {'field': 'age', 'value': '25'}]
+    )
+    assert_equals(
+        scenario.steps[0].hashes,
+        [{'field': 'name', 'value': '<name>'}, {'field': 'age', 'value': '<age>'}]
+    )
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# <Lettuce - Behaviour Driven Development for python>
+# Copyright (C) <2010>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from nose.tools import assert_equals, assert_raises
+
+from lettuce import sharding
+
+IDS = [u'features/%d.feature: scenario %d' % (number / 3, number) for number in range(30)]
+
+def test_parse_shard():
+    "sharding.parse takes K/N, where 1 <= K <= N"
+    assert_equals(sharding.parse('2/4'), (2, 4))
+    assert_raises(ValueError, sharding.parse, '0/4')
+    assert_raises(ValueError, sharding.parse, '5/4')
+    assert_raises(ValueError, sharding.parse, '2')
+
+def test_shards_without_durations_split_by_hash():
+    "Without durations, every scenario falls in exactly one shard, whatever the order of the others"
+    shards = sharding.partition(IDS, 3)
+    assert_equals(sorted(sum(shards, [])), range(len(IDS)))
+
+    reversed_ids = list(reversed(IDS))
+    for positions, reversed_positions in zip(shards, sharding.partition(reversed_ids, 3)):
+        assert_equals(
+            sorted([IDS[position] for position in positions]),
+            sorted([reversed_ids[position] for position in reversed_positions]),
+        )
+
+def test_shards_with_durations_are_balanced():
+    "With durations, the longest scenarios go first to the shard that would finish earliest"
+    ids = [u'a', u'b', u'c', u'd', u'e', u'f']
+    durations = {u'a': 8, u'b': 7, u'c': 6, u'd': 5, u'e': 4}
+
+    shards = sharding.partition(ids, 2, durations)
+    assert_equals(sorted(sum(shards, [])), range(len(ids)))
+
+    loads = [sum([durations.get(ids[position], 6) for position in positions])
+             for positions in shards]
+    assert_equals(sorted(loads), [18, 18])
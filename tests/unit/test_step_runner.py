@@ -429,3 +429,124 @@ def test_failing_behave_as_step_raises_assertion():
     'When a step definition calls another (failing) step definition with behave_as, that step should be marked a failure.'
     runnable_step = Step.from_string('Given I have a step which calls the "other step fails" step with behave_as')
     assert_raises(AssertionError, runnable_step.run, True)
+
+def test_step_registry_keeps_registration_order():
+    "STEP_REGISTRY iterates in registration order and matches the first compiled regex"
+    steps = registry.StepDict()
+    first, second = lambda step: None, lambda step: None
+
+    steps[r'(.*) step'] = first
+    steps[r'a (.*) step'] = second
+    assert_equals(steps.keys(), [r'(.*) step', r'a (.*) step'])
+
+    regex, func = steps.compiled(ignore_case=True)[0]
+    assert regex.search(u'A DEFINED STEP')
+    assert_equals(func, first)
+
+    regex, func = steps.compiled(ignore_case=False)[0]
+    assert not regex.search(u'A DEFINED STEP')
+
+    del steps[r'(.*) step']
+    assert_equals(steps.compiled(ignore_case=True)[0][1], second)
+
+def test_indexable_words_of_step_definitions():
+    "Only whole words that every matched sentence must contain are indexed"
+
+    assert_equals(
+        registry.indexable_words(r'^I have (\d+) apples in my basket$'),
+        [u'i', u'have', u'apples', u'in', u'my', u'basket'],
+    )
+    assert_equals(registry.indexable_words(r'I have (\d+) apples'), [u'have'])
+    assert_equals(registry.indexable_words(r'(?:I have|I use) (.*)'), [])
+    assert_equals(registry.indexable_words(r'footstep'), [])
+
+def test_step_registry_index_keeps_registration_order():
+    "STEP_REGISTRY.matching narrows the candidates without changing their order"
+    steps = registry.StepDict()
+    generic, apples, pears = [lambda step: None for _ in range(3)]
+
+    steps[r'^I have (.*)$'] = generic
+    steps[r'^I have (\d+) apples$'] = apples
+    steps[r'^I have (\d+) pears$'] = pears
+
+    assert_equals(
+        [func for regex, func in steps.matching(u'I have 2 APPLES', ignore_case=True)],
+        [generic, apples],
+    )
+
+    del steps[r'^I have (.*)$']
+    assert_equals(
+        [func for regex, func in steps.matching(u'I have 2 pears', ignore_case=False)],
+        [pears],
+    )
+
+def test_step_registry_remembers_matches_until_it_changes():
+    "STEP_REGISTRY.match memoizes the match of each sentence until a step is registered"
+    steps = registry.StepDict()
+    steps[r'^I have (\d+) (?P<fruit>\w+)$'] = lambda step, **kw: None
+
+    matched = steps.match(u'I have 2 apples', True)
+    assert_equals(matched.groupdict(), {'fruit': u'apples'})
+    assert steps.match(u'I have 2 apples', True) is matched
+    assert_equals(steps.match(u'I have some apples', True), None)
+
+    steps[r'^I have some (\w+)$'] = lambda step, fruit: None
+    assert_equals(steps.match(u'I have some apples', True).groups(), (u'apples', ))
+
+@with_setup(step_runner_environ)
+def test_compiled_feature_plan_runs_many_times():
+    "A compiled feature plan can run again, starting from fresh step states"
+    feature = Feature.from_string(FEATURE1)
+    plan = feature.compile()
+
+    for _ in range(2):
+        result = plan.run()
+        scenario_result = result.scenario_results[0]
+
+        assert_equals(len(scenario_result.steps_passed), 1)
+        assert_equals(len(scenario_result.steps_failed), 1)
+        assert_equals(len(scenario_result.steps_undefined), 1)
+        assert_equals(len(scenario_result.steps_skipped), 1)
+        assert_equals(scenario_result.steps_skipped[0].ran, False)
+        assert_equals(scenario_result.steps_passed[0].passed, True)
+
+OUTLINE_FEATURE = """
+Feature: Many examples
+  Scenario Outline: Solved one example at a time
+    Given I have <number> apples
+  Examples:
+    | number |
+    | 1      |
+    | 2      |
+    | 3      |
+"""
+
+def test_compiled_outline_solves_each_example_as_it_runs():
+    "A scenario plan solves the steps of an outline only as each example runs"
+    scenario = Feature.from_string(OUTLINE_FEATURE).scenarios[0]
+    solve_and_clone = Step.solve_and_clone
+    solved = []
+
+    def counting(step, data):
+        solved.append(data['number'])
+        return solve_and_clone(step, data)
+
+    Step.solve_and_clone = counting
+    try:
+        plan = scenario.compile()
+        assert_equals(solved, [])
+
+        examples = plan.examples
+        examples.next()
+        assert_equals(solved, ['1'])
+
+        results = plan.run()
+        assert_equals(solved, ['1', '1', '2', '3'])
+    finally:
+        Step.solve_and_clone = solve_and_clone
+
+    assert_equals([result.steps[0].sentence for result in results],
+                  [u'Given I have %d apples' % number for number in (1, 2, 3)])
+    assert_equals([[state['state'] for state in example['steps']]
+                   for example in plan.serialize(results)],
+                  [['undefined']] * 3)
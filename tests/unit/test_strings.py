@@ -237,3 +237,13 @@ def test_parse_hashes_escapes_pipes():
     assert_equals(keys, got_keys)
     assert_equals(dicts, got_dicts)
 
+
+def test_template_fills_placeholders():
+    "strings.Template fills its <placeholders> in a single pass"
+
+    template = strings.Template(u"I have <amount> <fruit>, <unknown> and a < b > c")
+    assert_equals(template.placeholders, [u'amount', u'fruit', u'unknown'])
+    assert_equals(
+        template.fill({'amount': 2, 'fruit': u'apples'}),
+        u"I have 2 apples, <unknown> and a < b > c"
+    )
@@ -144,7 +144,9 @@ def test_after_each_all_is_executed_before_each_all():
     mox.StubOutWithMock(lettuce, 'fs')
     mox.StubOutWithMock(lettuce.fs, 'FileSystem')
     mox.StubOutWithMock(lettuce, 'Feature')
+    mox.StubOutWithMock(lettuce, 'import_terrain')
 
+    lettuce.import_terrain()
     lettuce.fs.FeatureLoader('some_basepath').AndReturn(loader_mock)
 
     lettuce.sys.path.insert(0, 'some_basepath')